@@ -20,7 +20,11 @@ type Activity = {
 
 // Received posts and followers
 let receivedPosts: { text: string; actor: string }[] = [];
-let receivedSporeActions: { text: string; actor: string }[] = [];
+// Spore actions are kept in a bounded log with increasing ids, so fungi can poll incrementally (see GET /spore-actions)
+let receivedSporeActions: { id: number; text: string; actor: string }[] = [];
+let nextSporeActionId = 1;
+// Changes on every start, so pollers notice that ids were reset
+const SPORE_ACTION_LOG_EPOCH = `${Date.now()}-${Math.random().toString(36).slice(2, 10)}`;
 const followers = new Set<string>();
 
 // Environment variables with defaults
@@ -31,6 +35,8 @@ const AP_BACKEND_NAME_START = process.env.AP_BACKEND_NAME || "server1";
 const AP_BACKEND_PORT = AP_BACKEND_PORT_START + FUNGUS_ID;
 const AP_BACKEND_NAME = AP_BACKEND_NAME_START + FUNGUS_ID;
 const AP_BACKEND_DOMAIN = `http://${AP_BACKEND_NAME}:${AP_BACKEND_PORT}`;
+const SPORE_ACTION_LOG_SIZE = parseInt(process.env.SPORE_ACTION_LOG_SIZE || "1000", 10);
+const SPORE_ACTION_PAGE_LIMIT = parseInt(process.env.SPORE_ACTION_PAGE_LIMIT || "100", 10);
 
 // Peer server names and domains
 let allApPeerServerNames: string[] = [];
@@ -65,7 +71,10 @@ app.post(`/users/${AP_BACKEND_NAME}/inbox`, async (req, res) => {
         if (activity.object.content.includes("#spore")) {
             console.log("Its a spore!");
             const contentWithoutSpore = activity.object.content.replace(/#spore/g, "").trim();
-            receivedSporeActions.push({text: contentWithoutSpore, actor: activity.actor });
+            receivedSporeActions.push({id: nextSporeActionId++, text: contentWithoutSpore, actor: activity.actor });
+            if (receivedSporeActions.length > SPORE_ACTION_LOG_SIZE) {
+                receivedSporeActions.splice(0, receivedSporeActions.length - SPORE_ACTION_LOG_SIZE);
+            }
         }
         res.status(200).json({ message: "Post received" });
     } else if (activity.type === "Follow" && activity.object && activity.actor) {
@@ -120,13 +129,24 @@ app.post("/spore-actions", async (req, res) => {
     res.status(200).json({ message: "Posted spore to activity pub server.", id: 0 });
 });
 
-// Endpoint to post a spore message
+// Endpoint to view received spore messages: the ones with an id above since_id, oldest first, at most limit.
+// Ids are only valid within one epoch of this server; a since_id of another epoch (e.g. from before a restart)
+// starts from the beginning of the log. Pollers pass last_id and epoch of the response to the next request.
 app.get("/spore-actions", async (req, res) => {
     res.header("Access-Control-Allow-Origin", "*");
     res.header('Access-Control-Allow-Methods', 'DELETE, PUT');
     res.header("Access-Control-Allow-Headers", "Origin, X-Requested-With, Content-Type, Accept");
-    res.json({ "spore-actions": receivedSporeActions });
-    receivedSporeActions = [];
+    let sinceId = parseInt(String(req.query.since_id || "0"), 10) || 0;
+    if (req.query.epoch !== SPORE_ACTION_LOG_EPOCH || sinceId >= nextSporeActionId) {
+        sinceId = 0;
+    }
+    const limit = Math.min(parseInt(String(req.query.limit || SPORE_ACTION_PAGE_LIMIT), 10) || SPORE_ACTION_PAGE_LIMIT, SPORE_ACTION_PAGE_LIMIT);
+    const sporeActions = receivedSporeActions.filter((sporeAction) => sporeAction.id > sinceId).slice(0, limit);
+    res.json({
+        "spore-actions": sporeActions,
+        "last_id": sporeActions.length > 0 ? sporeActions[sporeActions.length - 1].id : sinceId,
+        "epoch": SPORE_ACTION_LOG_EPOCH,
+    });
 });
 
 // Endpoint to view the current server user profile
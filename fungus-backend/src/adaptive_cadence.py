@@ -0,0 +1,82 @@
+# adaptive_cadence.py
+import logging
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds between epochs while the model is still moving; the upper bound once it has converged is SLEEP_TIME (see main.py)
+CADENCE_MIN_INTERVAL = float(os.getenv("CADENCE_MIN_INTERVAL", 300))
+# Factor the interval grows by per epoch on a plateau, and shrinks by per epoch while moving
+CADENCE_BACKOFF = float(os.getenv("CADENCE_BACKOFF", 2))
+# Absolute fitness change and relative aggregation delta below which an epoch counts as a plateau
+CADENCE_FITNESS_TOLERANCE = float(os.getenv("CADENCE_FITNESS_TOLERANCE", 0.01))
+CADENCE_DELTA_TOLERANCE = float(os.getenv("CADENCE_DELTA_TOLERANCE", 0.001))
+
+
+class AdaptiveCadence:
+    """
+    Interval between two epochs, adapted to convergence.
+
+    After every training epoch update() is given the fitness and the aggregation delta (relative change of the
+    parameters by aggregating the peer models, see aggregation.relative_change). While either moves by more than
+    its tolerance the interval shrinks by backoff, down to min_interval; once both have settled it grows by
+    backoff, up to max_interval. Joining a new group resets it to min_interval.
+    """
+
+    def __init__(self, max_interval, min_interval=CADENCE_MIN_INTERVAL, backoff=CADENCE_BACKOFF,
+                 fitness_tolerance=CADENCE_FITNESS_TOLERANCE, delta_tolerance=CADENCE_DELTA_TOLERANCE):
+        self.min_interval = min(min_interval, max_interval)
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.fitness_tolerance = fitness_tolerance
+        self.delta_tolerance = delta_tolerance
+        self.interval = self.min_interval
+        self.fitness = None
+        self.fitness_change = None
+        self.aggregation_delta = None
+        self.plateau_epochs = 0
+        self._lock = threading.Lock()
+
+    def update(self, fitness=None, aggregation_delta=None):
+        """Records the results of an epoch and returns the interval until the next one."""
+        with self._lock:
+            self.fitness_change = None if fitness is None or self.fitness is None else abs(fitness - self.fitness)
+            if fitness is not None:
+                self.fitness = fitness
+            self.aggregation_delta = aggregation_delta
+            # Without a previous fitness there is nothing to compare to yet, so the model counts as moving
+            moving = (self.fitness_change is None or self.fitness_change > self.fitness_tolerance
+                      or (aggregation_delta is not None and aggregation_delta > self.delta_tolerance))
+            if moving:
+                self.plateau_epochs = 0
+                self.interval = max(self.min_interval, self.interval / self.backoff)
+            else:
+                self.plateau_epochs += 1
+                self.interval = min(self.max_interval, self.interval * self.backoff)
+            logging.info(f"[CADENCE] {'Moving' if moving else 'Plateau'} (fitness change: {self.fitness_change}, "
+                         f"aggregation delta: {aggregation_delta}), next epoch in {self.interval:.0f}s")
+            return self.interval
+
+    def reset(self):
+        """Runs the next epochs at the fastest cadence, e.g. after joining a new group."""
+        with self._lock:
+            self.interval = self.min_interval
+            self.fitness = None
+            self.fitness_change = None
+            self.plateau_epochs = 0
+            return self.interval
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "interval": self.interval,
+                "min_interval": self.min_interval,
+                "max_interval": self.max_interval,
+                "state": "plateau" if self.plateau_epochs > 0 else "moving",
+                "plateau_epochs": self.plateau_epochs,
+                "fitness": self.fitness,
+                "fitness_change": self.fitness_change,
+                "aggregation_delta": self.aggregation_delta,
+            }
@@ -0,0 +1,44 @@
+import unittest
+from adaptive_cadence import AdaptiveCadence
+
+class TestAdaptiveCadence(unittest.TestCase):
+    def setUp(self):
+        self.cadence = AdaptiveCadence(1000, min_interval=100, backoff=2, fitness_tolerance=0.01, delta_tolerance=0.001)
+
+    def test_starts_fast_and_backs_off_on_plateau(self):
+        self.assertEqual(self.cadence.interval, 100)
+
+        intervals = [self.cadence.update(fitness=0.6, aggregation_delta=0.0001) for _ in range(6)]
+
+        # The first epoch has nothing to compare to and counts as moving
+        self.assertEqual(intervals, [100, 200, 400, 800, 1000, 1000])
+        self.assertEqual(self.cadence.as_dict()["state"], "plateau")
+        self.assertEqual(self.cadence.plateau_epochs, 5)
+
+    def test_shrinks_while_fitness_moves(self):
+        for _ in range(4):
+            self.cadence.update(fitness=0.6)
+        self.assertEqual(self.cadence.interval, 800)
+
+        self.assertEqual(self.cadence.update(fitness=0.7), 400)
+        self.assertEqual(self.cadence.update(fitness=0.6), 200)
+        self.assertEqual(self.cadence.as_dict()["state"], "moving")
+
+    def test_aggregation_delta_counts_as_moving(self):
+        self.cadence.update(fitness=0.6)
+        self.cadence.update(fitness=0.6)
+
+        self.assertEqual(self.cadence.update(fitness=0.6, aggregation_delta=0.05), 100)
+
+    def test_reset_after_joining_a_group(self):
+        for _ in range(5):
+            self.cadence.update(fitness=0.6)
+
+        self.assertEqual(self.cadence.reset(), 100)
+        self.assertEqual(self.cadence.update(fitness=0.6), 100)
+
+    def test_min_interval_is_capped_by_max_interval(self):
+        self.assertEqual(AdaptiveCadence(60, min_interval=300).interval, 60)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# aggregation.py
+import logging
+import os
+import numpy as np
+import torch
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 'weighted' (own model gets current_model_weight, the peers share the rest equally), 'fedavg' (weighted by
+# training sample count), 'median' (coordinate-wise) or 'trimmed_mean' (coordinate-wise, robust to outliers)
+AGGREGATION_STRATEGY = os.getenv("AGGREGATION_STRATEGY", "weighted")
+# Share of the highest and of the lowest values per coordinate dropped by 'trimmed_mean'
+AGGREGATION_TRIM_RATIO = float(os.getenv("AGGREGATION_TRIM_RATIO", 0.1))
+
+STRATEGIES = ("weighted", "fedavg", "median", "trimmed_mean")
+
+
+class ParameterLayout:
+    """Name, shape and offset of every floating point tensor of a state dict within one flat parameter vector."""
+
+    def __init__(self, model_state):
+        self.entries = []
+        offset = 0
+        for name, tensor in model_state.items():
+            if not tensor.is_floating_point():
+                continue
+            self.entries.append((name, tuple(tensor.shape), offset, tensor.numel()))
+            offset += tensor.numel()
+        self.size = offset
+        self.shapes = {name: tuple(tensor.shape) for name, tensor in model_state.items()}
+
+    def matches(self, model_state):
+        return {name: tuple(tensor.shape) for name, tensor in model_state.items()} == self.shapes
+
+    def flatten_into(self, model_state, row):
+        for name, _, offset, size in self.entries:
+            row[offset:offset + size] = model_state[name].detach().reshape(-1).cpu().numpy()
+
+    def unflatten(self, vector, template_state):
+        """Splits vector back into tensors (views into it); non-floating point tensors are taken from template_state."""
+        model_state = dict(template_state)
+        for name, shape, offset, size in self.entries:
+            model_state[name] = torch.from_numpy(vector[offset:offset + size].reshape(shape))
+        return model_state
+
+
+def aggregate_states(current_state, peer_states, strategy=AGGREGATION_STRATEGY, current_model_weight=0.5,
+                     sample_counts=None, trim_ratio=AGGREGATION_TRIM_RATIO):
+    """
+    Aggregates the current state with the (compatible) peer states.
+    All states are flattened into the rows of one float32 matrix (the current state first), every strategy is a
+    single vectorized operation over its columns, and the result is split back into a state dict.
+    sample_counts holds one training sample count (or None if unknown) per row, used by 'fedavg'.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown aggregation strategy: {strategy}")
+
+    layout = ParameterLayout(current_state)
+    parameters = np.empty((1 + len(peer_states), layout.size), dtype=np.float32)
+    for row, model_state in enumerate([current_state] + list(peer_states)):
+        layout.flatten_into(model_state, parameters[row])
+
+    if strategy == "weighted":
+        aggregated = current_model_weight * parameters[0] + (1 - current_model_weight) * parameters[1:].mean(axis=0)
+    elif strategy == "fedavg":
+        weights = _sample_weights(sample_counts, len(parameters))
+        aggregated = weights @ parameters
+    else:
+        # One in-place sort of every column serves both order statistics (much faster than np.median over axis 0)
+        parameters.sort(axis=0)
+        num_models = len(parameters)
+        if strategy == "median":
+            aggregated = parameters[(num_models - 1) // 2:num_models // 2 + 1].mean(axis=0)
+        else:
+            trimmed = int(num_models * trim_ratio)
+            aggregated = parameters[trimmed:num_models - trimmed].mean(axis=0)
+
+    return layout.unflatten(np.ascontiguousarray(aggregated, dtype=np.float32), current_state)
+
+
+def relative_change(old_state, new_state):
+    """L2 norm of the change of all floating point parameters relative to their old norm; None if the layouts differ."""
+    layout = ParameterLayout(old_state)
+    if not layout.matches(new_state):
+        return None
+    parameters = np.empty((2, layout.size), dtype=np.float32)
+    layout.flatten_into(old_state, parameters[0])
+    layout.flatten_into(new_state, parameters[1])
+    old_norm = float(np.linalg.norm(parameters[0]))
+    return float(np.linalg.norm(parameters[1] - parameters[0])) / max(old_norm, 1e-12)
+
+
+def _sample_weights(sample_counts, num_models):
+    """
+    Normalized FedAvg weights; models without a known sample count are weighted like an average model.
+    Without any known (non-zero) sample count all models are weighted equally.
+    """
+    counts = np.array([np.nan if count is None else count for count in (sample_counts or [None] * num_models)], dtype=np.float64)
+    known = ~np.isnan(counts)
+    if not known.any():
+        logging.warning("[AGGREGATION] No sample counts known, averaging all models equally")
+        return np.full(num_models, 1.0 / num_models, dtype=np.float32)
+    counts[~known] = counts[known].mean()
+    if counts.sum() <= 0:
+        logging.warning("[AGGREGATION] All sample counts are zero, averaging all models equally")
+        return np.full(num_models, 1.0 / num_models, dtype=np.float32)
+    return (counts / counts.sum()).astype(np.float32)
@@ -0,0 +1,69 @@
+import unittest
+import numpy as np
+import torch
+from aggregation import ParameterLayout, aggregate_states, relative_change
+
+class TestAggregation(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.current = {"fc.weight": torch.randn(3, 4), "fc.bias": torch.randn(3), "steps": torch.tensor(7)}
+        self.peers = [{k: (torch.randn_like(v) if v.is_floating_point() else v) for k, v in self.current.items()} for _ in range(4)]
+
+    def stacked(self, name):
+        return torch.stack([self.current[name]] + [peer[name] for peer in self.peers]).numpy()
+
+    def test_layout_round_trip(self):
+        layout = ParameterLayout(self.current)
+        row = np.empty(layout.size, dtype=np.float32)
+        layout.flatten_into(self.current, row)
+
+        restored = layout.unflatten(row, self.current)
+
+        for name, tensor in self.current.items():
+            self.assertTrue(torch.equal(restored[name], tensor))
+
+    def test_weighted_keeps_half_of_the_current_model(self):
+        aggregated = aggregate_states(self.current, self.peers, strategy="weighted", current_model_weight=0.5)
+
+        expected = 0.5 * self.current["fc.weight"].numpy() + 0.5 * self.stacked("fc.weight")[1:].mean(axis=0)
+        np.testing.assert_allclose(aggregated["fc.weight"].numpy(), expected, rtol=1e-5, atol=1e-6)
+        self.assertTrue(torch.equal(aggregated["steps"], self.current["steps"]))
+
+    def test_fedavg_weights_by_sample_count(self):
+        counts = [100, 300, None, 100, 500]
+
+        aggregated = aggregate_states(self.current, self.peers, strategy="fedavg", sample_counts=counts)
+
+        weights = np.array([100, 300, 250, 100, 500], dtype=np.float64)
+        expected = np.tensordot(weights / weights.sum(), self.stacked("fc.bias"), axes=1)
+        np.testing.assert_allclose(aggregated["fc.bias"].numpy(), expected, rtol=1e-5, atol=1e-6)
+
+    def test_median_and_trimmed_mean_ignore_outliers(self):
+        self.peers[0] = {k: (torch.full_like(v, 1e6) if v.is_floating_point() else v) for k, v in self.current.items()}
+
+        median = aggregate_states(self.current, self.peers, strategy="median")
+        trimmed = aggregate_states(self.current, self.peers, strategy="trimmed_mean", trim_ratio=0.2)
+
+        np.testing.assert_allclose(median["fc.weight"].numpy(), np.median(self.stacked("fc.weight"), axis=0), rtol=1e-6)
+        expected_trimmed = np.sort(self.stacked("fc.weight"), axis=0)[1:-1].mean(axis=0)
+        np.testing.assert_allclose(trimmed["fc.weight"].numpy(), expected_trimmed, rtol=1e-5, atol=1e-6)
+        self.assertLess(np.abs(trimmed["fc.weight"].numpy()).max(), 10)
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            aggregate_states(self.current, self.peers, strategy="mode")
+
+    def test_fedavg_with_zero_sample_counts_averages_equally(self):
+        aggregated = aggregate_states(self.current, self.peers, strategy="fedavg", sample_counts=[0] * 5)
+
+        np.testing.assert_allclose(aggregated["fc.weight"].numpy(), self.stacked("fc.weight").mean(axis=0), rtol=1e-5, atol=1e-6)
+
+    def test_relative_change(self):
+        moved = {k: (v * 1.1 if v.is_floating_point() else v) for k, v in self.current.items()}
+
+        self.assertAlmostEqual(relative_change(self.current, moved), 0.1, places=5)
+        self.assertEqual(relative_change(self.current, self.current), 0.0)
+        self.assertIsNone(relative_change(self.current, {"fc.weight": torch.zeros(2, 2)}))
+
+if __name__ == '__main__':
+    unittest.main()
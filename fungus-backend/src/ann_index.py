@@ -0,0 +1,140 @@
+# ann_index.py
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ANN_INDEX = os.getenv("ANN_INDEX", "lsh")
+ANN_NUM_TABLES = int(os.getenv("ANN_NUM_TABLES", 8))
+ANN_NUM_BITS = int(os.getenv("ANN_NUM_BITS", 12))
+ANN_EXACT_THRESHOLD = int(os.getenv("ANN_EXACT_THRESHOLD", 10000))
+
+
+def top_k_indices(scores, k):
+    """
+    Returns the indices of the k highest scores per row, best first.
+    Uses argpartition, so only the k selected entries are sorted instead of the whole row.
+    """
+    scores = np.atleast_2d(scores)
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.intp)
+    k = min(k, scores.shape[1])
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class ExactIndex:
+    """Brute-force inner product search over L2-normalized vectors (i.e. cosine similarity)."""
+
+    def __init__(self):
+        self.vectors = None
+
+    def __len__(self):
+        return 0 if self.vectors is None else len(self.vectors)
+
+    def build(self, vectors):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+
+    def add(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.vectors = vectors if self.vectors is None else np.concatenate([self.vectors, vectors])
+
+    def search(self, queries, k, exclude=None):
+        """
+        Returns the indices of the k most similar vectors for each query, best first.
+        exclude optionally holds one index per query that must not be returned (e.g. the query itself).
+        """
+        queries = np.atleast_2d(queries)
+        similarity = queries @ self.vectors.T
+        if exclude is not None:
+            similarity[np.arange(len(queries)), exclude] = -np.inf
+            k = min(k, len(self) - 1)
+        return top_k_indices(similarity, k)
+
+
+class LSHIndex(ExactIndex):
+    """
+    Approximate cosine search with random-projection (sign) LSH.
+    Each of num_tables tables hashes a vector to num_bits hyperplane signs; a query is only scored
+    against vectors that share a bucket with it in at least one table.
+    More tables raise recall, more bits make buckets smaller and searches faster.
+    Catalogs smaller than exact_threshold, and queries with too few candidates, fall back to an exact scan.
+    """
+
+    def __init__(self, num_tables=ANN_NUM_TABLES, num_bits=ANN_NUM_BITS, exact_threshold=ANN_EXACT_THRESHOLD, seed=0):
+        super().__init__()
+        self.num_tables = num_tables
+        self.num_bits = num_bits
+        self.exact_threshold = exact_threshold
+        self.rng = np.random.default_rng(seed)
+        self.planes = None
+        self.codes = None
+        self.sorted_ids = None
+        self.sorted_codes = None
+        self.num_sorted = 0
+
+    def build(self, vectors):
+        """(Re)builds all tables; the hyperplanes are kept, so a rebuild is one projection and one sort per table."""
+        super().build(vectors)
+        if self.planes is None or self.planes.shape[1] != self.vectors.shape[1]:
+            self.planes = self.rng.standard_normal((self.num_tables, self.vectors.shape[1], self.num_bits)).astype(np.float32)
+        self.codes = self._hash(self.vectors)
+        self._sort_tables()
+
+    def add(self, vectors):
+        """Appends vectors; they are scanned as pending candidates until the tables are re-sorted."""
+        if self.vectors is None:
+            self.build(vectors)
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        super().add(vectors)
+        self.codes = np.concatenate([self.codes, self._hash(vectors)])
+        if len(self) - self.num_sorted > max(1024, self.num_sorted // 10):
+            self._sort_tables()
+
+    def search(self, queries, k, exclude=None):
+        queries = np.atleast_2d(queries)
+        if len(self) < self.exact_threshold:
+            return super().search(queries, k, exclude)
+
+        k = min(k, len(self) - 1) if exclude is not None else min(k, len(self))
+        query_codes = self._hash(queries)
+        pending = np.arange(self.num_sorted, len(self))
+        results = np.empty((len(queries), k), dtype=np.intp)
+        for i, query in enumerate(queries):
+            candidates = np.unique(np.concatenate([self._bucket(t, query_codes[i, t]) for t in range(self.num_tables)] + [pending]))
+            if exclude is not None:
+                candidates = candidates[candidates != exclude[i]]
+            if len(candidates) < k:
+                # Not enough neighbours in the probed buckets, scan the whole index instead
+                candidates = np.arange(len(self))
+                if exclude is not None:
+                    candidates = candidates[candidates != exclude[i]]
+            similarity = self.vectors[candidates] @ query
+            results[i] = candidates[top_k_indices(similarity, k)[0]]
+        return results
+
+    def _hash(self, vectors):
+        """Returns one integer bucket code per vector and table, shape (n, num_tables)."""
+        bits = np.einsum('nd,tdb->ntb', vectors, self.planes) > 0
+        return bits.astype(np.int64) @ (1 << np.arange(self.num_bits, dtype=np.int64))
+
+    def _sort_tables(self):
+        self.sorted_ids = np.argsort(self.codes, axis=0, kind='stable').T
+        self.sorted_codes = np.take_along_axis(self.codes.T, self.sorted_ids, axis=1)
+        self.num_sorted = len(self)
+
+    def _bucket(self, table, code):
+        start, end = np.searchsorted(self.sorted_codes[table], [code, code + 1])
+        return self.sorted_ids[table, start:end]
+
+
+def create_ann_index(kind=ANN_INDEX):
+    """Creates the nearest-neighbour index configured via ANN_INDEX ('lsh' or 'exact')."""
+    if kind == "exact":
+        return ExactIndex()
+    if kind == "lsh":
+        return LSHIndex()
+    raise ValueError(f"Unknown ANN index type: {kind}")
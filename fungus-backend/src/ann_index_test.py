@@ -0,0 +1,54 @@
+import unittest
+import numpy as np
+from ann_index import ExactIndex, LSHIndex, create_ann_index, top_k_indices
+
+def random_unit_vectors(n, dim, seed):
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+class TestAnnIndex(unittest.TestCase):
+    def setUp(self):
+        self.vectors = random_unit_vectors(2000, 16, seed=1)
+
+    def test_top_k_indices(self):
+        scores = np.array([[0.1, 0.9, 0.5, 0.7], [0.4, 0.3, 0.2, 0.1]])
+        np.testing.assert_array_equal(top_k_indices(scores, 2), [[1, 3], [0, 1]])
+        self.assertEqual(top_k_indices(scores, 10).shape, (2, 4))
+        self.assertEqual(top_k_indices(scores, 0).shape, (2, 0))
+
+    def test_exact_index_excludes_query(self):
+        index = ExactIndex()
+        index.build(self.vectors)
+        result = index.search(self.vectors[:3], 5, exclude=np.arange(3))
+        self.assertEqual(result.shape, (3, 5))
+        for i in range(3):
+            self.assertNotIn(i, result[i])
+
+    def test_lsh_index_recall(self):
+        exact = ExactIndex()
+        exact.build(self.vectors)
+        lsh = LSHIndex(num_tables=16, num_bits=6, exact_threshold=0)
+        lsh.build(self.vectors)
+
+        queries = np.arange(50)
+        expected = exact.search(self.vectors[queries], 10, exclude=queries)
+        result = lsh.search(self.vectors[queries], 10, exclude=queries)
+        recall = np.mean([len(set(expected[i]) & set(result[i])) / 10 for i in range(len(queries))])
+        self.assertGreater(recall, 0.8)
+
+    def test_lsh_index_add(self):
+        lsh = LSHIndex(num_tables=4, num_bits=4, exact_threshold=0)
+        lsh.build(self.vectors[:1000])
+        lsh.add(self.vectors[1000:])
+        self.assertEqual(len(lsh), 2000)
+        result = lsh.search(self.vectors[1500], 1)
+        self.assertEqual(result[0, 0], 1500)
+
+    def test_create_ann_index(self):
+        self.assertIsInstance(create_ann_index("exact"), ExactIndex)
+        self.assertIsInstance(create_ann_index("lsh"), LSHIndex)
+        with self.assertRaises(ValueError):
+            create_ann_index("unknown")
+
+if __name__ == '__main__':
+    unittest.main()
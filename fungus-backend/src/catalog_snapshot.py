@@ -0,0 +1,162 @@
+# catalog_snapshot.py
+import csv
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CATALOG_SNAPSHOT_DIR = os.getenv("CATALOG_SNAPSHOT_DIR", "catalog_snapshot")
+SNAPSHOT_FORMAT_VERSION = 1
+META_FILE = "meta.json"
+
+
+def file_digest(path):
+    """sha256 of a file's content, identifies the source a snapshot was built from."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CatalogSnapshot:
+    """
+    The decoded song catalog and, once encoded, its CSR feature matrix with the encoder state that produced it.
+
+    Saved as a directory of .npy files plus meta.json: numeric columns and the CSR arrays are stored raw
+    and memory-mapped on load, string columns are dictionary-encoded (int32 codes into a UTF-8 blob of the
+    distinct values), so loading an unchanged catalog touches no parser and no knowledge base.
+    """
+
+    def __init__(self, songs, features=None, encoder_state=None, source_digest=None):
+        self.songs = songs
+        self.features = features
+        self.encoder_state = encoder_state
+        self.source_digest = source_digest
+
+    def save(self, directory=CATALOG_SNAPSHOT_DIR):
+        """Writes the snapshot next to directory and then swaps it in, so readers never see a partial one."""
+        try:
+            self._write(directory)
+        except OSError as e:
+            logging.warning(f"[CATALOG] Could not save snapshot to {directory}: {e}")
+
+    def _write(self, directory):
+        staging = directory.rstrip("/") + ".tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        columns = {}
+        for column in self.songs.columns:
+            values = self.songs[column]
+            if pd.api.types.is_numeric_dtype(values):
+                np.save(os.path.join(staging, f"{column}.npy"), values.to_numpy())
+                columns[column] = "numeric"
+                continue
+            codes, distinct = pd.factorize(values.astype(str))
+            encoded = [value.encode('utf-8') for value in distinct]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(value) for value in encoded])
+            np.save(os.path.join(staging, f"{column}.codes.npy"), codes.astype(np.int32))
+            np.save(os.path.join(staging, f"{column}.offsets.npy"), offsets)
+            np.save(os.path.join(staging, f"{column}.values.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+            columns[column] = "string"
+
+        meta = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "source_digest": self.source_digest,
+            "num_songs": len(self.songs),
+            "columns": columns,
+            "features_shape": None,
+            "encoder_state": self.encoder_state,
+        }
+        if self.features is not None:
+            features = self.features.tocsr()
+            np.save(os.path.join(staging, "features.data.npy"), features.data)
+            np.save(os.path.join(staging, "features.indices.npy"), features.indices)
+            np.save(os.path.join(staging, "features.indptr.npy"), features.indptr)
+            meta["features_shape"] = list(features.shape)
+        with open(os.path.join(staging, META_FILE), 'w') as file:
+            json.dump(meta, file)
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+        logging.info(f"[CATALOG] Saved snapshot of {len(self.songs)} songs to {directory}")
+
+    @classmethod
+    def load(cls, directory=CATALOG_SNAPSHOT_DIR, source_digest=None):
+        """Loads a snapshot; returns None if there is none, it is unreadable or was built from another source."""
+        start = time.perf_counter()
+        try:
+            with open(os.path.join(directory, META_FILE)) as file:
+                meta = json.load(file)
+            if meta["format_version"] != SNAPSHOT_FORMAT_VERSION:
+                return None
+            if source_digest is not None and meta["source_digest"] != source_digest:
+                logging.info("[CATALOG] Source changed since the snapshot was taken, ignoring it")
+                return None
+
+            songs = {}
+            for column, kind in meta["columns"].items():
+                if kind == "numeric":
+                    songs[column] = np.load(os.path.join(directory, f"{column}.npy"), mmap_mode='r')
+                    continue
+                codes = np.load(os.path.join(directory, f"{column}.codes.npy"), mmap_mode='r')
+                offsets = np.load(os.path.join(directory, f"{column}.offsets.npy"))
+                blob = np.load(os.path.join(directory, f"{column}.values.npy")).tobytes()
+                distinct = np.array([blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)], dtype=object)
+                songs[column] = distinct[codes]
+
+            features = None
+            if meta["features_shape"] is not None:
+                # Copy-on-write mappings: pages are only read from disk when rows are accessed
+                features = sparse.csr_matrix((
+                    np.load(os.path.join(directory, "features.data.npy"), mmap_mode='c'),
+                    np.load(os.path.join(directory, "features.indices.npy"), mmap_mode='c'),
+                    np.load(os.path.join(directory, "features.indptr.npy"), mmap_mode='c'),
+                ), shape=tuple(meta["features_shape"]), copy=False)
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"[CATALOG] Could not load snapshot from {directory}: {e}")
+            return None
+
+        snapshot = cls(pd.DataFrame(songs), features, meta["encoder_state"], meta["source_digest"])
+        logging.info(f"[CATALOG] Loaded snapshot of {meta['num_songs']} songs in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return snapshot
+
+
+def load_catalog(knowledge_graph, csv_file, directory=CATALOG_SNAPSHOT_DIR):
+    """
+    Cold start: returns the catalog snapshot of csv_file and makes sure the knowledge graph holds its songs.
+    If a snapshot of the same csv_file exists and the knowledge graph carries the digest of csv_file (written
+    once its songs were ingested completely, by this node or another one sharing the dataset), neither the CSV
+    nor the knowledge graph is read. Songs inserted later, e.g. from Mastodon statuses, do not invalidate it.
+    Otherwise the CSV is (re-)ingested and the songs are queried again; the returned snapshot has no features
+    in that case, see MLService.snapshot_catalog.
+    """
+    source_digest = file_digest(csv_file)
+    snapshot = CatalogSnapshot.load(directory, source_digest)
+    if snapshot is not None and knowledge_graph.has_catalog_digest(source_digest):
+        knowledge_graph.songs_data = snapshot.songs
+        return snapshot
+
+    inserted = knowledge_graph.insert_songs_from_csv(csv_file)
+    if inserted == csv_row_count(csv_file):
+        knowledge_graph.mark_catalog_digest(source_digest)
+    else:
+        logging.warning(f"[CATALOG] Only {inserted} songs of {csv_file} were inserted, it is ingested again on the next start")
+    knowledge_graph.fetch_all_songs()
+    return CatalogSnapshot(knowledge_graph.songs_data, source_digest=source_digest)
+
+
+def csv_row_count(path):
+    """Number of data rows of a CSV file with a header line."""
+    with open(path, newline='') as file:
+        return sum(1 for _ in csv.DictReader(file))
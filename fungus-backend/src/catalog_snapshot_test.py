@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import numpy as np
+import pandas as pd
+from catalog_snapshot import CatalogSnapshot, file_digest, load_catalog
+from feature_encoder import SongFeatureEncoder
+from rdf_knowledge_graph import RDFKnowledgeGraph
+
+class TestCatalogSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmp.name, "catalog")
+        self.csv_file = os.path.join(self.tmp.name, "songs.csv")
+        self.songs = pd.DataFrame({
+            'song_id': [1, 2, 3],
+            'title': ['Song A', 'Söng B', 'Song C'],
+            'genre': ['Rock', 'Pop', 'Rock'],
+            'artist': ['Artist1', 'Artist2', 'Artist1'],
+            'tempo': [120, 130, 140],
+            'duration': [200, 220, 180]
+        })
+        self.songs.to_csv(self.csv_file, index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save_and_load_round_trip(self):
+        encoder = SongFeatureEncoder(mode="vocabulary")
+        features = encoder.fit_transform(self.songs)
+        CatalogSnapshot(self.songs, features, encoder.get_state(), "digest").save(self.directory)
+
+        snapshot = CatalogSnapshot.load(self.directory, "digest")
+
+        self.assertEqual(snapshot.songs['title'].tolist(), self.songs['title'].tolist())
+        self.assertEqual(snapshot.songs['tempo'].tolist(), [120, 130, 140])
+        np.testing.assert_array_equal(snapshot.features.toarray(), features.toarray())
+        restored = SongFeatureEncoder()
+        restored.set_state(snapshot.encoder_state)
+        np.testing.assert_array_equal(restored.transform(self.songs).toarray(), encoder.transform(self.songs).toarray())
+
+    def test_load_ignores_snapshot_of_other_source(self):
+        CatalogSnapshot(self.songs, source_digest="old").save(self.directory)
+
+        self.assertIsNone(CatalogSnapshot.load(self.directory, "new"))
+        self.assertIsNone(CatalogSnapshot.load(os.path.join(self.tmp.name, "missing"), "new"))
+
+    def test_load_catalog_skips_ingest_when_unchanged(self):
+        CatalogSnapshot(self.songs, source_digest=file_digest(self.csv_file)).save(self.directory)
+        knowledge_graph = MagicMock()
+        knowledge_graph.has_catalog_digest.return_value = True
+
+        snapshot = load_catalog(knowledge_graph, self.csv_file, self.directory)
+
+        knowledge_graph.has_catalog_digest.assert_called_once_with(file_digest(self.csv_file))
+        knowledge_graph.insert_songs_from_csv.assert_not_called()
+        self.assertEqual(len(knowledge_graph.songs_data), 3)
+        self.assertIs(knowledge_graph.songs_data, snapshot.songs)
+
+    def test_load_catalog_ingests_and_marks_digest_when_knowledge_graph_lacks_it(self):
+        CatalogSnapshot(self.songs, source_digest=file_digest(self.csv_file)).save(self.directory)
+        knowledge_graph = MagicMock()
+        knowledge_graph.has_catalog_digest.return_value = False
+        knowledge_graph.insert_songs_from_csv.return_value = 3
+
+        snapshot = load_catalog(knowledge_graph, self.csv_file, self.directory)
+
+        knowledge_graph.insert_songs_from_csv.assert_called_once_with(self.csv_file)
+        knowledge_graph.mark_catalog_digest.assert_called_once_with(file_digest(self.csv_file))
+        knowledge_graph.fetch_all_songs.assert_called_once()
+        self.assertIsNone(snapshot.features)
+
+    def test_load_catalog_does_not_mark_a_partial_ingest(self):
+        knowledge_graph = MagicMock()
+        knowledge_graph.insert_songs_from_csv.return_value = 2
+
+        load_catalog(knowledge_graph, self.csv_file, self.directory)
+
+        knowledge_graph.mark_catalog_digest.assert_not_called()
+
+    def test_songs_inserted_later_keep_the_snapshot_valid(self):
+        knowledge_graph = RDFKnowledgeGraph(MagicMock(), fuseki_url="http://localhost:3030", dataset="db", transport=MagicMock(),
+                                            mode="local", load_songs=False)
+        load_catalog(knowledge_graph, self.csv_file, self.directory)
+        CatalogSnapshot(knowledge_graph.songs_data, source_digest=file_digest(self.csv_file)).save(self.directory)
+        knowledge_graph.insert_song_data(4, "Song D", "Pop", "Artist4", 100, 210)
+
+        with patch.object(knowledge_graph, "insert_songs_from_csv") as insert_songs_from_csv:
+            snapshot = load_catalog(knowledge_graph, self.csv_file, self.directory)
+
+        insert_songs_from_csv.assert_not_called()
+        self.assertEqual(len(snapshot.songs), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+# epoch_scheduler.py
+import asyncio
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds between two polls for new spore actions
+SPORE_POLL_INTERVAL = float(os.getenv("SPORE_POLL_INTERVAL", 30))
+# Received JOIN_GROUP actions kept until the next group search
+PENDING_JOIN_LIMIT = int(os.getenv("PENDING_JOIN_LIMIT", 100))
+
+
+class EpochScheduler:
+    """
+    Runs the epochs of a MusicRecommendationFungus on an asyncio event loop.
+
+    CPU stages (training, aggregation, fitness) run one at a time on a dedicated worker thread; blocking I/O
+    (knowledge graph and ActivityPub calls) runs on an I/O thread pool, so e.g. the models of the learning group
+    are fetched while the own model is still training. Status posts go to the outbox of the Mastodon client and
+    never delay a stage. A poller task fetches spore actions in the background; JOIN_GROUP actions are kept only
+    while the node is looking for a group, and wake it immediately instead of at the end of its sleep.
+    """
+
+    def __init__(self, fungus, poll_interval=SPORE_POLL_INTERVAL, io_workers=4):
+        self.fungus = fungus
+        self.poll_interval = poll_interval
+        self.cpu_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="epoch-cpu")
+        self.io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="epoch-io")
+        self.pending_joins = deque(maxlen=PENDING_JOIN_LIMIT)
+        self.switch_team = True
+        self.found_initial_team = False
+        self.epoch = 0
+        self.loop = None
+        self.wake_up = None
+
+    def run(self, max_epochs=None):
+        """Blocks and runs epochs until max_epochs (forever if None)."""
+        asyncio.run(self.main(max_epochs))
+
+    async def main(self, max_epochs=None):
+        self.loop = asyncio.get_running_loop()
+        self.wake_up = asyncio.Event()
+        poller = asyncio.create_task(self.poll_spore_actions())
+        try:
+            while True:
+                await self.run_epoch()
+                self.epoch += 1
+                if max_epochs is not None and self.epoch >= max_epochs:
+                    break
+                await self.sleep()
+        finally:
+            poller.cancel()
+            self.cpu_executor.shutdown(wait=False)
+            self.io_executor.shutdown(wait=False)
+
+    def is_looking_for_group(self):
+        return self.switch_team or not self.found_initial_team
+
+    async def run_epoch(self):
+        fungus = self.fungus
+        logging.info(f"[START] Starting epoche {self.epoch} (at {datetime.now()})")
+        try:
+            if self.is_looking_for_group():
+                self.post_status("[SPORE] Searching for a new learning group ...")
+                logging.info("[CHECK] Searching for a new fungus group")
+                join_spore_actions = list(self.pending_joins)
+                self.pending_joins.clear()
+                # Probes the offered groups concurrently and picks the best one (see group_selector.py)
+                join_spore_action = await self.io(fungus.select_learning_group, join_spore_actions) if join_spore_actions else None
+                if join_spore_action is not None:
+                    await self.io(fungus.join_learning_group, join_spore_action)
+                    self.found_initial_team = True
+                else:
+                    logging.info("[WAIT] No group to join found.")
+                    self.post_status("[SPORE] No initial learning group found. Going to sleep.")
+            else:
+                # send invite to join group
+                await self.io(fungus.announce_learning_group)
+                self.post_status(f"[SPORE] Invited node to join group: {fungus.link_to_database}")
+
+            if fungus.link_to_database is None:
+                logging.error("The model is none")
+                return
+
+            logging.info("[TRAINING] New fungus group detected, initiating training")
+            self.post_status("[SPORE] Started new training epoche.")
+            # Songs posted since the last epoch are added to the catalog before training on it
+            await self.io(fungus.ingest_songs_from_statuses)
+            # Peers publish independently, so their models can be fetched while the own model trains
+            # (fetch_learning_group_models leaves out the own model, which train_model is about to replace)
+            _, group_models = await asyncio.gather(self.cpu(fungus.train_model), self.io(fungus.fetch_learning_group_models))
+            self.post_status("[SPORE] Finished training and received model from other nodes.")
+            await self.cpu(fungus.aggregate_and_deploy, group_models)
+            self.post_status("[SPORE] Deployed aggregated model.")
+
+            self.switch_team = await self.cpu(fungus.evaluate_fitness)
+            fungus.update_cadence()
+            if self.switch_team:
+                self.post_status("[SPORE] Decided to switch the learning group.")
+                fungus.link_to_database = None
+            else:
+                self.post_status("[SPORE] Decided against switching groups.")
+            fungus.evolve_behavior()
+        except Exception as e:
+            logging.error(f"[ERROR] An error occurred: {e}", exc_info=True)
+        finally:
+            fungus.knowledge_graph.transport.log_latency_report()
+
+    async def sleep(self):
+        """Sleeps for the fungus' sleep time, or until a JOIN_GROUP action arrives while looking for a group."""
+        sleep_time = self.fungus.sleep_time
+        logging.info("[SLEEP] Sleeping for " + str(sleep_time))
+        self.post_status(f"[SPORE] Sleeping for {str(sleep_time)}.")
+        self.wake_up.clear()
+        if self.is_looking_for_group() and self.pending_joins:
+            return
+        try:
+            await asyncio.wait_for(self.wake_up.wait(), timeout=sleep_time)
+            logging.info("[WAKE] Received a JOIN_GROUP action, starting the next epoch early")
+        except asyncio.TimeoutError:
+            pass
+
+    async def poll_spore_actions(self):
+        spore_manager = self.fungus.spore_manager
+        while True:
+            try:
+                await self.io(spore_manager.fetch_spore_actions)
+                join_spore_actions = self.fungus.filter_spore_actions_by_type(spore_manager.get_spore_actions() or [], 'JOIN_GROUP')
+                # Offers received while in a group would be stale by the next search
+                if join_spore_actions and self.is_looking_for_group():
+                    self.pending_joins.extend(join_spore_actions)
+                    self.wake_up.set()
+            except Exception as e:
+                logging.warning(f"[POLL] Fetching spore actions failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def post_status(self, status_text):
+        """Queues a status in the outbox of the Mastodon client, which returns immediately."""
+        self.fungus.mastodon_client.post_status(status_text)
+
+    async def cpu(self, function, *args):
+        return await self.loop.run_in_executor(self.cpu_executor, function, *args)
+
+    async def io(self, function, *args):
+        return await self.loop.run_in_executor(self.io_executor, function, *args)
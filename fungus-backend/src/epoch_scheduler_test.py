@@ -0,0 +1,156 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from epoch_scheduler import EpochScheduler
+from spore_action import SporeAction
+
+class FakeFungus:
+    def __init__(self, fitness_switches=True):
+        self.link_to_database = "http://localhost:3030/db/query"
+        self.sleep_time = 30
+        self.mastodon_client = MagicMock()
+        self.knowledge_graph = MagicMock()
+        self.spore_manager = MagicMock()
+        self.spore_manager.get_spore_actions.return_value = []
+        self.fitness_switches = fitness_switches
+        self.joined = []
+        self.events = []
+        self.lock = threading.Lock()
+
+    def record(self, event):
+        with self.lock:
+            self.events.append((event, time.perf_counter()))
+
+    def announce_learning_group(self):
+        self.record("announce")
+
+    def select_learning_group(self, join_spore_actions):
+        return join_spore_actions[0]
+
+    def join_learning_group(self, join_spore_action):
+        self.joined.append(join_spore_action)
+        self.link_to_database = join_spore_action.args[0]
+
+    def ingest_songs_from_statuses(self):
+        self.record("ingest")
+
+    def train_model(self):
+        self.record("train_start")
+        time.sleep(0.2)
+        self.record("train_end")
+
+    def fetch_learning_group_models(self):
+        self.record("fetch_start")
+        time.sleep(0.2)
+        self.record("fetch_end")
+        return []
+
+    def aggregate_and_deploy(self, models):
+        self.record("aggregate")
+
+    def evaluate_fitness(self):
+        return self.fitness_switches
+
+    def update_cadence(self):
+        self.record("cadence")
+
+    def evolve_behavior(self):
+        pass
+
+    def filter_spore_actions_by_type(self, spore_actions, spore_type):
+        return list(filter(lambda e: e.spore_type == spore_type, spore_actions))
+
+    def times(self, event):
+        return [t for name, t in self.events if name == event]
+
+class TestEpochScheduler(unittest.TestCase):
+    def test_training_overlaps_with_fetching_peer_models(self):
+        fungus = FakeFungus(fitness_switches=False)
+        scheduler = EpochScheduler(fungus, poll_interval=60)
+        fungus.sleep_time = 0
+
+        start = time.perf_counter()
+        scheduler.run(max_epochs=1)
+
+        self.assertLess(time.perf_counter() - start, 0.35)
+        self.assertLess(fungus.times("fetch_start")[0], fungus.times("train_end")[0])
+        self.assertGreater(fungus.times("aggregate")[0], max(fungus.times("train_end")[0], fungus.times("fetch_end")[0]))
+        self.assertFalse(scheduler.switch_team)
+        self.assertGreater(fungus.times("cadence")[0], fungus.times("aggregate")[0])
+        self.assertLess(fungus.times("ingest")[0], fungus.times("train_start")[0])
+
+    def test_join_group_action_wakes_the_scheduler(self):
+        fungus = FakeFungus(fitness_switches=True)
+        join = SporeAction("JOIN_GROUP", ["http://peer:3030/db/query", "group-1"], "fungus-node-1")
+
+        def fetch_spore_actions():
+            # The JOIN_GROUP action arrives once, after the first training
+            arrived = fungus.times("train_end") and not fungus.times("delivered")
+            if arrived:
+                fungus.record("delivered")
+            fungus.spore_manager.get_spore_actions.return_value = [join] if arrived else []
+        fungus.spore_manager.fetch_spore_actions.side_effect = fetch_spore_actions
+        scheduler = EpochScheduler(fungus, poll_interval=0.05)
+
+        start = time.perf_counter()
+        scheduler.run(max_epochs=2)
+
+        # Far less than the 30s sleep time
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertEqual(fungus.joined, [join])
+        self.assertEqual(len(fungus.times("train_end")), 2)
+        self.assertTrue(scheduler.found_initial_team)
+
+    def test_failing_epoch_does_not_stop_the_scheduler(self):
+        fungus = FakeFungus(fitness_switches=False)
+        fungus.sleep_time = 0
+        fungus.train_model = MagicMock(side_effect=RuntimeError("boom"))
+        scheduler = EpochScheduler(fungus, poll_interval=60)
+
+        scheduler.run(max_epochs=2)
+
+        self.assertEqual(fungus.train_model.call_count, 2)
+        self.assertEqual(fungus.knowledge_graph.transport.log_latency_report.call_count, 2)
+
+    def test_status_posts_are_queued_without_the_io_pool(self):
+        fungus = FakeFungus(fitness_switches=False)
+        fungus.sleep_time = 0
+        scheduler = EpochScheduler(fungus, poll_interval=60, io_workers=1)
+        posted_from = []
+        fungus.mastodon_client.post_status.side_effect = lambda text: posted_from.append(threading.current_thread().name)
+
+        scheduler.run(max_epochs=1)
+
+        self.assertEqual(fungus.mastodon_client.post_status.call_count, 6)
+        self.assertFalse(any(name.startswith("epoch-io") for name in posted_from))
+
+    def test_executors_are_shut_down_after_the_last_epoch(self):
+        fungus = FakeFungus(fitness_switches=False)
+        fungus.sleep_time = 0
+        scheduler = EpochScheduler(fungus, poll_interval=60)
+
+        scheduler.run(max_epochs=1)
+
+        with self.assertRaises(RuntimeError):
+            scheduler.cpu_executor.submit(print)
+        with self.assertRaises(RuntimeError):
+            scheduler.io_executor.submit(print)
+
+    def test_join_group_actions_are_ignored_while_in_a_group(self):
+        fungus = FakeFungus(fitness_switches=False)
+        fungus.sleep_time = 0.3
+        join = SporeAction("JOIN_GROUP", ["http://peer:3030/db/query", "group-1"], "fungus-node-1")
+        fungus.spore_manager.get_spore_actions.return_value = [join]
+        scheduler = EpochScheduler(fungus, poll_interval=0.05)
+        scheduler.found_initial_team = True
+        scheduler.switch_team = False
+
+        scheduler.run(max_epochs=2)
+
+        self.assertGreater(fungus.spore_manager.fetch_spore_actions.call_count, 1)
+        self.assertEqual(list(scheduler.pending_joins), [])
+        self.assertEqual(fungus.joined, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+# feature_encoder.py
+import logging
+import os
+import zlib
+import numpy as np
+import pandas as pd
+import torch
+from scipy import sparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 'hashed' gives every node the same feature dimension, so peer models can always be aggregated;
+# 'vocabulary' one-hot encodes the local catalog
+FEATURE_ENCODING = os.getenv("FEATURE_ENCODING", "hashed")
+FEATURE_HASH_DIM = int(os.getenv("FEATURE_HASH_DIM", 256))
+# Share of extra one-hot columns reserved for genres/artists that first appear after the model was built
+VOCABULARY_HEADROOM = float(os.getenv("VOCABULARY_HEADROOM", 0.25))
+
+NUMERIC_COLUMNS = ['tempo', 'duration']
+CATEGORICAL_COLUMNS = ['genre', 'artist']
+
+
+class SongFeatureEncoder:
+    """
+    Encodes songs into a sparse CSR feature matrix: raw tempo/duration in the first columns,
+    followed by genre and artist columns.
+
+    In 'hashed' mode the categories are mapped with signed feature hashing into hash_dim columns,
+    so the dimension only depends on the configuration and is identical on every node.
+    In 'vocabulary' mode they are one-hot encoded from a persistent vocabulary of the local catalog.
+
+    Rows of new songs can be appended with transform() without re-encoding the catalog. The feature
+    dimension is fixed at fit time (including some headroom for new categories), so the model input
+    never changes shape; categories that no longer fit are ignored until the next fit.
+    The numeric columns are standardized when rows are converted to model input, using scaler
+    statistics that are only refreshed on refresh_scaler(), so already embedded rows stay consistent.
+    """
+
+    def __init__(self, mode=FEATURE_ENCODING, hash_dim=FEATURE_HASH_DIM, headroom=VOCABULARY_HEADROOM):
+        if mode not in ("hashed", "vocabulary"):
+            raise ValueError(f"Unknown feature encoding: {mode}")
+        self.mode = mode
+        self.hash_dim = hash_dim
+        self.headroom = headroom
+        self.vocabulary = {column: {} for column in CATEGORICAL_COLUMNS}
+        self.num_features = len(NUMERIC_COLUMNS) + (hash_dim if mode == "hashed" else 0)
+        self.num_used_features = len(NUMERIC_COLUMNS)
+        self.fitted = False
+        # Running statistics of the numeric columns (count, mean, sum of squared deviations)
+        self.count = 0
+        self.mean = np.zeros(len(NUMERIC_COLUMNS))
+        self.m2 = np.zeros(len(NUMERIC_COLUMNS))
+        # Statistics currently applied when converting rows to model input
+        self.scaler_mean = np.zeros(len(NUMERIC_COLUMNS), dtype=np.float32)
+        self.scaler_scale = np.ones(len(NUMERIC_COLUMNS), dtype=np.float32)
+
+    def fit_transform(self, songs):
+        """Builds vocabulary and scaler statistics from scratch and encodes all songs."""
+        self.__init__(self.mode, self.hash_dim, self.headroom)
+        if self.mode == "vocabulary":
+            for column in CATEGORICAL_COLUMNS:
+                for value in songs[column]:
+                    self._add_to_vocabulary(column, value)
+            self.num_features = self.num_used_features + int(np.ceil((self.num_used_features - len(NUMERIC_COLUMNS)) * self.headroom))
+        self.fitted = True
+        features = self.transform(songs)
+        self.refresh_scaler()
+        return features
+
+    def transform(self, songs):
+        """Encodes (new) songs, extending the vocabulary within the reserved headroom and the running statistics."""
+        numeric = songs[NUMERIC_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        self._update_statistics(numeric)
+
+        num_rows = len(songs)
+        rows = [np.repeat(np.arange(num_rows), len(NUMERIC_COLUMNS))]
+        cols = [np.tile(np.arange(len(NUMERIC_COLUMNS)), num_rows)]
+        data = [numeric.ravel()]
+        dropped = 0
+        for column in CATEGORICAL_COLUMNS:
+            if self.mode == "hashed":
+                hashed = [self._hash(column, value) for value in songs[column]]
+                rows.append(np.arange(num_rows))
+                cols.append(np.array([column_id for column_id, _ in hashed], dtype=np.int64))
+                data.append(np.array([sign for _, sign in hashed], dtype=np.float64))
+                continue
+            column_ids = np.array([self._add_to_vocabulary(column, value) for value in songs[column]], dtype=np.int64)
+            known = column_ids >= 0
+            dropped += int((~known).sum())
+            rows.append(np.arange(num_rows)[known])
+            cols.append(column_ids[known])
+            data.append(np.ones(int(known.sum())))
+        if dropped:
+            logging.warning(f"[FEATURES] Vocabulary full, ignoring {dropped} new genre/artist values until the next fit")
+
+        return sparse.csr_matrix(
+            (np.concatenate(data).astype(np.float32), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(num_rows, self.num_features)
+        )
+
+    def refresh_scaler(self):
+        """Applies the running statistics to all future model inputs."""
+        self.scaler_mean = self.mean.astype(np.float32)
+        std = np.sqrt(self.m2 / self.count) if self.count > 0 else np.ones(len(NUMERIC_COLUMNS))
+        self.scaler_scale = np.where(std > 0, std, 1.0).astype(np.float32)
+
+    def to_tensor(self, features, scaler=None):
+        """
+        Densifies (a batch of) CSR rows into a standardized float32 model input tensor.
+        scaler optionally overrides the current (mean, scale), e.g. with the one a snapshot was embedded with.
+        """
+        mean, scale = scaler if scaler is not None else (self.scaler_mean, self.scaler_scale)
+        dense = features.toarray()
+        dense[:, :len(NUMERIC_COLUMNS)] = (dense[:, :len(NUMERIC_COLUMNS)] - mean) / scale
+        return torch.from_numpy(dense)
+
+    def get_state(self):
+        """Returns vocabulary, dimensions and statistics as a JSON-serializable dict."""
+        return {
+            "mode": self.mode,
+            "hash_dim": self.hash_dim,
+            "headroom": self.headroom,
+            "vocabulary": self.vocabulary,
+            "num_features": self.num_features,
+            "num_used_features": self.num_used_features,
+            "fitted": self.fitted,
+            "count": self.count,
+            "mean": self.mean.tolist(),
+            "m2": self.m2.tolist(),
+            "scaler_mean": self.scaler_mean.tolist(),
+            "scaler_scale": self.scaler_scale.tolist(),
+        }
+
+    def set_state(self, state):
+        """Restores a state written by get_state, e.g. to reuse a persisted encoded catalog."""
+        self.__init__(state["mode"], state["hash_dim"], state["headroom"])
+        self.vocabulary = {column: dict(values) for column, values in state["vocabulary"].items()}
+        self.num_features = state["num_features"]
+        self.num_used_features = state["num_used_features"]
+        self.fitted = state["fitted"]
+        self.count = state["count"]
+        self.mean = np.array(state["mean"])
+        self.m2 = np.array(state["m2"])
+        self.scaler_mean = np.array(state["scaler_mean"], dtype=np.float32)
+        self.scaler_scale = np.array(state["scaler_scale"], dtype=np.float32)
+
+    def same_configuration(self, state):
+        """Whether a state written by get_state was encoded with this encoder's mode, hash_dim and headroom."""
+        return (state["mode"], state["hash_dim"], state["headroom"]) == (self.mode, self.hash_dim, self.headroom)
+
+    @property
+    def feature_space(self):
+        """Identifies the feature layout; models can only be aggregated within the same feature space."""
+        if self.mode == "hashed":
+            return f"hashed-{self.hash_dim}"
+        return f"vocabulary-{self.num_features}"
+
+    def _hash(self, column, value):
+        """Returns the (column, sign) of a category; the hash is stable across processes and nodes."""
+        digest = zlib.crc32(f"{column}={value}".encode('utf-8'))
+        sign = -1.0 if digest & 0x80000000 else 1.0
+        return len(NUMERIC_COLUMNS) + digest % self.hash_dim, sign
+
+    def _add_to_vocabulary(self, column, value):
+        """Returns the feature column of a category, assigning a new one if there is room, else -1."""
+        vocabulary = self.vocabulary[column]
+        column_id = vocabulary.get(value)
+        if column_id is None:
+            if self.fitted and self.num_used_features >= self.num_features:
+                return -1
+            column_id = self.num_used_features
+            vocabulary[value] = column_id
+            self.num_used_features += 1
+        return column_id
+
+    def _update_statistics(self, numeric):
+        """Merges a batch into the running mean/variance (Chan et al. parallel update)."""
+        batch_count = len(numeric)
+        if batch_count == 0:
+            return
+        batch_mean = numeric.mean(axis=0)
+        batch_m2 = ((numeric - batch_mean) ** 2).sum(axis=0)
+        total = self.count + batch_count
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * batch_count / total
+        self.m2 = self.m2 + batch_m2 + delta ** 2 * self.count * batch_count / total
+        self.count = total
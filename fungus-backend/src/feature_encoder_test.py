@@ -0,0 +1,74 @@
+import unittest
+import numpy as np
+import pandas as pd
+from feature_encoder import SongFeatureEncoder
+
+class TestSongFeatureEncoder(unittest.TestCase):
+    def setUp(self):
+        self.songs = pd.DataFrame({
+            'genre': ['Rock', 'Pop', 'Rock', 'Jazz'],
+            'artist': ['Artist1', 'Artist2', 'Artist3', 'Artist4'],
+            'tempo': [120, 130, 140, 150],
+            'duration': [200, 220, 180, 240]
+        })
+        self.encoder = SongFeatureEncoder(mode='vocabulary', headroom=0.5)
+
+    def test_fit_transform_is_sparse_with_headroom(self):
+        features = self.encoder.fit_transform(self.songs)
+        # 2 numeric + 3 genres + 4 artists, plus 50% headroom for new categories
+        self.assertEqual(features.shape, (4, 9 + 4))
+        self.assertEqual(features.nnz, 4 * 4)
+
+    def test_to_tensor_standardizes_numeric_columns(self):
+        features = self.encoder.fit_transform(self.songs)
+        dense = self.encoder.to_tensor(features).numpy()
+        np.testing.assert_allclose(dense[:, :2].mean(axis=0), [0, 0], atol=1e-6)
+        np.testing.assert_allclose(dense[:, :2].std(axis=0), [1, 1], atol=1e-5)
+        np.testing.assert_array_equal(dense[:, 2:].sum(axis=1), [2, 2, 2, 2])
+
+    def test_transform_appends_new_songs_without_changing_dimension(self):
+        features = self.encoder.fit_transform(self.songs)
+        new_songs = pd.DataFrame({
+            'genre': ['Rock', 'Blues', 'Metal', 'Folk', 'Soul'],
+            'artist': ['Artist1', 'Artist5', 'Artist6', 'Artist7', 'Artist8'],
+            'tempo': [100, 110, 90, 95, 105],
+            'duration': [100, 300, 200, 210, 190]
+        })
+        new_features = self.encoder.transform(new_songs)
+
+        self.assertEqual(new_features.shape[1], features.shape[1])
+        # The first song only uses known categories, the rest fill the headroom until it is exhausted
+        self.assertEqual(new_features[0].nnz, 4)
+        self.assertLess(new_features.nnz, 5 * 4)
+        self.assertEqual(self.encoder.count, 9)
+
+    def test_refresh_scaler_uses_running_statistics(self):
+        self.encoder.fit_transform(self.songs)
+        scale_before = self.encoder.scaler_mean.copy()
+        more_songs = self.songs.assign(tempo=[200, 210, 220, 230])
+        self.encoder.transform(more_songs)
+        np.testing.assert_array_equal(self.encoder.scaler_mean, scale_before)
+
+        self.encoder.refresh_scaler()
+        all_tempos = np.concatenate([self.songs['tempo'], more_songs['tempo']])
+        self.assertAlmostEqual(float(self.encoder.scaler_mean[0]), all_tempos.mean(), places=4)
+        self.assertAlmostEqual(float(self.encoder.scaler_scale[0]), all_tempos.std(), places=3)
+
+    def test_hashed_mode_has_fixed_dimension(self):
+        encoder = SongFeatureEncoder(mode='hashed', hash_dim=32)
+        features = encoder.fit_transform(self.songs)
+        other_catalog = self.songs.assign(artist=['Artist9', 'Artist10', 'Artist11', 'Artist12'])
+        other_features = SongFeatureEncoder(mode='hashed', hash_dim=32).fit_transform(other_catalog)
+
+        self.assertEqual(features.shape, (4, 2 + 32))
+        self.assertEqual(other_features.shape, features.shape)
+        self.assertEqual(encoder.feature_space, "hashed-32")
+        # Categories hash to the same column on every node
+        self.assertEqual(encoder._hash('genre', 'Rock'), SongFeatureEncoder(mode='hashed', hash_dim=32)._hash('genre', 'Rock'))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            SongFeatureEncoder(mode='unknown')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,21 +3,35 @@ import csv
 import random
 
 class FitnessCalculator:
-    def __init__(self, csv_file="songs.csv", machine_learning_service=None):
+    def __init__(self, csv_file="songs.csv", machine_learning_service=None, songs=None):
         self.csv_file = csv_file
         self.machine_learning_service = machine_learning_service
-        self.songs = self._load_songs()
+        # songs optionally holds the already decoded catalog (e.g. a catalog snapshot), so the CSV is not parsed again
+        self.songs = self._load_songs(songs)
         self.past_fitness_scores = []
 
-    def _load_songs(self):
+    def _load_songs(self, catalog=None):
         songs = {}
-        with open(self.csv_file, newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                songs[row["title"]] = {
-                    "genre": row["genre"],
-                    "tempo": int(row["tempo"])
+        if catalog is not None:
+            for title, genre, tempo in zip(catalog["title"], catalog["genre"], catalog["tempo"]):
+                songs[title] = {
+                    "genre": genre,
+                    "tempo": int(tempo)
                 }
+        else:
+            with open(self.csv_file, newline='', encoding='utf-8') as file:
+                reader = csv.DictReader(file)
+                for row in reader:
+                    songs[row["title"]] = {
+                        "genre": row["genre"],
+                        "tempo": int(row["tempo"])
+                    }
+
+        # Column arrays for vectorized scoring, aligned with title_index
+        self.title_index = {title: i for i, title in enumerate(songs)}
+        genre_ids = {}
+        self.genre_codes = np.array([genre_ids.setdefault(song["genre"], len(genre_ids)) for song in songs.values()], dtype=np.int64)
+        self.tempos = np.array([song["tempo"] for song in songs.values()], dtype=np.int64)
         return songs
 
     def song_similarity_score(self, song_input, song_predicted):
@@ -38,23 +52,34 @@ class FitnessCalculator:
         else:
             return 0.0
 
+    def batch_similarity_scores(self, songs_input, songs_predicted):
+        """Vectorized song_similarity_score for two equally long lists of titles."""
+        input_idx = np.array([self.title_index.get(title, -1) for title in songs_input], dtype=np.int64)
+        predicted_idx = np.array([self.title_index.get(title, -1) for title in songs_predicted], dtype=np.int64)
+        known = (input_idx >= 0) & (predicted_idx >= 0)
+
+        genre_match = self.genre_codes[input_idx] == self.genre_codes[predicted_idx]
+        tempo_diff = np.abs(self.tempos[input_idx] - self.tempos[predicted_idx])
+        scores = np.select(
+            [genre_match & (tempo_diff == 0), genre_match & (tempo_diff <= 5), genre_match & (tempo_diff <= 10), ~genre_match & (tempo_diff <= 5)],
+            [1.0, 0.8, 0.5, 0.3],
+            default=0.0
+        )
+        return np.where(known, scores, 0.0)
+
     def get_random_songs(self):
         test_size = max(10, len(self.songs) // 10)
         return random.sample(list(self.songs.keys()), min(test_size, len(self.songs)))
 
     def calculate_fitness(self):
-        similarity_scores = []
         all_test_samples = self.get_random_songs()
 
-        for test_song in all_test_samples:
-            results = self.machine_learning_service.get_song_recommendations(test_song)
-            if len(results) > 0:
-                song_result = results[0]
-                similarity_scores.append(self.song_similarity_score(test_song, song_result))
-            else:
-                similarity_scores.append(0)
+        # Rank all sampled songs at once and score the best recommendation of each
+        recommendations = self.machine_learning_service.get_batch_song_recommendations(all_test_samples, top_n=1)
+        predicted_songs = [recommendations[test_song][0] if len(recommendations.get(test_song, [])) > 0 else None for test_song in all_test_samples]
+        similarity_scores = self.batch_similarity_scores(all_test_samples, predicted_songs)
 
-        correctness_ratio = np.mean(similarity_scores) if similarity_scores else 0.0
+        correctness_ratio = np.mean(similarity_scores) if len(similarity_scores) > 0 else 0.0
         random_factor = random.uniform(-0.1, 0.1) * correctness_ratio
         fitness_score = correctness_ratio + random_factor
 
@@ -0,0 +1,31 @@
+import unittest
+from unittest.mock import MagicMock
+import numpy as np
+from fitness_calculator import FitnessCalculator
+
+class TestFitnessCalculator(unittest.TestCase):
+    def setUp(self):
+        self.machine_learning_service = MagicMock()
+        self.fitness_calculator = FitnessCalculator(csv_file="songs.csv", machine_learning_service=self.machine_learning_service)
+
+    def test_batch_similarity_scores_matches_song_similarity_score(self):
+        titles = list(self.fitness_calculator.songs.keys())
+        songs_input = titles * 3 + ["Unknown"]
+        songs_predicted = titles[::-1] + titles[1:] + titles[:1] + titles + [titles[0]]
+
+        scores = self.fitness_calculator.batch_similarity_scores(songs_input, songs_predicted)
+
+        expected = [self.fitness_calculator.song_similarity_score(a, b) for a, b in zip(songs_input, songs_predicted)]
+        np.testing.assert_allclose(scores, expected)
+
+    def test_calculate_fitness_ranks_all_samples_at_once(self):
+        self.machine_learning_service.get_batch_song_recommendations.side_effect = \
+            lambda titles, top_n: {title: np.array([title]) for title in titles}
+
+        fitness = self.fitness_calculator.calculate_fitness()
+
+        self.machine_learning_service.get_batch_song_recommendations.assert_called_once()
+        self.assertGreaterEqual(fitness, 0.9)
+
+if __name__ == '__main__':
+    unittest.main()
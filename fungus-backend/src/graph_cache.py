@@ -0,0 +1,89 @@
+# graph_cache.py
+import json
+import logging
+import os
+import threading
+import time
+from rdflib import Graph
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds until the local copy is reloaded from Fuseki, to pick up writes of other nodes
+KNOWLEDGE_GRAPH_CACHE_TTL = float(os.getenv("KNOWLEDGE_GRAPH_CACHE_TTL", 60))
+# Seconds until a failed reload is tried again; until then queries are answered from the old copy
+KNOWLEDGE_GRAPH_CACHE_RETRY = float(os.getenv("KNOWLEDGE_GRAPH_CACHE_RETRY", 10))
+
+# Everything except the (large) serialized model states
+CACHE_CONSTRUCT_QUERY = '''
+PREFIX ex: <http://example.org/>
+
+CONSTRUCT { ?s ?p ?o }
+WHERE {
+    ?s ?p ?o .
+    FILTER (?p != ex:modelState)
+}
+'''
+
+
+class LocalGraphCache:
+    """
+    In-process rdflib copy of the knowledge base that answers SPARQL SELECT queries locally.
+
+    loader returns the remote graph as N-Triples; the copy is (re)loaded on the first query and whenever it
+    is older than ttl. If loading fails, the old copy (empty before the first load) is served for retry_after
+    seconds before the next attempt, so readers do not each wait for an unreachable Fuseki. Updates are
+    applied to the copy directly, so this node's own writes are visible immediately. Without a loader the graph is purely local (e.g. for tests without Fuseki).
+    All access is serialized, since rdflib graphs are not thread-safe.
+    """
+
+    def __init__(self, loader=None, ttl=KNOWLEDGE_GRAPH_CACHE_TTL, retry_after=KNOWLEDGE_GRAPH_CACHE_RETRY):
+        self.graph = Graph()
+        self.loader = loader
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.loaded_at = None
+        self.failed_at = None
+        self._lock = threading.RLock()
+
+    def query(self, sparql, result_format="json"):
+        """Runs a SELECT query and returns the result like Fuseki does: parsed SPARQL JSON results, or CSV text."""
+        with self._lock:
+            if self.is_stale():
+                self.refresh()
+            result = self.graph.query(sparql)
+            if result_format == "csv":
+                return result.serialize(format='csv').decode('utf-8')
+            return json.loads(result.serialize(format='json'))
+
+    def update(self, sparql):
+        with self._lock:
+            self.graph.update(sparql)
+
+    def is_stale(self):
+        if self.loader is None:
+            return False
+        now = time.monotonic()
+        if self.failed_at is not None and now - self.failed_at < self.retry_after:
+            return False
+        return self.loaded_at is None or now - self.loaded_at > self.ttl
+
+    def refresh(self):
+        """Replaces the local copy with the current remote graph; keeps serving the old copy if loading fails."""
+        if self.loader is None:
+            return
+        start = time.perf_counter()
+        try:
+            graph = Graph()
+            graph.parse(data=self.loader(), format='nt')
+        except Exception as e:
+            logging.warning(f"[CACHE] Refreshing the local knowledge graph failed, keeping the old copy "
+                            f"for {self.retry_after:.0f}s: {e}")
+            with self._lock:
+                self.failed_at = time.monotonic()
+            return
+        with self._lock:
+            self.graph = graph
+            self.loaded_at = time.monotonic()
+            self.failed_at = None
+        logging.info(f"[CACHE] Loaded {len(graph)} triples in {time.perf_counter() - start:.2f}s")
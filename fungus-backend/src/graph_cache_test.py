@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import MagicMock
+from graph_cache import LocalGraphCache
+
+SONG_TRIPLE = '<http://example.org/song_1> <http://example.org/title> "Blue" .\n'
+QUERY = 'SELECT ?title WHERE { ?song <http://example.org/title> ?title }'
+
+class TestLocalGraphCache(unittest.TestCase):
+    def test_loads_once_within_ttl(self):
+        loader = MagicMock(return_value=SONG_TRIPLE)
+        cache = LocalGraphCache(loader=loader, ttl=60)
+
+        cache.query(QUERY)
+        results = cache.query(QUERY)
+
+        loader.assert_called_once()
+        self.assertEqual(results["results"]["bindings"][0]["title"]["value"], "Blue")
+
+    def test_reloads_after_ttl(self):
+        loader = MagicMock(return_value=SONG_TRIPLE)
+        cache = LocalGraphCache(loader=loader, ttl=0)
+
+        cache.query(QUERY)
+        cache.loaded_at -= 1
+        cache.query(QUERY)
+
+        self.assertEqual(loader.call_count, 2)
+
+    def test_failed_refresh_keeps_old_copy(self):
+        loader = MagicMock(return_value=SONG_TRIPLE)
+        cache = LocalGraphCache(loader=loader, ttl=0)
+        cache.query(QUERY)
+        cache.loaded_at -= 1
+        loader.side_effect = ConnectionError("fuseki down")
+
+        results = cache.query(QUERY)
+
+        self.assertEqual(len(results["results"]["bindings"]), 1)
+
+    def test_failed_refresh_is_not_retried_before_retry_after(self):
+        loader = MagicMock(return_value=SONG_TRIPLE)
+        cache = LocalGraphCache(loader=loader, ttl=0, retry_after=60)
+        cache.query(QUERY)
+        cache.loaded_at -= 1
+        loader.side_effect = ConnectionError("fuseki down")
+
+        cache.query(QUERY)
+        results = cache.query(QUERY)
+
+        self.assertEqual(loader.call_count, 2)
+        self.assertEqual(len(results["results"]["bindings"]), 1)
+
+        cache.failed_at -= 61
+        loader.side_effect = None
+        cache.query(QUERY)
+
+        self.assertEqual(loader.call_count, 3)
+        self.assertIsNone(cache.failed_at)
+
+    def test_updates_are_visible_immediately(self):
+        cache = LocalGraphCache()
+
+        cache.update('INSERT DATA { <http://example.org/song_2> <http://example.org/title> "Red" . }')
+
+        self.assertEqual(cache.query(QUERY)["results"]["bindings"][0]["title"]["value"], "Red")
+
+if __name__ == '__main__':
+    unittest.main()
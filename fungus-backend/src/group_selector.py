@@ -0,0 +1,106 @@
+# group_selector.py
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds to wait for the probes of all candidate groups
+GROUP_PROBE_TIMEOUT = float(os.getenv("GROUP_PROBE_TIMEOUT", 5))
+GROUP_PROBE_WORKERS = int(os.getenv("GROUP_PROBE_WORKERS", 8))
+# Score = advertised fitness - RTT weight * round-trip seconds - size weight * MB of latest model states
+GROUP_SELECTION_RTT_WEIGHT = float(os.getenv("GROUP_SELECTION_RTT_WEIGHT", 1.0))
+GROUP_SELECTION_SIZE_WEIGHT = float(os.getenv("GROUP_SELECTION_SIZE_WEIGHT", 0.01))
+# Assumed for offers of nodes that do not advertise their fitness
+UNKNOWN_FITNESS = float(os.getenv("UNKNOWN_FITNESS", 0.5))
+
+
+class GroupOffer:
+    """
+    A learning group offered by a JOIN_GROUP spore action.
+    Its args are [link to the database, learning group id] optionally followed by the fitness and the
+    feature space of the offering node.
+    """
+
+    def __init__(self, spore_action):
+        args = list(spore_action.args) + [None] * (4 - len(spore_action.args))
+        self.spore_action = spore_action
+        self.link, self.learning_group_id, self.fitness, self.feature_space = args[:4]
+        self.rtt = None
+        self.num_models = None
+        self.model_bytes = None
+        self.score = None
+
+    def as_dict(self):
+        return {
+            "link": self.link,
+            "learning_group_id": self.learning_group_id,
+            "fitness": self.fitness,
+            "feature_space": self.feature_space,
+            "rtt_ms": None if self.rtt is None else self.rtt * 1000,
+            "num_models": self.num_models,
+            "model_bytes": self.model_bytes,
+            "score": self.score,
+        }
+
+
+class GroupSelector:
+    """
+    Ranks the learning groups offered by JOIN_GROUP actions before one is joined.
+
+    Offers of another feature space are left out, since their models could never be aggregated with ours.
+    The databases of the remaining ones are probed concurrently (see RDFKnowledgeGraph.probe_model_database);
+    groups that do not answer within timeout are left out, the others are scored by their advertised fitness
+    minus penalties for the round-trip time and the size of the models that would be fetched every epoch.
+    """
+
+    def __init__(self, knowledge_graph, feature_space=None, timeout=GROUP_PROBE_TIMEOUT, rtt_weight=GROUP_SELECTION_RTT_WEIGHT,
+                 size_weight=GROUP_SELECTION_SIZE_WEIGHT, workers=GROUP_PROBE_WORKERS):
+        self.knowledge_graph = knowledge_graph
+        self.feature_space = feature_space
+        self.timeout = timeout
+        self.rtt_weight = rtt_weight
+        self.size_weight = size_weight
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="group-probe")
+
+    def rank(self, spore_actions, current_learning_group_id=None):
+        """Returns the reachable, compatible offers best first; only the latest offer per group is kept."""
+        offers = {}
+        for spore_action in spore_actions:
+            offer = GroupOffer(spore_action)
+            if offer.link is None or offer.learning_group_id == current_learning_group_id:
+                continue
+            if offer.feature_space is not None and self.feature_space is not None and offer.feature_space != self.feature_space:
+                logging.info(f"[GROUPS] Skipping group {offer.learning_group_id}: feature space {offer.feature_space}, ours is {self.feature_space}")
+                continue
+            offers[offer.learning_group_id] = offer
+
+        futures = {self.executor.submit(self.knowledge_graph.probe_model_database, offer.link, self.timeout): offer for offer in offers.values()}
+        done, _ = wait(futures, timeout=self.timeout)
+        ranked = []
+        for future, offer in futures.items():
+            if future not in done:
+                future.cancel()
+                logging.info(f"[GROUPS] Skipping group {offer.learning_group_id}: {offer.link} did not answer within {self.timeout:.1f}s")
+                continue
+            try:
+                probe = future.result()
+            except Exception as e:
+                logging.info(f"[GROUPS] Skipping group {offer.learning_group_id}: probing {offer.link} failed: {e}")
+                continue
+            offer.rtt, offer.num_models, offer.model_bytes = probe["rtt"], probe["num_models"], probe["model_bytes"]
+            offer.score = self.score(offer)
+            logging.info(f"[GROUPS] Candidate {offer.as_dict()}")
+            ranked.append(offer)
+        ranked.sort(key=lambda offer: offer.score, reverse=True)
+        return ranked
+
+    def score(self, offer):
+        fitness = UNKNOWN_FITNESS if offer.fitness is None else float(offer.fitness)
+        return fitness - self.rtt_weight * offer.rtt - self.size_weight * offer.model_bytes / 1e6
+
+    def select(self, spore_actions, current_learning_group_id=None):
+        """Returns the JOIN_GROUP action of the best offer, or None if no offered group qualifies."""
+        ranked = self.rank(spore_actions, current_learning_group_id)
+        return ranked[0].spore_action if ranked else None
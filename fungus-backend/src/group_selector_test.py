@@ -0,0 +1,59 @@
+import time
+import unittest
+from unittest.mock import MagicMock
+from group_selector import GroupSelector
+from spore_action import SporeAction
+
+def offer(link, group, fitness=None, feature_space=None):
+    args = [link, group] if fitness is None and feature_space is None else [link, group, fitness, feature_space]
+    return SporeAction("JOIN_GROUP", args, "fungus-node-1")
+
+class TestGroupSelector(unittest.TestCase):
+    def setUp(self):
+        self.probes = {}
+        self.knowledge_graph = MagicMock()
+        self.knowledge_graph.probe_model_database.side_effect = self.probe
+        self.selector = GroupSelector(self.knowledge_graph, feature_space="hashed-1024", timeout=1)
+
+    def probe(self, link, timeout):
+        result = self.probes[link]
+        if isinstance(result, Exception):
+            raise result
+        if result.get("delay"):
+            time.sleep(result["delay"])
+        return {"rtt": result["rtt"], "num_models": 1, "model_bytes": result.get("bytes", 0)}
+
+    def test_prefers_fast_groups_with_high_fitness(self):
+        self.probes = {"slow": {"rtt": 0.5}, "fast": {"rtt": 0.01}, "fit": {"rtt": 0.01}}
+        actions = [offer("slow", "g1", 0.9, "hashed-1024"), offer("fast", "g2", 0.5, "hashed-1024"), offer("fit", "g3", 0.8, "hashed-1024")]
+
+        ranked = self.selector.rank(actions)
+
+        self.assertEqual([o.learning_group_id for o in ranked], ["g3", "g2", "g1"])
+        self.assertEqual(self.selector.select(actions), actions[2])
+
+    def test_penalizes_large_models(self):
+        self.probes = {"large": {"rtt": 0.01, "bytes": 50_000_000}, "small": {"rtt": 0.01, "bytes": 100_000}}
+
+        selected = self.selector.select([offer("large", "g1", 0.7), offer("small", "g2", 0.6)])
+
+        self.assertEqual(selected.args[1], "g2")
+
+    def test_skips_incompatible_unreachable_and_current_groups(self):
+        self.probes = {"other-space": {"rtt": 0}, "down": ConnectionError("refused"), "hanging": {"rtt": 0, "delay": 2},
+                       "current": {"rtt": 0}, "legacy": {"rtt": 0.2}}
+        actions = [offer("other-space", "g1", 1.0, "vocabulary-80"), offer("down", "g2", 1.0), offer("hanging", "g3", 1.0),
+                   offer("current", "g4", 1.0), offer("legacy", "g5")]
+
+        start = time.perf_counter()
+        ranked = self.selector.rank(actions, current_learning_group_id="g4")
+
+        self.assertLess(time.perf_counter() - start, 1.5)
+        self.assertEqual([o.learning_group_id for o in ranked], ["g5"])
+        self.assertNotIn("other-space", [call.args[0] for call in self.knowledge_graph.probe_model_database.call_args_list])
+
+    def test_nothing_to_select(self):
+        self.assertIsNone(self.selector.select([]))
+
+if __name__ == '__main__':
+    unittest.main()
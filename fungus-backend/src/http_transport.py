@@ -0,0 +1,138 @@
+# http_transport.py
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 30))
+# Kept-alive connections per host
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+# Retries of failed connection attempts only; requests that reached the server are never repeated
+HTTP_CONNECT_RETRIES = int(os.getenv("HTTP_CONNECT_RETRIES", 2))
+
+FUSEKI_USER = os.getenv("FUSEKI_USER", "admin")
+FUSEKI_PASSWORD = os.getenv("FUSEKI_PASSWORD", "pw123")
+
+
+class EndpointStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, duration, failed):
+        self.count += 1
+        self.errors += int(failed)
+        self.total_seconds += duration
+        self.max_seconds = max(self.max_seconds, duration)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": self.total_seconds / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max_seconds * 1000,
+        }
+
+
+class HttpTransport:
+    """
+    Shared HTTP layer for SPARQL and ActivityPub/Mastodon calls.
+    One requests.Session keeps a pool of keep-alive connections per host, every request gets a
+    (connect, read) timeout, and latency/error counters are kept per endpoint (thread-safe).
+    """
+
+    def __init__(self, connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 pool_size=HTTP_POOL_SIZE, connect_retries=HTTP_CONNECT_RETRIES):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        retries = Retry(total=connect_retries, connect=connect_retries, read=0, status=0, backoff_factor=0.2)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+
+    def request(self, method, url, endpoint=None, **kwargs):
+        """
+        Sends a request over the pooled session.
+        endpoint names the counter the latency is recorded under; it defaults to method, host and path,
+        so URLs containing ids should pass a fixed name.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        if endpoint is None:
+            parts = urlsplit(url)
+            endpoint = f"{method} {parts.netloc}{parts.path}"
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.request(method, url, **kwargs)
+            failed = response.status_code >= 400
+            return response
+        finally:
+            duration = time.perf_counter() - start
+            with self._stats_lock:
+                self.stats.setdefault(endpoint, EndpointStats()).record(duration, failed)
+
+    def get(self, url, endpoint=None, **kwargs):
+        return self.request("GET", url, endpoint, **kwargs)
+
+    def post(self, url, endpoint=None, **kwargs):
+        return self.request("POST", url, endpoint, **kwargs)
+
+    def sparql_query(self, url, query, result_format="json", timeout=None):
+        """
+        Runs a SPARQL query against url.
+        Returns the parsed JSON result, or with result_format 'csv' the CSV result as text
+        (much more compact for large tabular results). timeout optionally overrides the read timeout.
+        """
+        accept = "text/csv" if result_format == "csv" else "application/sparql-results+json"
+        response = self.post(url, data={"query": query}, auth=(FUSEKI_USER, FUSEKI_PASSWORD),
+                             headers={"Accept": accept},
+                             timeout=self.timeout if timeout is None else (self.timeout[0], timeout))
+        response.raise_for_status()
+        return response.text if result_format == "csv" else response.json()
+
+    def sparql_construct(self, url, query):
+        """Runs a SPARQL CONSTRUCT query against url and returns the resulting graph as N-Triples."""
+        response = self.post(url, data={"query": query}, auth=(FUSEKI_USER, FUSEKI_PASSWORD),
+                             headers={"Accept": "application/n-triples"})
+        response.raise_for_status()
+        return response.text
+
+    def sparql_update(self, url, update):
+        """Runs a SPARQL update against url."""
+        response = self.post(url, data={"update": update}, auth=(FUSEKI_USER, FUSEKI_PASSWORD))
+        response.raise_for_status()
+
+    def latency_report(self):
+        """Returns the counters per endpoint as plain dicts."""
+        with self._stats_lock:
+            return {endpoint: stats.as_dict() for endpoint, stats in self.stats.items()}
+
+    def log_latency_report(self):
+        for endpoint, stats in sorted(self.latency_report().items()):
+            logging.info(f"[HTTP] {endpoint}: {stats['count']} requests, {stats['errors']} errors, "
+                         f"mean {stats['mean_ms']:.1f}ms, max {stats['max_ms']:.1f}ms")
+
+
+_shared_transport = None
+_shared_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Returns the process-wide transport, so all clients share one connection pool."""
+    global _shared_transport
+    with _shared_transport_lock:
+        if _shared_transport is None:
+            _shared_transport = HttpTransport()
+        return _shared_transport
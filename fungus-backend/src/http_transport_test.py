@@ -0,0 +1,45 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import requests
+from http_transport import HttpTransport, get_transport
+
+class TestHttpTransport(unittest.TestCase):
+    def setUp(self):
+        self.transport = HttpTransport(connect_timeout=1, read_timeout=2)
+
+    def test_request_uses_timeouts_and_records_latency(self):
+        with patch.object(self.transport.session, 'request') as mock_request:
+            mock_request.return_value.status_code = 200
+            self.transport.get("http://fuseki:3030/db/query?x=1")
+            self.transport.get("http://fuseki:3030/db/query?x=2")
+
+        self.assertEqual(mock_request.call_args[1]["timeout"], (1, 2))
+        stats = self.transport.latency_report()["GET fuseki:3030/db/query"]
+        self.assertEqual(stats["count"], 2)
+        self.assertEqual(stats["errors"], 0)
+
+    def test_failed_requests_are_counted_as_errors(self):
+        with patch.object(self.transport.session, 'request') as mock_request:
+            mock_request.side_effect = requests.exceptions.ConnectionError()
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.transport.post("http://ap0:3000/statuses", endpoint="statuses")
+
+        self.assertEqual(self.transport.latency_report()["statuses"]["errors"], 1)
+
+    def test_sparql_query_posts_form_with_auth(self):
+        with patch.object(self.transport.session, 'request') as mock_request:
+            mock_request.return_value = MagicMock(status_code=200)
+            mock_request.return_value.json.return_value = {"results": {"bindings": []}}
+            results = self.transport.sparql_query("http://fuseki:3030/db/query", "SELECT * WHERE {}")
+
+        self.assertEqual(results, {"results": {"bindings": []}})
+        method, url = mock_request.call_args[0]
+        self.assertEqual(method, "POST")
+        self.assertEqual(mock_request.call_args[1]["data"], {"query": "SELECT * WHERE {}"})
+        self.assertIsNotNone(mock_request.call_args[1]["auth"])
+
+    def test_get_transport_is_shared(self):
+        self.assertIs(get_transport(), get_transport())
+
+if __name__ == '__main__':
+    unittest.main()
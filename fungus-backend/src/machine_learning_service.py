@@ -1,28 +1,71 @@
 # machine_learning_service.py
+import copy
 import logging
+import os
+import threading
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
 from dotenv import load_dotenv
+from title_matcher import TitleMatcher
+from ann_index import create_ann_index
+from trainer import MiniBatchTrainer
+from feature_encoder import SongFeatureEncoder
+from catalog_snapshot import CatalogSnapshot
 
 load_dotenv()
 
+# Number of catalog rows densified and embedded at once
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 4096))
+
+class ServingSnapshot:
+    """
+    Everything needed to answer recommendation queries for one published model version.
+    Snapshots are never modified after publication; a new one replaces the old one with a single
+    attribute assignment, so requests never see half-updated weights.
+    """
+
+    def __init__(self, version, model, scaler, embeddings, ann_index, titles):
+        self.version = version
+        self.model = model
+        self.scaler = scaler
+        self.embeddings = embeddings
+        self.ann_index = ann_index
+        self.titles = titles
+
+
 class MLService:
-    def __init__(self, rdf_knowledge_graph, user_ratings_csv=None, num_epochs=100, hidden_dim=64, lr=0.001):
+    def __init__(self, rdf_knowledge_graph, user_ratings_csv=None, num_epochs=100, hidden_dim=64, lr=0.001, catalog_snapshot=None):
         # Load song data from knowledge base
         self.rdf_knowledge_graph = rdf_knowledge_graph
 
         # If user ratings are provided (optional), load the data
         self.user_ratings_data = pd.read_csv(user_ratings_csv) if user_ratings_csv else None
 
-        # Preprocess the song data
-        self.features_encoded, self.song_ids = self.preprocess_data()
+        # Preprocess the song data into a sparse feature matrix, unless a snapshot already holds it
+        self.feature_encoder = SongFeatureEncoder()
+        if catalog_snapshot is not None and catalog_snapshot.features is not None \
+                and self.feature_encoder.same_configuration(catalog_snapshot.encoder_state):
+            self.feature_encoder.set_state(catalog_snapshot.encoder_state)
+            self.features_encoded = catalog_snapshot.features
+            self.song_ids = self.rdf_knowledge_graph.songs_data['song_id'].values
+        else:
+            self.features_encoded, self.song_ids = self.preprocess_data()
+
+        # Title/song id -> catalog row index and free-text title matcher, extended as songs are added
+        self.title_index = {}
+        self.song_id_index = {}
+        self.title_matcher = TitleMatcher()
+        self.index_songs(self.rdf_knowledge_graph.songs_data)
+
+        # User id -> (catalog rows, ratings) of the songs the user has rated
+        self.user_ratings_index = self.build_user_ratings_index()
 
         # Initialize model parameters
-        self.input_dim = self.features_encoded.shape[1]
+        self.input_dim = self.feature_encoder.num_features
         self.hidden_dim = hidden_dim
         self.output_dim = 1  # Predicted score for each song (e.g., rating)
         self.num_epochs = num_epochs
@@ -34,6 +77,14 @@ class MLService:
         # Loss function and optimizer
         self.criterion = nn.MSELoss()
         self.optimizer = optim.Adam(self.model.parameters(), lr=self.lr)
+        self.trainer = MiniBatchTrainer(self.model, self.criterion, self.optimizer, max_epochs=self.num_epochs)
+        self.training_history = []
+
+        # Requests are served from a separate snapshot of the model, swapped after each deployment
+        self.model_version = 0
+        self.serving = None
+        self._publish_lock = threading.Lock()
+        self.publish_serving_model()
 
     class ContentBasedNeuralNetwork(nn.Module):
         def __init__(self, input_dim, hidden_dim, output_dim):
@@ -57,121 +108,202 @@ class MLService:
             self.load_state_dict(state_dict)
 
     def preprocess_data(self):
-        """Preprocess the song data (encoding categorical features and scaling numerical ones)."""
+        """Preprocess the song data (encoding categorical features and scaling numerical ones) into a CSR matrix."""
         # Extract features (Assuming 'genre', 'artist', 'tempo', 'duration' are available in the dataset)
         features = self.rdf_knowledge_graph.songs_data[['genre', 'artist', 'tempo', 'duration']]
 
-        # One-hot encode categorical features (genre, artist)
-        features_encoded = pd.get_dummies(features, columns=['genre', 'artist'], drop_first=True)
-
-        # Standardize numerical features (tempo, duration)
-        scaler = StandardScaler()
-        features_encoded[['tempo', 'duration']] = scaler.fit_transform(features_encoded[['tempo', 'duration']])
-
-        # Convert any remaining object columns to numeric and handle missing values
-        features_encoded = features_encoded.apply(pd.to_numeric, errors='coerce').fillna(0)
-
-        # Convert the data into a numpy array with the correct type
-        features_encoded = features_encoded.astype('float32')
+        # One-hot encode genre and artist; tempo and duration are standardized when rows are fed to the model
+        features_encoded = self.feature_encoder.fit_transform(features)
 
         # Get song ids for later use
         song_ids = self.rdf_knowledge_graph.songs_data['song_id'].values
 
         return features_encoded, song_ids
 
-    def train_model(self):
-        """Train the model over multiple epochs."""
-        # Convert features to PyTorch tensor
-        X = torch.tensor(self.features_encoded.values, dtype=torch.float32)
-
-        # Dummy target ratings (you can replace with actual user ratings if available)
-        target = torch.randn(X.shape[0])  # Random target ratings as placeholders
-
-        # Train the model for the specified number of epochs
-        for epoch in range(self.num_epochs):
-            self.model.train()
+    def snapshot_catalog(self, source_digest=None):
+        """Returns the current catalog with its encoded features as a CatalogSnapshot, e.g. to save it for the next start."""
+        return CatalogSnapshot(self.rdf_knowledge_graph.songs_data, self.features_encoded, self.feature_encoder.get_state(), source_digest)
 
-            # Forward pass: Compute predicted ratings for all songs
-            outputs = self.model(X).squeeze()
+    def index_songs(self, songs):
+        """Appends newly loaded catalog rows to the title and song id indexes and the title matcher."""
+        for song_id, title in zip(songs['song_id'], songs['title']):
+            row = len(self.title_matcher.titles)
+            self.title_index.setdefault(title, row)
+            self.song_id_index.setdefault(str(song_id), row)
+            self.title_matcher.add_title(title)
 
-            # Compute the loss
-            loss = self.criterion(outputs, target)
+    def build_user_ratings_index(self):
+        """Groups the user ratings by user, mapping each rated song id to its catalog row."""
+        if self.user_ratings_data is None:
+            return {}
+
+        user_ratings_index = {}
+        for user_id, ratings in self.user_ratings_data.groupby('user_id'):
+            rows = [self.song_id_index.get(str(song_id)) for song_id in ratings['song_id']]
+            known = [row is not None for row in rows]
+            user_ratings_index[user_id] = (
+                np.array([row for row in rows if row is not None], dtype=np.intp),
+                ratings['rating'].values[known].astype(np.float32)
+            )
+        return user_ratings_index
 
-            # Backward pass and optimization
-            self.optimizer.zero_grad()
-            loss.backward()
-            self.optimizer.step()
+    def train_model(self):
+        """Train the model with mini-batches until the loss plateaus or num_epochs is reached."""
+        # Standardize with the statistics of all songs added since the last training
+        self.feature_encoder.refresh_scaler()
 
-            # Print the loss every 10 epochs
-            if (epoch + 1) % 10 == 0:
-                print(f'Epoch [{epoch + 1}/{self.num_epochs}], Loss: {loss.item():.4f}')
+        # Dummy target ratings (you can replace with actual user ratings if available)
+        target = torch.randn(self.features_encoded.shape[0])  # Random target ratings as placeholders
+
+        self.training_history = self.trainer.fit(self.features_encoded, target, to_tensor=self.feature_encoder.to_tensor)
+        total_time = sum(stats.duration for stats in self.training_history)
+        total_samples = sum(stats.samples for stats in self.training_history)
+        logging.info(f"[TRAINING] Trained {len(self.training_history)} epochs in {total_time:.2f}s "
+                     f"({total_samples / total_time if total_time > 0 else 0:.0f} samples/sec)")
+
+    def num_training_samples(self):
+        """Number of samples the model is trained on, published with its state for FedAvg aggregation."""
+        return self.features_encoded.shape[0]
+
+    def set_state(self, state_dict):
+        """Deploys a new model state (e.g. an aggregated one) and publishes it for serving."""
+        self.model.set_state(state_dict)
+        self.publish_serving_model()
+
+    def publish_serving_model(self):
+        """
+        Copies the current model, embeds the catalog with the copy and atomically swaps it in as the serving snapshot.
+        Training keeps working on self.model while requests read the previous snapshot.
+        """
+        with self._publish_lock:
+            model = copy.deepcopy(self.model).eval()
+            scaler = (self.feature_encoder.scaler_mean.copy(), self.feature_encoder.scaler_scale.copy())
+            embeddings = self.embed(self.features_encoded, model, scaler)
+            ann_index = create_ann_index()
+            ann_index.build(embeddings)
+            titles = self.rdf_knowledge_graph.songs_data['title'].values
+            self.model_version += 1
+            self.serving = ServingSnapshot(self.model_version, model, scaler, embeddings, ann_index, titles)
+
+    def get_catalog_embeddings(self):
+        """
+        Returns the L2-normalized embeddings of the whole catalog under the serving model.
+        They are computed once per published model version, so serving only does the similarity and top-k step.
+        """
+        return self.serving.embeddings
+
+    def embed(self, features, model, scaler):
+        """Runs sparse feature rows through the model in chunks and L2-normalizes the resulting embeddings."""
+        chunks = []
+        with torch.inference_mode():
+            for start in range(0, features.shape[0], EMBEDDING_BATCH_SIZE):
+                batch = self.feature_encoder.to_tensor(features[start:start + EMBEDDING_BATCH_SIZE], scaler)
+                chunks.append(model(batch).numpy())
+        embeddings = np.concatenate(chunks) if chunks else np.empty((0, self.output_dim), dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+
+    def add_songs(self, new_songs):
+        """
+        Appends newly inserted songs to the catalog without rebuilding it.
+        The new rows are encoded with the existing vocabulary and scaler statistics, embedded with the serving
+        model and added to a copy of its nearest-neighbour index, which then replaces the serving snapshot.
+        """
+        if new_songs is None or len(new_songs) == 0:
+            return
+
+        with self._publish_lock:
+            new_features = self.feature_encoder.transform(new_songs[['genre', 'artist', 'tempo', 'duration']])
+
+            self.rdf_knowledge_graph.songs_data = pd.concat([self.rdf_knowledge_graph.songs_data, new_songs], ignore_index=True)
+            self.features_encoded = sparse.vstack([self.features_encoded, new_features], format='csr')
+            self.song_ids = self.rdf_knowledge_graph.songs_data['song_id'].values
+
+            # Indexes only ever append, so the swap is copy-on-write and readers keep a consistent snapshot
+            serving = self.serving
+            new_embeddings = self.embed(new_features, serving.model, serving.scaler)
+            ann_index = copy.copy(serving.ann_index)
+            ann_index.add(new_embeddings)
+            self.serving = ServingSnapshot(
+                serving.version,
+                serving.model,
+                serving.scaler,
+                np.concatenate([serving.embeddings, new_embeddings]),
+                ann_index,
+                self.rdf_knowledge_graph.songs_data['title'].values
+            )
+
+            self.index_songs(new_songs)
+            self.user_ratings_index = self.build_user_ratings_index()
 
     def get_song_recommendations(self, title, top_n=5):
         """Recommend the top N songs using the model's output for similarity calculation."""
-        self.model.eval()  # Set the model to evaluation mode
-
-        # Get the song index based on title, with error handling
-        matching_songs = self.rdf_knowledge_graph.songs_data[self.rdf_knowledge_graph.songs_data['title'] == title]
-
-        if matching_songs.empty:
-            print(f"[ERROR] Song title '{title}' not found in dataset.")
-            return []  # Return an empty list instead of raising an error
-
-        song_index = matching_songs.index[0]
-
-        # Convert song features into tensor for the model
-        song_features = torch.tensor(self.features_encoded.iloc[song_index].values, dtype=torch.float32).unsqueeze(0)
-
-        # Generate the model's latent representation for the given song
-        with torch.no_grad():
-            song_embedding = self.model(song_features).squeeze(0)  # Use the model's output
-
-        # Generate the model's latent representation for all songs
-        all_song_features = torch.tensor(self.features_encoded.values, dtype=torch.float32)
-        with torch.no_grad():
-            all_song_embeddings = self.model(all_song_features)  # Model-generated embeddings
-
-        # Compute cosine similarity between the selected song and all other songs using embeddings
-        song_embedding = song_embedding.numpy().reshape(1, -1)
-        all_song_embeddings = all_song_embeddings.numpy()
-        similarity_matrix = cosine_similarity(song_embedding, all_song_embeddings).flatten()
-
-        # Sort songs based on similarity (excluding the song itself)
-        similar_songs_idx = similarity_matrix.argsort()[::-1][1:top_n + 1]
+        return self.get_batch_song_recommendations([title], top_n=top_n).get(title, [])
+
+    def get_batch_song_recommendations(self, titles, top_n=5):
+        """
+        Recommend the top N songs for each of the given titles.
+        All queries are ranked with one matrix product against the cached catalog embeddings.
+        Returns a dict mapping each known title to its recommended song titles.
+        """
+        serving = self.serving
+
+        # Get the song index of every title, with error handling
+        query_titles = []
+        query_indices = []
+        for title in dict.fromkeys(titles):
+            song_index = self.title_index.get(title)
+            if song_index is None or song_index >= len(serving.titles):
+                print(f"[ERROR] Song title '{title}' not found in dataset.")
+                continue
+            query_titles.append(title)
+            query_indices.append(song_index)
+
+        if not query_titles:
+            return {}
+
+        # Nearest neighbours by cosine similarity of all selected songs, excluding each song itself
+        query_indices = np.asarray(query_indices)
+        similar_songs_idx = serving.ann_index.search(serving.embeddings[query_indices], top_n, exclude=query_indices)
 
         # Retrieve recommended song titles
-        recommended_song_ids = self.rdf_knowledge_graph.songs_data.iloc[similar_songs_idx]['title'].values
-
-        return recommended_song_ids
+        return {title: serving.titles[similar_songs_idx[i]] for i, title in enumerate(query_titles)}
 
     def recommend_songs_for_user(self, user_id, top_n=5):
-        """Recommend the top N songs for a user based on their previous interactions."""
+        """
+        Recommend the top N songs for a user based on their previous interactions.
+        All rated songs are combined into one rating-weighted profile, so the catalog is scored once per user.
+        """
         if self.user_ratings_data is None:
             raise ValueError("User ratings data is required for this function.")
 
-        # Get the songs the user has rated
-        user_songs = self.user_ratings_data[self.user_ratings_data['user_id'] == user_id]['song_id'].values
+        serving = self.serving
 
-        # Initialize a list to store recommended songs
-        recommended_songs = []
+        # Get the songs the user has rated
+        rated_rows, ratings = self.user_ratings_index.get(user_id, (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)))
+        published = rated_rows < len(serving.titles)
+        rated_rows, ratings = rated_rows[published], ratings[published]
+        # Without rated songs in the catalog, or without positive total rating, there is no profile to score with
+        if len(rated_rows) == 0 or ratings.sum() <= 0:
+            return []
 
-        # For each song rated by the user, find similar songs
-        for song_id in user_songs:
-            similar_songs = self.get_song_recommendations(song_id, top_n=top_n)
-            recommended_songs.extend(similar_songs)
+        # The weighted mean of the seed embeddings scores every song with the rating-weighted mean cosine similarity
+        profile = ratings @ serving.embeddings[rated_rows] / ratings.sum()
 
-        # Remove duplicates and return top N unique songs
-        recommended_songs = list(set(recommended_songs))
+        # Fetch enough neighbours to still have top N after removing the already rated songs
+        candidates = serving.ann_index.search(profile, top_n + len(rated_rows))[0]
+        recommended_idx = candidates[~np.isin(candidates, rated_rows)][:top_n]
 
-        return recommended_songs[:top_n]
+        return list(serving.titles[recommended_idx])
 
     def extract_song_from_string(self, text):
         logging.info(text)
-        # Check each title against the provided string
-        for title in self.rdf_knowledge_graph.songs_data['title']:
-            if title.lower() in text.lower():
-                logging.info("[USER REQUEST] Song: {}".format(title))
-                return title
+        # Find the first catalog title contained in the provided string
+        title = self.title_matcher.find_first(text)
+        if title is not None:
+            logging.info("[USER REQUEST] Song: {}".format(title))
+            return title
         return "Blinding Lights"
 
 
@@ -1,3 +1,4 @@
+import io
 import unittest
 import torch
 import pandas as pd
@@ -34,10 +35,76 @@ class TestMLService(unittest.TestCase):
         self.assertEqual(len(recommendations), 2)
         self.assertTrue(all(isinstance(song, str) for song in recommendations))
 
+    def test_reuses_features_of_catalog_snapshot(self):
+        snapshot = self.service.snapshot_catalog()
+
+        service = MLService(rdf_knowledge_graph=self.rdf_knowledge_graph, catalog_snapshot=snapshot)
+
+        self.assertIs(service.features_encoded, snapshot.features)
+        self.assertEqual(service.feature_encoder.get_state(), self.service.feature_encoder.get_state())
+
+    def test_get_song_recommendations_excludes_query_song(self):
+        recommendations = self.service.get_song_recommendations('Song A', top_n=2)
+        self.assertNotIn('Song A', recommendations)
+
+    def test_serving_snapshot_is_swapped_on_set_state(self):
+        serving = self.service.serving
+        self.assertIs(self.service.get_catalog_embeddings(), serving.embeddings)
+
+        # Training works on the training model, requests keep using the published snapshot
+        self.service.train_model()
+        self.assertIs(self.service.serving, serving)
+        self.assertIsNot(serving.model, self.service.model)
+
+        self.service.set_state(self.service.model.get_state())
+        self.assertIsNot(self.service.serving, serving)
+        self.assertEqual(self.service.serving.version, serving.version + 1)
+        for key, value in self.service.model.get_state().items():
+            self.assertTrue(torch.equal(self.service.serving.model.state_dict()[key], value))
+
+    def test_get_batch_song_recommendations(self):
+        recommendations = self.service.get_batch_song_recommendations(['Song A', 'Song C', 'Unknown'], top_n=2)
+        self.assertEqual(set(recommendations.keys()), {'Song A', 'Song C'})
+        self.assertEqual(list(recommendations['Song A']), list(self.service.get_song_recommendations('Song A', top_n=2)))
+        self.assertNotIn('Song C', recommendations['Song C'])
+
+    def test_add_songs(self):
+        self.service.get_catalog_embeddings()
+        new_songs = pd.DataFrame({
+            'song_id': [4], 'title': ['Song D'], 'genre': ['Rock'], 'artist': ['Artist4'], 'tempo': [125], 'duration': [210]
+        })
+        self.service.add_songs(new_songs)
+
+        self.assertEqual(len(self.rdf_knowledge_graph.songs_data), 4)
+        self.assertEqual(self.service.features_encoded.shape, (4, self.service.input_dim))
+        self.assertEqual(len(self.service.get_catalog_embeddings()), 4)
+        self.assertEqual(self.service.extract_song_from_string("play song d"), "Song D")
+        self.assertEqual(len(self.service.get_song_recommendations('Song D', top_n=3)), 3)
+
     def test_recommend_songs_for_user_no_data(self):
         with self.assertRaises(ValueError):
             self.service.recommend_songs_for_user(user_id=1)
 
+    def test_recommend_songs_for_user(self):
+        user_ratings_csv = io.StringIO("user_id,song_id,rating\n101,1,4.5\n101,2,2.0\n102,3,3.0\n")
+        service = MLService(rdf_knowledge_graph=self.rdf_knowledge_graph, user_ratings_csv=user_ratings_csv)
+
+        self.assertEqual(service.recommend_songs_for_user(user_id=101, top_n=5), ['Song C'])
+        self.assertEqual(len(service.recommend_songs_for_user(user_id=102, top_n=1)), 1)
+        self.assertEqual(service.recommend_songs_for_user(user_id=999), [])
+
+    def test_recommend_songs_for_user_with_zero_ratings(self):
+        user_ratings_csv = io.StringIO("user_id,song_id,rating\n101,1,0.0\n101,2,0.0\n")
+        service = MLService(rdf_knowledge_graph=self.rdf_knowledge_graph, user_ratings_csv=user_ratings_csv)
+
+        self.assertEqual(service.recommend_songs_for_user(user_id=101), [])
+
+    def test_recommend_songs_for_user_without_rated_songs_in_catalog(self):
+        user_ratings_csv = io.StringIO("user_id,song_id,rating\n101,98,4.0\n101,99,5.0\n")
+        service = MLService(rdf_knowledge_graph=self.rdf_knowledge_graph, user_ratings_csv=user_ratings_csv)
+
+        self.assertEqual(service.recommend_songs_for_user(user_id=101), [])
+
     def test_extract_song_from_string(self):
         result = self.service.extract_song_from_string("I love Song A!")
         self.assertEqual(result, "Song A")
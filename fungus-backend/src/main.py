@@ -1,7 +1,6 @@
 # main.yp
 import json
 import threading
-import time
 import logging
 import os
 from rdf_knowledge_graph import RDFKnowledgeGraph
@@ -18,6 +17,11 @@ from datetime import datetime
 import uuid
 import csv
 from fitness_calculator import FitnessCalculator
+from catalog_snapshot import load_catalog
+from epoch_scheduler import EpochScheduler
+from group_selector import GroupSelector
+from adaptive_cadence import AdaptiveCadence
+from aggregation import relative_change
 
 load_dotenv()
 
@@ -41,30 +45,46 @@ FUSEKI_DATABASE_NAME = os.getenv("FUSEKI_DATABASE_NAME")
 
 FITNESS_THRESHOLD = float(os.getenv("FITNESS_THRESHOLD", 0.5))
 SLEEP_TIME = float(os.getenv("SLEEP_TIME", 42300))
+RECOMMEND_BATCH_LIMIT = int(os.getenv("RECOMMEND_BATCH_LIMIT", 100))
 MODEL_NAME = "model-" + str(FUNGUS_ID)
 
 class MusicRecommendationFungus:
     def __init__(self):
         logging.info("[INIT] Initializing Music Recommendation instance")
         self.mastodon_client = MastodonClient(self)
-        self.knowledge_graph = RDFKnowledgeGraph(mastodon_client=self.mastodon_client)
-        self.knowledge_graph.insert_songs_from_csv('songs.csv')
-        self.machine_learning_service = MLService(self.knowledge_graph, user_ratings_csv='user_ratings.csv')
-        self.knowledge_graph.insert_model_state(MODEL_NAME, self.machine_learning_service.model.get_state())
+        # Statuses are posted from a background thread, keeping the ActivityPub backend off the epoch's critical path
+        self.mastodon_client.start_outbox()
+        self.knowledge_graph = RDFKnowledgeGraph(mastodon_client=self.mastodon_client, load_songs=False)
+        # Reuses the snapshot of the previous start if songs.csv is unchanged, otherwise ingests it
+        self.catalog = load_catalog(self.knowledge_graph, 'songs.csv')
+        self.machine_learning_service = MLService(self.knowledge_graph, user_ratings_csv='user_ratings.csv', catalog_snapshot=self.catalog)
+        if self.catalog.features is None:
+            self.catalog = self.machine_learning_service.snapshot_catalog(self.catalog.source_digest)
+            self.catalog.save()
+        try:
+            self.knowledge_graph.insert_model_state(MODEL_NAME, self.machine_learning_service.model.get_state(), sample_count=self.machine_learning_service.num_training_samples())
+        except Exception as e:
+            logging.error(f"[ERROR] Failed to publish the initial model, it is published after the first training: {e}")
         self.learning_group_id = str(uuid.uuid4())
         self.knowledge_graph.insert_learning_group(self.learning_group_id, MODEL_NAME)
         self.fitness_threshold = FITNESS_THRESHOLD
         self.fungus_name = self.generate_fungus_name()
         self.profile_picture_code = self.generate_random_code()
         self.spore_manager = SporeManager(self.mastodon_client)
-        self.fitness_calculator = FitnessCalculator(machine_learning_service=self.machine_learning_service)
+        self.fitness_calculator = FitnessCalculator(machine_learning_service=self.machine_learning_service, songs=self.catalog.songs)
+        # Last calculated fitness, advertised with JOIN_GROUP offers
+        self.fitness = None
+        self.feature_space = self.machine_learning_service.feature_encoder.feature_space
+        self.group_selector = GroupSelector(self.knowledge_graph, feature_space=self.feature_space)
         fuseki_url = FUSEKI_SERVER_URL
         database = FUSEKI_DATABASE_NAME
         self.update_url = f"{fuseki_url}/{database}/update"
         self.link_to_database = f"{fuseki_url}/{database}/query"
         self.knowledge_graph.insert_fungus_data(FUNGUS_ID, self.fungus_name, self.link_to_database)
-        # default sleep time: 42300
-        self.sleep_time = SLEEP_TIME
+        # Adapts the sleep time between epochs to convergence, up to SLEEP_TIME (default: 42300)
+        self.cadence = AdaptiveCadence(max_interval=SLEEP_TIME)
+        self.sleep_time = self.cadence.interval
+        self.aggregation_delta = None
         logging.info(f"[CONFIG] Feedback threshold set to {self.fitness_threshold}")
 
     def generate_fungus_name(self):
@@ -78,83 +98,52 @@ class MusicRecommendationFungus:
         return fungus_name
 
     def start(self):
-        switch_team = True
-        found_initial_team = False
         # post initial link to model
-        self.spore_manager.post_spore_action(SporeAction("JOIN_GROUP", [self.link_to_database, self.learning_group_id], f"fungus-node-{FUNGUS_ID}"))
+        self.announce_learning_group()
         logging.info({"node_id": f"fungus-node-{FUNGUS_ID}", "event": "message_received", "details": {"from": f"fungus-node-{FUNGUS_ID}", "model": self.learning_group_id}, "timestamp": datetime.today().strftime('%Y-%m-%dT%H:%M:%S')})
-        time.sleep(1)
-        i = 0
-        while True:
-            logging.info(f"[START] Starting epoche {i} (at {datetime.now()})")
-            try:
-                if switch_team or not found_initial_team:
-                    self.mastodon_client.post_status(f"[SPORE] Searching for a new learning group ...")
-                    logging.info("[CHECK] Searching for a new fungus group")
-                    #messages, random_mycelial_tag = self.mastodon_client.get_statuses_from_random_mycelial_tag()
-
-                    self.spore_manager.fetch_spore_actions()
-                    spore_actions = self.spore_manager.get_spore_actions()
-                    join_spore_action = self.filter_spore_actions_by_type(spore_actions, 'JOIN_GROUP')
-                    #link_to_model = self.knowledge_graph.look_for_new_fungus_group_in_statuses(messages, random_mycelial_tag)
-                    if join_spore_action and len(join_spore_action) > 0:
-                        self.link_to_database = join_spore_action[0].args[0]
-                        old_learning_group = self.learning_group_id
-                        self.learning_group_id = join_spore_action[0].args[1]
-                        self.knowledge_graph.remove_from_old_learning_group_and_add_to_new(MODEL_NAME, old_learning_group, self.learning_group_id)
-                        self.mastodon_client.post_status(f"[SPORE] Joined new group: {self.link_to_database}")
-                        logging.info({"node_id": f"fungus-node-{FUNGUS_ID}", "event": "message_received", "details": {"from": join_spore_action[0].actor, "model": self.learning_group_id}, "timestamp": datetime.today().strftime('%Y-%m-%dT%H:%M:%S')})
-                        found_initial_team = True
-                        #self.knowledge_graph.look_for_song_data_in_statuses_to_insert(messages)
-                        #self.knowledge_graph.on_found_group_to_join(self.link_to_model)
-                    else:
-                        logging.info("[WAIT] No group to join found.")
-                        self.mastodon_client.post_status(f"[SPORE] No initial learning group found. Going to sleep.")
-                elif not switch_team:
-                    # send invite to join group
-                    self.spore_manager.post_spore_action(SporeAction("JOIN_GROUP", [self.link_to_database, self.learning_group_id], f"fungus-node-{FUNGUS_ID}"))
-                    self.mastodon_client.post_status(f"[SPORE] Invited node to join group: {self.link_to_database}")
-                else:
-                    logging.info("[WAIT] No initial groups found.")
-                    self.mastodon_client.post_status(f"[SPORE] No initial learning group found. Going to sleep.")
-                    self.link_to_database = None
-
-                if self.link_to_database is not None:
-                    logging.info("[TRAINING] New fungus group detected, initiating training")
-                    self.mastodon_client.post_status(f"[SPORE] Started new training epoche.")
-                    self.train_model()
-                    learning_group_model_names = self.knowledge_graph.fetch_current_learning_group(self.learning_group_id)
-                    all_models_of_my_learning_group = self.knowledge_graph.fetch_all_model_from_knowledge_base_with_name(self.link_to_database, learning_group_model_names)
-                    logging.info(f"Received models from other nodes (size: {len(all_models_of_my_learning_group)})")
-                    self.mastodon_client.post_status(f"[SPORE] Finished training and received model from other nodes.")
-                    aggregated_model_state = self.knowledge_graph.aggregate_model_states(self.machine_learning_service.model.get_state(), all_models_of_my_learning_group)
-                    # deploy new model
-                    self.machine_learning_service.model.set_state(aggregated_model_state)
-                    self.mastodon_client.post_status(f"[SPORE] Deployed aggregated model.")
-                    logging.info("[SAVING] Deployed aggregated model as new model")
-
-                    # feedback = self.answer_user_feedback()
-                    # logging.info(f"[FEEDBACK] Received feedback: {feedback}")
-
-                    fitness = self.fitness_calculator.calculate_fitness()
-                    switch_team = self.decide_whether_to_switch_team(fitness)
-                    if switch_team:
-                        self.mastodon_client.post_status(f"[SPORE] Decided to switch the learning group.")
-                        self.link_to_database = None
-                    else:
-                        self.mastodon_client.post_status(f"[SPORE] Decided against switching groups.")
-
-                    self.evolve_behavior()
-                else:
-                    logging.error("The model is none")
-
-                logging.info("[SLEEP] Sleeping for " + str(self.sleep_time))
-                self.mastodon_client.post_status(f"[SPORE] Sleeping for {str(self.sleep_time)}.")
-                time.sleep(self.sleep_time)
-                i = i + 1
-            except Exception as e:
-                logging.error(f"[ERROR] An error occurred: {e}", exc_info=True)
-                time.sleep(self.sleep_time)
+        EpochScheduler(self).run()
+
+    def announce_learning_group(self):
+        self.spore_manager.post_spore_action(SporeAction("JOIN_GROUP", [self.link_to_database, self.learning_group_id, self.fitness, self.feature_space], f"fungus-node-{FUNGUS_ID}"))
+
+    def select_learning_group(self, join_spore_actions):
+        return self.group_selector.select(join_spore_actions, current_learning_group_id=self.learning_group_id)
+
+    def join_learning_group(self, join_spore_action):
+        self.link_to_database = join_spore_action.args[0]
+        old_learning_group = self.learning_group_id
+        self.learning_group_id = join_spore_action.args[1]
+        self.knowledge_graph.remove_from_old_learning_group_and_add_to_new(MODEL_NAME, old_learning_group, self.learning_group_id)
+        self.mastodon_client.post_status(f"[SPORE] Joined new group: {self.link_to_database}")
+        self.sleep_time = self.cadence.reset()
+        logging.info({"node_id": f"fungus-node-{FUNGUS_ID}", "event": "message_received", "details": {"from": join_spore_action.actor, "model": self.learning_group_id}, "timestamp": datetime.today().strftime('%Y-%m-%dT%H:%M:%S')})
+
+    def fetch_learning_group_models(self):
+        """Fetches the models of the other group members; the own model is passed to the aggregation separately."""
+        learning_group_model_names = [name for name in self.knowledge_graph.fetch_current_learning_group(self.learning_group_id) if name != MODEL_NAME]
+        if not learning_group_model_names:
+            logging.info("No other nodes in the learning group")
+            return []
+        all_models_of_my_learning_group = self.knowledge_graph.fetch_all_model_from_knowledge_base_with_name(self.get_learning_group_links(learning_group_model_names), learning_group_model_names)
+        logging.info(f"Received models from other nodes (size: {len(all_models_of_my_learning_group)})")
+        return all_models_of_my_learning_group
+
+    def aggregate_and_deploy(self, all_models_of_my_learning_group):
+        current_model_state = self.machine_learning_service.model.get_state()
+        aggregated_model_state = self.knowledge_graph.aggregate_model_states(current_model_state, all_models_of_my_learning_group,
+                                                                             current_sample_count=self.machine_learning_service.num_training_samples())
+        self.aggregation_delta = relative_change(current_model_state, aggregated_model_state)
+        # deploy new model
+        self.machine_learning_service.set_state(aggregated_model_state)
+        logging.info("[SAVING] Deployed aggregated model as new model")
+
+    def evaluate_fitness(self):
+        """Returns whether to switch the learning group."""
+        self.fitness = float(self.fitness_calculator.calculate_fitness())
+        return self.decide_whether_to_switch_team(self.fitness)
+
+    def update_cadence(self):
+        self.sleep_time = self.cadence.update(self.fitness, self.aggregation_delta)
 
     def train_model(self):
         try:
@@ -162,13 +151,32 @@ class MusicRecommendationFungus:
             self.machine_learning_service.train_model()
             model = self.machine_learning_service.model
             logging.info(f"[RESULT] Model trained successfully.")
-            self.knowledge_graph.save_model(MODEL_NAME, model)
+            self.knowledge_graph.save_model(MODEL_NAME, model, sample_count=self.machine_learning_service.num_training_samples())
             logging.info("[STORE] Model saved to RDF Knowledge Graph")
             self.mastodon_client.post_status(f"[SPORE] Model updated.")
             logging.info("[NOTIFY] Status posted to Mastodon")
         except Exception as e:
             logging.error(f"[ERROR] Failed during training and deployment: {e}", exc_info=True)
 
+    def ingest_songs_from_statuses(self):
+        """Adds songs posted as song-data under a mycelial hashtag to the knowledge base and the served catalog."""
+        try:
+            messages, _ = self.mastodon_client.get_statuses_from_random_mycelial_tag()
+            new_songs = self.knowledge_graph.look_for_song_data_in_statuses_to_insert(messages)
+            self.machine_learning_service.add_songs(new_songs)
+            if len(new_songs) > 0:
+                logging.info(f"[INGEST] Added {len(new_songs)} songs from Mastodon statuses to the catalog")
+        except Exception as e:
+            logging.error(f"[ERROR] Failed to ingest songs from statuses: {e}", exc_info=True)
+
+    def get_learning_group_links(self, learning_group_model_names):
+        """Databases holding models of the learning group: the joined one plus the ones of known member fungi."""
+        links = [self.link_to_database]
+        for fungus_data in self.knowledge_graph.get_all_fungi_data():
+            if f"model-{fungus_data['fungus_id']}" in learning_group_model_names:
+                links.append(fungus_data["link_to_model"])
+        return links
+
     def decide_whether_to_switch_team(self, fitness):
         switch_decision = fitness < self.fitness_threshold
         logging.info(f"[DECISION] Switch team: {switch_decision} with fitness: {fitness} and fitness_threshold: {self.fitness_threshold}")
@@ -210,6 +218,10 @@ class MusicRecommendationFungus:
             recommendations = [rec.tolist() if hasattr(rec, 'tolist') else rec for rec in recommendations]
         return recommendations
 
+    def get_batch_song_recommendations(self, song_names, top_n=3):
+        recommendations = self.machine_learning_service.get_batch_song_recommendations(song_names, top_n)
+        return {song_name: recommendations[song_name].tolist() if song_name in recommendations else [] for song_name in song_names}
+
     def filter_spore_actions_by_type(self, spore_actions, spore_type):
         return list(filter(lambda e: e.spore_type == spore_type, spore_actions))
 
@@ -228,6 +240,25 @@ def get_recommendation():
     recommendations = music_service.get_song_recommendations(song_name)
     return jsonify({"song_name": song_name, "recommendations": recommendations[0]})
 
+@app.route('/recommend/batch', methods=['POST'])
+def get_batch_recommendations():
+    """Endpoint to get song recommendations for several songs at once."""
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    song_names = body.get('song_names')
+    if not isinstance(song_names, list) or not song_names or not all(isinstance(name, str) for name in song_names):
+        return jsonify({"error": "Missing or invalid 'song_names' parameter"}), 400
+    if len(song_names) > RECOMMEND_BATCH_LIMIT:
+        return jsonify({"error": f"At most {RECOMMEND_BATCH_LIMIT} songs per request"}), 400
+    top_n = body.get('top_n', 3)
+    if isinstance(top_n, bool) or not isinstance(top_n, int) or top_n < 1:
+        return jsonify({"error": "Invalid 'top_n' parameter"}), 400
+
+    logging.info(f"[REQUEST] Received batch recommendation request for {len(song_names)} songs")
+    recommendations = music_service.get_batch_song_recommendations(song_names, top_n)
+    return jsonify({"recommendations": recommendations})
+
 @app.route('/fungi', methods=['GET'])
 def get_fungi_data():
     """ Endpoint for bots configuration """
@@ -252,6 +283,11 @@ def get_random_profile():
         'code': music_service.profile_picture_code
     })
 
+@app.route('/cadence', methods=['GET'])
+def get_cadence():
+    """Endpoint for the current interval between training epochs and the convergence it is based on."""
+    return jsonify({"cadence": music_service.cadence.as_dict()})
+
 @app.route('/info', methods=['GET'])
 def get_fungus_info():
     info = {
@@ -264,4 +300,7 @@ if __name__ == "__main__":
     port = FUNGUS_BACKEND_PORT
     logging.info("[STARTUP] Launching Flask app for Music Recommendation Service on port " + str(port))
     threading.Thread(target=lambda: app.run(host="0.0.0.0", port=int(port), debug=True, use_reloader=False)).start()
-    music_service.start()
+    try:
+        music_service.start()
+    finally:
+        music_service.mastodon_client.stop_outbox()
@@ -1,6 +1,15 @@
+import functools
+import pandas as pd
 import unittest
 from unittest.mock import patch, MagicMock
-from main import MusicRecommendationFungus
+import rdf_knowledge_graph
+
+# main builds its fungus on import: build it against the in-process knowledge graph, so no Fuseki or ActivityPub backend is needed
+with patch('rdf_knowledge_graph.RDFKnowledgeGraph', functools.partial(rdf_knowledge_graph.RDFKnowledgeGraph, mode="local")), \
+        patch('mastodon_client.MastodonClient', MagicMock()):
+    from main import MusicRecommendationFungus, app, music_service, SLEEP_TIME, MODEL_NAME, RECOMMEND_BATCH_LIMIT
+from epoch_scheduler import EpochScheduler
+from adaptive_cadence import AdaptiveCadence
 
 class TestMusicRecommendationFungus(unittest.TestCase):
 
@@ -36,5 +45,102 @@ class TestMusicRecommendationFungus(unittest.TestCase):
         self.music_fungus.evolve_behavior(0.3)
         self.assertNotEqual(self.music_fungus.fitness_threshold, old_threshold)
 
+    def test_epoch_does_not_fetch_the_own_model(self):
+        self.mock_knowledge_graph.fetch_current_learning_group.return_value = [MODEL_NAME, "model-99"]
+        self.mock_knowledge_graph.get_all_fungi_data.return_value = []
+        self.mock_knowledge_graph.fetch_all_model_from_knowledge_base_with_name.return_value = []
+        self.music_fungus.select_learning_group = MagicMock(return_value=None)
+        scheduler = EpochScheduler(self.music_fungus, poll_interval=60)
+        scheduler.found_initial_team = True
+        scheduler.switch_team = False
+
+        scheduler.run(max_epochs=1)
+
+        self.mock_ml_service.train_model.assert_called_once()
+        _, model_names = self.mock_knowledge_graph.fetch_all_model_from_knowledge_base_with_name.call_args[0]
+        self.assertEqual(model_names, ["model-99"])
+
+    def test_ingest_songs_from_statuses(self):
+        new_songs = pd.DataFrame({"song_id": [4], "title": ["Song D"], "genre": ["Rock"], "artist": ["Artist4"], "tempo": [125], "duration": [210]})
+        messages = ['song-data: ["Song D", "Rock", "Artist4", 125, 210]']
+        self.mock_mastodon.get_statuses_from_random_mycelial_tag.return_value = (messages, "#tag")
+        self.mock_knowledge_graph.look_for_song_data_in_statuses_to_insert.return_value = new_songs
+
+        self.music_fungus.ingest_songs_from_statuses()
+
+        self.mock_knowledge_graph.look_for_song_data_in_statuses_to_insert.assert_called_once_with(messages)
+        self.mock_ml_service.add_songs.assert_called_once_with(new_songs)
+
+class TestBatchRecommendationEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+
+    def test_rejects_non_object_body(self):
+        response = self.client.post('/recommend/batch', json=["Song A"])
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_non_list_song_names(self):
+        response = self.client.post('/recommend/batch', json={"song_names": "Song A"})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_non_string_song_names(self):
+        response = self.client.post('/recommend/batch', json={"song_names": ["Song A", 42]})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_too_many_song_names(self):
+        response = self.client.post('/recommend/batch', json={"song_names": ["Song A"] * (RECOMMEND_BATCH_LIMIT + 1)})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_boolean_top_n(self):
+        response = self.client.post('/recommend/batch', json={"song_names": ["Song A"], "top_n": True})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_returns_recommendations_per_song(self):
+        with patch.object(music_service, 'get_batch_song_recommendations', return_value={"Song A": ["Song B"]}) as recommend:
+            response = self.client.post('/recommend/batch', json={"song_names": ["Song A"], "top_n": 1})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"recommendations": {"Song A": ["Song B"]}})
+        recommend.assert_called_once_with(["Song A"], 1)
+
+class TestCadenceEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.cadence = AdaptiveCadence(max_interval=SLEEP_TIME, min_interval=10, backoff=2)
+
+    def test_reports_the_current_cadence(self):
+        self.cadence.update(fitness=0.6)
+        self.cadence.update(fitness=0.6, aggregation_delta=0.0)
+
+        with patch.object(music_service, 'cadence', self.cadence):
+            response = self.client.get('/cadence')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"cadence": {
+            "interval": 20,
+            "min_interval": 10,
+            "max_interval": SLEEP_TIME,
+            "state": "plateau",
+            "plateau_epochs": 1,
+            "fitness": 0.6,
+            "fitness_change": 0.0,
+            "aggregation_delta": 0.0,
+        }})
+
+    def test_reports_a_moving_model(self):
+        self.cadence.update(fitness=0.2)
+
+        with patch.object(music_service, 'cadence', self.cadence):
+            cadence = self.client.get('/cadence').get_json()["cadence"]
+
+        self.assertEqual(cadence["state"], "moving")
+        self.assertEqual(cadence["interval"], 10)
+        self.assertIsNone(cadence["fitness_change"])
+
 if __name__ == "__main__":
     unittest.main()
@@ -6,6 +6,8 @@ from dotenv import load_dotenv
 import random
 import json
 from spore_action import SporeAction
+from http_transport import get_transport
+from status_outbox import StatusOutbox, STATUS, SPORE
 
 load_dotenv()
 
@@ -25,10 +27,13 @@ MASTODON_API_KEY = os.getenv("MASTODON_API_KEY")
 MASTODON_INSTANCE_URL = os.getenv("MASTODON_INSTANCE_URL")
 NUTRIAL_TAG = os.getenv("NUTRIAL_TAG")
 MYCELIAL_HASHTAG = os.getenv("MYCELIAL_TAG")
+# Spore actions fetched per poll at most
+SPORE_ACTION_PAGE_SIZE = int(os.getenv("SPORE_ACTION_PAGE_SIZE", 100))
 
 class MastodonClient:
-    def __init__(self, musicRecommendationFungus):
+    def __init__(self, musicRecommendationFungus, transport=None):
         self.musicRecommendationFungus = musicRecommendationFungus
+        self.transport = transport if transport is not None else get_transport()
         self.api_token = MASTODON_API_KEY
         self.instance_url = MASTODON_INSTANCE_URL
         self.nutrial_tag = NUTRIAL_TAG
@@ -36,8 +41,30 @@ class MastodonClient:
         self.ap_server_port = AP_BACKEND_PORT
         self.ids_of_replied_statuses = []
         self.ids_of_replies = []
+        self.outbox = None
+
+    def start_outbox(self, **kwargs):
+        """From now on post_status and post_spore_status queue their posts and return immediately."""
+        self.outbox = StatusOutbox(self.send_outbox_item, **kwargs).start()
+        return self.outbox
+
+    def stop_outbox(self):
+        if self.outbox is not None:
+            self.outbox.stop()
+            self.outbox = None
+
+    def send_outbox_item(self, kind, text):
+        if kind == SPORE:
+            return self.send_spore_status(text) is not None
+        return self.send_status(text) is not None
 
     def post_status(self, status_text):
+        if self.outbox is not None:
+            self.outbox.put(STATUS, status_text)
+            return None
+        return self.send_status(status_text)
+
+    def send_status(self, status_text):
         # url = f"{self.instance_url}/api/v1/statuses"
         url = f"http://{self.ap_server}:{self.ap_server_port}/statuses"
         logging.info("Post to: " + url)
@@ -48,7 +75,7 @@ class MastodonClient:
         }
 
         try:
-            response = requests.post(url, headers=headers, json=payload)
+            response = self.transport.post(url, headers=headers, json=payload)
             response.raise_for_status()
             logging.info(f"Posted to Mastodon: {status_text}")
             return response.json()
@@ -73,9 +100,9 @@ class MastodonClient:
             'limit': 30
         }
 
-        response = requests.get(f"{base_url}/timelines/tag/{self.nutrial_tag}",
-                                headers=headers,
-                                params=params)
+        response = self.transport.get(f"{base_url}/timelines/tag/{self.nutrial_tag}",
+                                      headers=headers,
+                                      params=params)
 
         if response.status_code == 200:
             data = response.json()
@@ -113,7 +140,7 @@ class MastodonClient:
             'Accept': 'application/json'
         }
 
-        response = requests.get(f"{base_url}/statuses/{status_id}", headers=headers)
+        response = self.transport.get(f"{base_url}/statuses/{status_id}", endpoint="GET mastodon/statuses/:id", headers=headers)
 
         if response.status_code == 200:
             data = response.json()
@@ -142,7 +169,7 @@ class MastodonClient:
         logging.info("Reply to status with id " + str(status_id) + ": " + reply_message)
 
         # Send the POST request
-        response = requests.post(f'{self.instance_url}/api/v1/statuses', json=payload, headers=headers)
+        response = self.transport.post(f'{self.instance_url}/api/v1/statuses', json=payload, headers=headers)
 
         try:
             response_json = response.json()
@@ -161,7 +188,12 @@ class MastodonClient:
             "args": spore_action.args,
             "actor": f"fungus-node-{FUNGUS_ID}"
         })
+        if self.outbox is not None:
+            self.outbox.put(SPORE, status_text)
+            return None
+        return self.send_spore_status(status_text)
 
+    def send_spore_status(self, status_text):
         # url = f"{self.instance_url}/api/v1/statuses"
         url = f"http://{self.ap_server}:{self.ap_server_port}/spore-actions"
         logging.info("Post spore action to: " + url)
@@ -172,7 +204,7 @@ class MastodonClient:
         }
 
         try:
-            response = requests.post(url, headers=headers, json=payload)
+            response = self.transport.post(url, headers=headers, json=payload)
             response.raise_for_status()
             logging.info(f"Posted to Mastodon: {status_text}")
             return response.json()
@@ -180,7 +212,14 @@ class MastodonClient:
             logging.error(f"Error posting status: {e}")
             return None
 
-    def fetch_latest_spore_actions(self):
+    def fetch_latest_spore_actions(self, since_id=None, epoch=None, limit=SPORE_ACTION_PAGE_SIZE):
+        """
+        Fetches the spore actions received after the one with id since_id (all kept ones if None), oldest first.
+        since_id is only valid for the epoch of the AP backend it was returned with; from another epoch
+        (e.g. after a restart of the backend) the log is read from its beginning.
+        Returns (spore actions, last_id, epoch), where last_id and epoch are the cursor for the next call
+        (last_id also covers malformed actions, which are skipped), or None if the request failed.
+        """
         base_url = f"http://{self.ap_server}:{self.ap_server_port}"
 
         headers = {
@@ -188,35 +227,32 @@ class MastodonClient:
             'Accept': 'application/json'
         }
 
-        params = {
-            'type': 'statuses',
-            'tag': "spore",
-            'limit': 30
-        }
+        params = {'limit': limit}
+        if since_id is not None:
+            params['since_id'] = since_id
+        if epoch is not None:
+            params['epoch'] = epoch
 
-        response = requests.get(f"{base_url}/spore-actions",
-                                headers=headers,
-                                params=params)
+        response = self.transport.get(f"{base_url}/spore-actions",
+                                      headers=headers,
+                                      params=params)
 
         if response.status_code == 200:
-            logging.info("Parsing response element:\n" + json.dumps(response.json(), indent=2))
-
-            # Step 1: Extract spore-actions field (which is a string)
-            spore_actions = response.json()["spore-actions"]
-
-            logging.info(f"Found {len(spore_actions)} latest spore action posts")
+            body = response.json()
+            spore_actions = body["spore-actions"]
+            logging.info(f"Found {len(spore_actions)} new spore action posts (since id {since_id})")
             received_spore_actions = []
 
             for status in spore_actions:
-                logging.info(status)
-
-                # Step 3: Extract and parse 'text' field
-                spore_action_dict = json.loads(status["text"])
-
-                # Step 4: Create the SporeAction object
-                received_spore_actions.append(SporeAction(spore_action_dict["spore_type"], spore_action_dict["args"], spore_action_dict["actor"]))
-
-            return received_spore_actions
+                logging.debug(status)
+                try:
+                    spore_action_dict = json.loads(status["text"])
+                    received_spore_actions.append(SporeAction(spore_action_dict["spore_type"], spore_action_dict["args"], spore_action_dict["actor"], status.get("id")))
+                except (ValueError, KeyError, TypeError) as e:
+                    logging.warning(f"Skipping malformed spore action {status.get('id')}: {e}")
+
+            last_id = body.get("last_id", spore_actions[-1].get("id") if spore_actions else since_id)
+            return received_spore_actions, last_id, body.get("epoch")
         else:
             logging.error(f"Error: {response.status_code}")
             return None
@@ -1,25 +1,24 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import MagicMock
 from mastodon_client import MastodonClient
 
 class TestMastodonClient(unittest.TestCase):
     def setUp(self):
-        self.client = MastodonClient()
+        self.transport = MagicMock()
+        self.client = MastodonClient(MagicMock(), transport=self.transport)
 
-    @patch('mastodon_client.requests.post')
-    def test_post_status_successful(self, mock_post):
-        mock_post.return_value.status_code = 200
-        mock_post.return_value.json.return_value = {"id": "12345"}
+    def test_post_status_successful(self):
+        self.transport.post.return_value.status_code = 200
+        self.transport.post.return_value.json.return_value = {"id": "12345"}
 
         response = self.client.post_status("Hello, Mastodon!")
 
         self.assertIsNotNone(response)
         self.assertEqual(response["id"], "12345")
 
-    @patch('mastodon_client.requests.get')
-    def test_fetch_latest_statuses_successful(self, mock_get):
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = [{"content": "Test post"}]
+    def test_fetch_latest_statuses_successful(self):
+        self.transport.get.return_value.status_code = 200
+        self.transport.get.return_value.json.return_value = [{"content": "Test post"}]
 
         statuses = self.client.fetch_latest_statuses(None, "test")
 
@@ -27,24 +26,50 @@ class TestMastodonClient(unittest.TestCase):
         self.assertEqual(len(statuses), 1)
         self.assertEqual(statuses[0]["content"], "Test post")
 
-    @patch('mastodon_client.requests.get')
-    def test_count_likes_of_status_successful(self, mock_get):
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = {"favourites_count": 42}
+    def test_count_likes_of_status_successful(self):
+        self.transport.get.return_value.status_code = 200
+        self.transport.get.return_value.json.return_value = {"favourites_count": 42}
 
         likes = self.client.count_likes_of_status("12345")
 
         self.assertEqual(likes, 42)
 
-    @patch('mastodon_client.requests.post')
-    def test_reply_to_status_successful(self, mock_post):
-        mock_post.return_value.status_code = 200
-        mock_post.return_value.json.return_value = {"id": "67890"}
+    def test_reply_to_status_successful(self):
+        self.transport.post.return_value.status_code = 200
+        self.transport.post.return_value.json.return_value = {"id": "67890"}
 
         self.client.reply_to_status("12345", "testuser", "This is a reply!")
 
         self.assertIn("12345", self.client.ids_of_replied_statuses)
         self.assertIn("67890", self.client.ids_of_replies)
 
+    def test_outbox_posts_in_the_background(self):
+        self.transport.post.return_value.status_code = 200
+        self.transport.post.return_value.json.return_value = {"id": "0"}
+        outbox = self.client.start_outbox(path=None, linger=0.05)
+
+        self.assertIsNone(self.client.post_status("first"))
+        self.client.post_status("second")
+        self.assertTrue(outbox.flush(timeout=5))
+        self.client.stop_outbox()
+
+        self.transport.post.assert_called_once()
+        self.assertEqual(self.transport.post.call_args.kwargs["json"]["status"], "first\nsecond")
+
+    def test_fetch_latest_spore_actions_since_id(self):
+        self.transport.get.return_value.status_code = 200
+        self.transport.get.return_value.json.return_value = {"spore-actions": [
+            {"id": 7, "text": '{"spore_type": "JOIN_GROUP", "args": ["link", "group"], "actor": "fungus-node-1"}', "actor": "a"},
+            {"id": 8, "text": "not json", "actor": "a"},
+        ], "last_id": 8, "epoch": "e1"}
+
+        spore_actions, last_id, epoch = self.client.fetch_latest_spore_actions(since_id=6, epoch="e1")
+
+        self.assertEqual(self.transport.get.call_args.kwargs["params"]["since_id"], 6)
+        self.assertEqual(self.transport.get.call_args.kwargs["params"]["epoch"], "e1")
+        self.assertEqual((last_id, epoch), (8, "e1"))
+        self.assertEqual(len(spore_actions), 1)
+        self.assertEqual((spore_actions[0].id, spore_actions[0].spore_type, spore_actions[0].args), (7, "JOIN_GROUP", ["link", "group"]))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,80 @@
+# model_exchange.py
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from model_state_codec import encode_model_state, decode_model_state, state_digest
+
+load_dotenv()
+
+# full, fp16, int8, delta-fp16 or delta-int8
+MODEL_EXCHANGE_MODE = os.getenv("MODEL_EXCHANGE_MODE", "full")
+# Maximum quantization error per tensor, relative to its largest magnitude, before falling back to float32
+MODEL_EXCHANGE_TOLERANCE = float(os.getenv("MODEL_EXCHANGE_TOLERANCE", 0.01))
+# Every n-th published delta-mode state is a full keyframe, so peers that missed a base can resync
+MODEL_KEYFRAME_INTERVAL = int(os.getenv("MODEL_KEYFRAME_INTERVAL", 10))
+MODEL_EXCHANGE_CACHE_SIZE = int(os.getenv("MODEL_EXCHANGE_CACHE_SIZE", 64))
+
+
+class ModelExchange:
+    """
+    Encodes published and decodes fetched model states according to MODEL_EXCHANGE_MODE.
+
+    In delta modes a state is encoded as the quantized difference to the last state this node published.
+    The base is the state as peers reconstruct it (not the exact local one), so quantization errors do not
+    accumulate over rounds. Decoded states are kept by digest, so deltas from peers can be applied
+    to the state fetched from them in an earlier round.
+    Encoding and decoding are serialized: the epoch scheduler publishes the own state while peer states
+    are being fetched and decoded, and both update the cache of known states.
+    """
+
+    def __init__(self, mode=MODEL_EXCHANGE_MODE, tolerance=MODEL_EXCHANGE_TOLERANCE,
+                 keyframe_interval=MODEL_KEYFRAME_INTERVAL, cache_size=MODEL_EXCHANGE_CACHE_SIZE):
+        self.delta = mode.startswith("delta-")
+        quantization = mode[len("delta-"):] if self.delta else mode
+        if quantization not in ("full", "fp16", "int8"):
+            raise ValueError(f"Unknown model exchange mode: {mode}")
+        self.quantization = None if quantization == "full" else quantization
+        self.tolerance = tolerance
+        self.keyframe_interval = keyframe_interval
+        self.cache_size = cache_size
+        self.known_states = OrderedDict()
+        self.published_base = None
+        self.rounds_since_keyframe = 0
+        self._lock = threading.RLock()
+
+    def encode(self, model_state):
+        """Encodes a state for publication and remembers how peers will reconstruct it."""
+        with self._lock:
+            base_state = None
+            if self.delta and self.published_base is not None and self.rounds_since_keyframe < self.keyframe_interval:
+                base_state = self.published_base
+                self.rounds_since_keyframe += 1
+            else:
+                self.rounds_since_keyframe = 0
+
+            state_encoded = encode_model_state(model_state, self.quantization, base_state, self.tolerance)
+            if self.delta:
+                self.published_base = self.decode(state_encoded)
+            return state_encoded
+
+    def decode(self, state_encoded):
+        """Decodes a fetched state; returns None if it is a delta against a base this node never saw."""
+        with self._lock:
+            try:
+                model_state = decode_model_state(state_encoded, self.known_states.get)
+            except KeyError as e:
+                logging.warning(f"[EXCHANGE] Skipping model state: {e}")
+                return None
+
+            # Peers may publish deltas regardless of this node's own mode
+            self._remember(model_state)
+            return model_state
+
+    def _remember(self, model_state):
+        digest = state_digest(model_state)
+        self.known_states[digest] = model_state
+        self.known_states.move_to_end(digest)
+        while len(self.known_states) > self.cache_size:
+            self.known_states.popitem(last=False)
@@ -0,0 +1,78 @@
+import threading
+import unittest
+import torch
+from model_exchange import ModelExchange
+from model_state_codec import encode_model_state
+
+def random_state(seed):
+    generator = torch.Generator().manual_seed(seed)
+    return {"fc1.weight": torch.randn(64, 258, generator=generator), "fc1.bias": torch.randn(64, generator=generator)}
+
+class TestModelExchange(unittest.TestCase):
+    def test_int8_is_smaller_and_within_tolerance(self):
+        state = random_state(0)
+        exchange = ModelExchange(mode="int8", tolerance=0.01)
+
+        encoded = exchange.encode(state)
+        decoded = ModelExchange().decode(encoded)
+
+        self.assertLess(len(encoded) * 3, len(encode_model_state(state)))
+        for key, tensor in state.items():
+            self.assertLessEqual((decoded[key] - tensor).abs().max().item(), 0.01 * tensor.abs().max().item())
+
+    def test_tolerance_falls_back_to_float32(self):
+        state = random_state(0)
+        encoded = ModelExchange(mode="int8", tolerance=1e-6).encode(state)
+        decoded = ModelExchange().decode(encoded)
+        self.assertTrue(torch.equal(decoded["fc1.weight"], state["fc1.weight"]))
+
+    def test_delta_rounds_are_applied_to_the_previous_state(self):
+        sender = ModelExchange(mode="delta-int8", keyframe_interval=10)
+        receiver = ModelExchange()
+        state = random_state(0)
+
+        for round_number in range(5):
+            state = {k: v + 0.01 * torch.randn_like(v) for k, v in state.items()}
+            decoded = receiver.decode(sender.encode(state))
+            self.assertIsNotNone(decoded)
+            # The sender's base tracks the receiver's reconstruction, so the error does not accumulate
+            self.assertLess((decoded["fc1.weight"] - state["fc1.weight"]).abs().max().item(), 0.05)
+
+    def test_delta_without_known_base_is_skipped_until_keyframe(self):
+        sender = ModelExchange(mode="delta-int8", keyframe_interval=2)
+        sender.encode(random_state(0))
+        late_receiver = ModelExchange()
+
+        self.assertIsNone(late_receiver.decode(sender.encode(random_state(1))))
+        self.assertIsNone(late_receiver.decode(sender.encode(random_state(2))))
+        self.assertIsNotNone(late_receiver.decode(sender.encode(random_state(3))))
+
+    def test_concurrent_encode_and_decode(self):
+        exchange = ModelExchange(mode="delta-int8", cache_size=4)
+        peer = ModelExchange(mode="full")
+        peer_states = [peer.encode(random_state(seed)) for seed in range(8)]
+        errors = []
+
+        def run(function, items):
+            try:
+                for item in items:
+                    function(item)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(exchange.encode, [random_state(seed) for seed in range(20)])),
+                   threading.Thread(target=run, args=(exchange.decode, peer_states * 3))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(exchange.known_states), 4)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            ModelExchange(mode="int4")
+
+if __name__ == '__main__':
+    unittest.main()
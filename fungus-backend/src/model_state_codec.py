@@ -0,0 +1,135 @@
+# model_state_codec.py
+import base64
+import hashlib
+import json
+import struct
+import numpy as np
+import torch
+
+# Literals of the binary format start with this prefix; anything else is read as legacy base64-encoded JSON
+BINARY_PREFIX = "fms1:"
+
+MAGIC = b"FMS"
+FORMAT_VERSION = 1
+# magic, format version, header length
+PREAMBLE = struct.Struct("<3sBI")
+ALIGNMENT = 8
+
+
+def encode_model_state(model_state, quantization=None, base_state=None, tolerance=None):
+    """
+    Encodes a state dict into a compact binary literal:
+    a preamble, a JSON key table with name/dtype/shape/offset per tensor, then the raw little-endian
+    tensor buffers (8-byte aligned). The binary payload is base64-encoded so it fits into an RDF literal.
+
+    quantization ('fp16' or 'int8' with a per-tensor scale) shrinks floating point tensors; a tensor whose
+    maximum error relative to its largest magnitude would exceed tolerance is stored unquantized instead.
+    With base_state only the difference to it is encoded, and its digest is recorded so the receiver can
+    look the base up again when decoding.
+    """
+    entries = []
+    buffers = []
+    offset = 0
+    for name, tensor in model_state.items():
+        array = tensor.detach().cpu().numpy()
+        entry = {"name": name, "dtype": array.dtype.newbyteorder('<').str, "shape": list(array.shape), "encoding": "raw"}
+        if base_state is not None and array.dtype.kind == 'f':
+            array = array - base_state[name].detach().cpu().numpy()
+            entry["delta"] = True
+        if quantization is not None and array.dtype.kind == 'f':
+            array, entry = _quantize(array, entry, quantization, tolerance)
+        array = np.require(array, dtype=array.dtype.newbyteorder('<'), requirements='C')
+
+        padding = -offset % ALIGNMENT
+        if padding:
+            buffers.append(b"\0" * padding)
+            offset += padding
+        entry.update({"offset": offset, "nbytes": array.nbytes})
+        entries.append(entry)
+        buffers.append(array.tobytes())
+        offset += array.nbytes
+
+    header = {"tensors": entries}
+    if base_state is not None:
+        header["base"] = state_digest(base_state)
+    header = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    header += b" " * (-(PREAMBLE.size + len(header)) % ALIGNMENT)
+    payload = b"".join([PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)), header] + buffers)
+    return BINARY_PREFIX + base64.b64encode(payload).decode('ascii')
+
+
+def decode_model_state(state_encoded, base_lookup=None):
+    """
+    Decodes a literal written by encode_model_state or by the legacy base64-JSON encoding into a state dict.
+    Quantized tensors are dequantized; for delta-encoded states base_lookup(digest) must return the base state.
+    """
+    if not state_encoded.startswith(BINARY_PREFIX):
+        return _decode_legacy(state_encoded)
+
+    # One writable copy of the payload; every unquantized tensor is a zero-copy view into it
+    payload = bytearray(base64.b64decode(state_encoded[len(BINARY_PREFIX):]))
+    magic, version, header_length = PREAMBLE.unpack_from(payload)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model state format: {magic!r} v{version}")
+
+    data_start = PREAMBLE.size + header_length
+    header = json.loads(payload[PREAMBLE.size:data_start].decode('utf-8'))
+    base_state = None
+    if "base" in header:
+        base_state = base_lookup(header["base"]) if base_lookup is not None else None
+        if base_state is None:
+            raise KeyError(f"Base state {header['base']} of delta-encoded model state is unknown")
+
+    model_state = {}
+    for entry in header["tensors"]:
+        dtype = np.dtype(STORAGE_DTYPES.get(entry["encoding"], entry["dtype"]))
+        array = np.frombuffer(payload, dtype=dtype, count=entry["nbytes"] // dtype.itemsize, offset=data_start + entry["offset"])
+        if not dtype.isnative:
+            array = array.astype(dtype.newbyteorder('='))
+        if entry["encoding"] != "raw":
+            array = array.astype(np.dtype(entry["dtype"]).newbyteorder('=')) * np.float32(entry.get("scale", 1.0))
+        tensor = torch.from_numpy(array).reshape(entry["shape"])
+        if entry.get("delta"):
+            tensor = base_state[entry["name"]] + tensor
+        model_state[entry["name"]] = tensor
+    return model_state
+
+
+def state_digest(model_state):
+    """Short content hash of a state dict, used to reference the base of delta-encoded states."""
+    digest = hashlib.sha1()
+    for name, tensor in model_state.items():
+        digest.update(name.encode('utf-8'))
+        digest.update(tensor.detach().cpu().numpy().astype(np.float32, copy=False).tobytes())
+    return digest.hexdigest()[:16]
+
+
+STORAGE_DTYPES = {"fp16": "<f2", "int8": "|i1"}
+
+
+def _quantize(array, entry, quantization, tolerance):
+    magnitude = float(np.abs(array).max()) if array.size else 0.0
+    if quantization == "fp16":
+        quantized = array.astype(np.float16)
+        restored = quantized.astype(np.float32)
+        scale = None
+    elif quantization == "int8":
+        scale = magnitude / 127 if magnitude > 0 else 1.0
+        quantized = np.clip(np.round(array / scale), -127, 127).astype(np.int8)
+        restored = quantized.astype(np.float32) * np.float32(scale)
+    else:
+        raise ValueError(f"Unknown quantization: {quantization}")
+
+    if tolerance is not None and magnitude > 0 and float(np.abs(restored - array).max()) / magnitude > tolerance:
+        return array, entry
+    entry = dict(entry, encoding=quantization)
+    if scale is not None:
+        entry["scale"] = scale
+    return quantized, entry
+
+
+def _decode_legacy(state_encoded):
+    state_json = base64.b64decode(state_encoded).decode('utf-8')
+    state_dict = json.loads(state_json)
+    # Convert lists back to tensors
+    return {k: torch.tensor(v) for k, v in state_dict.items()}
@@ -0,0 +1,39 @@
+# model_state_codec_benchmark.py
+# Compares payload size and encode/decode time of the binary model state codec (also quantized)
+# with the legacy tolist -> JSON -> base64 encoding. Run with: python model_state_codec_benchmark.py [input_dim] [hidden_dim]
+import base64
+import json
+import sys
+import timeit
+import torch
+from model_state_codec import encode_model_state, decode_model_state
+from machine_learning_service import MLService
+
+
+def encode_legacy(model_state):
+    state_dict = {k: v.tolist() for k, v in model_state.items()}
+    return base64.b64encode(json.dumps(state_dict).encode('utf-8')).decode('utf-8')
+
+
+def benchmark(input_dim=258, hidden_dim=64, repeat=20):
+    model_state = MLService.ContentBasedNeuralNetwork(input_dim, hidden_dim, 1).get_state()
+    raw_bytes = sum(tensor.numel() * tensor.element_size() for tensor in model_state.values())
+
+    print(f"Model {input_dim}x{hidden_dim}x1, raw parameters: {raw_bytes} bytes")
+    print(f"{'codec':<8} {'size (bytes)':>14} {'x raw':>7} {'encode (ms)':>12} {'decode (ms)':>12}")
+    codecs = (
+        ("legacy", encode_legacy),
+        ("binary", encode_model_state),
+        ("fp16", lambda state: encode_model_state(state, "fp16")),
+        ("int8", lambda state: encode_model_state(state, "int8")),
+    )
+    for name, encode in codecs:
+        encoded = encode(model_state)
+        encode_time = timeit.timeit(lambda: encode(model_state), number=repeat) / repeat
+        decode_time = timeit.timeit(lambda: decode_model_state(encoded), number=repeat) / repeat
+        print(f"{name:<8} {len(encoded):>14} {len(encoded) / raw_bytes:>7.2f} {encode_time * 1000:>12.2f} {decode_time * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    torch.manual_seed(0)
+    benchmark(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,43 @@
+import base64
+import json
+import unittest
+import torch
+from model_state_codec import encode_model_state, decode_model_state, BINARY_PREFIX
+
+class TestModelStateCodec(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.model_state = {
+            "fc1.weight": torch.randn(64, 258),
+            "fc1.bias": torch.randn(64),
+            "fc2.weight": torch.randn(1, 64),
+            "fc2.bias": torch.randn(1),
+            "steps": torch.tensor(3, dtype=torch.int64)
+        }
+
+    def test_round_trip(self):
+        encoded = encode_model_state(self.model_state)
+        self.assertTrue(encoded.startswith(BINARY_PREFIX))
+
+        decoded = decode_model_state(encoded)
+
+        self.assertEqual(list(decoded.keys()), list(self.model_state.keys()))
+        for key, tensor in self.model_state.items():
+            self.assertEqual(decoded[key].dtype, tensor.dtype)
+            self.assertTrue(torch.equal(decoded[key], tensor))
+
+    def test_decodes_legacy_base64_json(self):
+        state_json = json.dumps({k: v.tolist() for k, v in self.model_state.items()})
+        legacy = base64.b64encode(state_json.encode('utf-8')).decode('utf-8')
+
+        decoded = decode_model_state(legacy)
+
+        self.assertTrue(torch.allclose(decoded["fc1.weight"], self.model_state["fc1.weight"]))
+
+    def test_binary_is_smaller_than_legacy(self):
+        state_json = json.dumps({k: v.tolist() for k, v in self.model_state.items()})
+        legacy = base64.b64encode(state_json.encode('utf-8')).decode('utf-8')
+        self.assertLess(len(encode_model_state(self.model_state)) * 3, len(legacy))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,20 @@
 # rdf_knowledge_graph.py
 import logging
-from SPARQLWrapper import SPARQLWrapper, JSON
 import json
-import base64
 import torch
 import os
 from dotenv import load_dotenv
 import csv
+import io
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait
 import pandas as pd
+from model_exchange import ModelExchange
+from http_transport import get_transport
+from aggregation import AGGREGATION_STRATEGY, ParameterLayout, aggregate_states
+from graph_cache import LocalGraphCache, CACHE_CONSTRUCT_QUERY
 
 load_dotenv()
 
@@ -22,15 +29,65 @@ logging.basicConfig(
 
 FUSEKI_SERVER_URL = os.getenv("FUSEKI_SERVER_URL")
 FUSEKI_DATABASE_NAME = os.getenv("FUSEKI_DATABASE_NAME")
+SONG_INSERT_CHUNK_SIZE = int(os.getenv("SONG_INSERT_CHUNK_SIZE", 500))
+SONG_PAGE_SIZE = int(os.getenv("SONG_PAGE_SIZE", 5000))
+SONG_COLUMN_TYPES = {"song_id": "int64", "title": "str", "genre": "str", "artist": "str", "tempo": "int64", "duration": "int64"}
+# Number of published rounds kept per model
+MODEL_STATE_RETENTION = int(os.getenv("MODEL_STATE_RETENTION", 3))
+# Seconds to wait for peer databases when fetching their models, and how many are queried at once
+PEER_FETCH_TIMEOUT = float(os.getenv("PEER_FETCH_TIMEOUT", 10))
+PEER_FETCH_WORKERS = int(os.getenv("PEER_FETCH_WORKERS", 8))
+# 'remote' queries Fuseki for everything, 'cache' answers song/fungus/learning group reads from an
+# in-process copy (writes still go to Fuseki), 'local' keeps the whole knowledge base in-process
+KNOWLEDGE_GRAPH_MODE = os.getenv("KNOWLEDGE_GRAPH_MODE", "remote")
+
+
+def sparql_literal(value):
+    """Returns value as a quoted SPARQL string literal with all special characters escaped."""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"')
+               .replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t'))
+    return f'"{escaped}"'
+
 
 class RDFKnowledgeGraph:
-    def __init__(self, mastodon_client, fuseki_url=FUSEKI_SERVER_URL, dataset=FUSEKI_DATABASE_NAME):
+    def __init__(self, mastodon_client, fuseki_url=FUSEKI_SERVER_URL, dataset=FUSEKI_DATABASE_NAME, transport=None,
+                 mode=KNOWLEDGE_GRAPH_MODE, load_songs=True):
         self.update_url = f"{fuseki_url}/{dataset}/update"
         self.query_url = f"{fuseki_url}/{dataset}/query"
         self.fuseki_url = fuseki_url + "/" + dataset
         self.mastodon_client = mastodon_client
-        self.sparql = SPARQLWrapper(self.fuseki_url)
-        self.songs_data = self.get_all_songs()
+        self.transport = transport if transport is not None else get_transport()
+        if mode not in ("remote", "cache", "local"):
+            raise ValueError(f"Unknown knowledge graph mode: {mode}")
+        self.mode = mode
+        self.local_graph = None
+        if mode == "cache":
+            self.local_graph = LocalGraphCache(loader=lambda: self.transport.sparql_construct(self.query_url, CACHE_CONSTRUCT_QUERY))
+        elif mode == "local":
+            self.local_graph = LocalGraphCache()
+        self.model_exchange = ModelExchange()
+        # Fetched peer models left out because their delta base could not be resolved
+        self.skipped_model_states = 0
+        # Model name -> last round this node published
+        self.model_rounds = {}
+        self.peer_executor = ThreadPoolExecutor(max_workers=PEER_FETCH_WORKERS, thread_name_prefix="peer-fetch")
+        # Without load_songs the catalog is set later, e.g. from a catalog snapshot (see load_catalog)
+        self.songs_data = self.get_all_songs() if load_songs else pd.DataFrame()
+
+    def _select(self, url, query, cacheable=False, result_format="json", timeout=None):
+        """Runs a SELECT query; cacheable queries are answered by the local graph in cache mode."""
+        if self.mode == "local" or (cacheable and self.mode == "cache"):
+            return self.local_graph.query(query, result_format)
+        if timeout is not None:
+            return self.transport.sparql_query(url, query, result_format, timeout=timeout)
+        return self.transport.sparql_query(url, query, result_format)
+
+    def _update(self, update, cacheable=True):
+        """Runs an update against Fuseki and, once it succeeded, against the local graph (write-through)."""
+        if self.mode != "local":
+            self.transport.sparql_update(self.update_url, update)
+        if self.mode == "local" or (cacheable and self.mode == "cache"):
+            self.local_graph.update(update)
 
     def fetch_all_songs(self):
         self.songs_data = self.get_all_songs()
@@ -52,9 +109,14 @@ class RDFKnowledgeGraph:
         return None
 
     def look_for_song_data_in_statuses_to_insert(self, messages):
+        """
+        Inserts songs announced in Mastodon statuses into the knowledge base.
+        Returns the inserted songs as a DataFrame, so they can be added to the MLService catalog.
+        """
         logging.info("Look for song data in mastodon statuses to insert")
+        inserted_songs = []
         if messages is None:
-            return
+            return pd.DataFrame(inserted_songs)
 
         song_id_counter = len(self.songs_data.index) + 1
         for message in messages:
@@ -69,8 +131,17 @@ class RDFKnowledgeGraph:
                      + str(tempo) + " "
                      + str(duration)
                     )
-                    self.insert_song_data(song_id_counter, title, genre, artist, int(tempo), int(duration))
+                    inserted_songs.append({
+                        "song_id": song_id_counter,
+                        "title": title,
+                        "genre": genre,
+                        "artist": artist,
+                        "tempo": int(tempo),
+                        "duration": int(duration)
+                    })
                     song_id_counter = song_id_counter + 1
+        self.insert_songs(inserted_songs)
+        return pd.DataFrame(inserted_songs)
 
     def extra_song_data_from_status_content(self, text):
         # Find the index of "song-data:"
@@ -94,133 +165,252 @@ class RDFKnowledgeGraph:
         else:
             return [None, None, None, None, None]
 
-    def save_model(self, model_name, model):
-        self.insert_model_state(model_name, model.get_state())
+    def save_model(self, model_name, model, sample_count=None):
+        self.insert_model_state(model_name, model.get_state(), sample_count=sample_count)
 
     def fetch_all_model_from_knowledge_base(self, link_to_model):
         return self.retrieve_all_model_states(link_to_model)
 
-    def insert_model_state(self, model_name, model_state):
+    def insert_model_state(self, model_name, model_state, round_number=None, sample_count=None):
         """
-        Inserts the model parameters into the Fuseki knowledge base using base64 encoding.
+        Publishes the model parameters as a new round of model_name, encoded with the binary model state codec
+        (quantized or delta-encoded according to MODEL_EXCHANGE_MODE).
+        Every round is its own ex:ModelState node tagged with round number and publication time; rounds older than
+        the last MODEL_STATE_RETENTION ones are deleted in the same update request, so the store does not grow.
+        sample_count (the number of training samples) is published with the state for FedAvg aggregation.
+        Returns the published round number; raises if the update failed, in which case no round was published.
         """
-        # Convert tensors to lists for serialization
-        state_dict = {k: v.tolist() for k, v in model_state.items()}
-        state_json = json.dumps(state_dict)
-        state_encoded = base64.b64encode(state_json.encode('utf-8')).decode('utf-8')
-        sparql = SPARQLWrapper(self.update_url)
+        if round_number is None:
+            round_number = self.latest_model_round(model_name) + 1
+        state_encoded = self.model_exchange.encode(model_state)
+        published_at = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        sample_count_triple = f"ex:sampleCount {int(sample_count)} ;" if sample_count is not None else ""
         sparql_insert_query = f'''
         PREFIX ex: <http://example.org/>
         PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
 
+        DELETE WHERE {{
+            ex:{model_name} ex:modelState ?unversionedState .
+        }} ;
         INSERT DATA {{
             ex:{model_name} a ex:ContentBasedModel ;
+                            ex:modelName "{model_name}" .
+            ex:{model_name}_round_{round_number} a ex:ModelState ;
+                            ex:ofModel ex:{model_name} ;
+                            ex:round {round_number} ;
+                            ex:publishedAt "{published_at}"^^xsd:dateTime ;
+                            {sample_count_triple}
                             ex:modelState "{state_encoded}" .
+        }} ;
+        DELETE {{
+            ?state ?p ?o .
+        }}
+        WHERE {{
+            ?state a ex:ModelState ;
+                   ex:ofModel ex:{model_name} ;
+                   ex:round ?round ;
+                   ?p ?o .
+            FILTER (?round <= {round_number - MODEL_STATE_RETENTION})
         }}
         '''
-        sparql.setQuery(sparql_insert_query)
-        sparql.setMethod('POST')
-        sparql.setReturnFormat(JSON)
-        sparql.setHTTPAuth('BASIC')
-        sparql.setCredentials("admin", "pw123")
         try:
-            sparql.query()
-            print(f"Model '{model_name}' inserted successfully.")
+            self._update(sparql_insert_query, cacheable=False)
         except Exception as e:
-            print(f"Error inserting model: {e}")
+            logging.error(f"[PUBLISH] Error inserting model '{model_name}' round {round_number}: {e}")
+            raise
+        self.model_rounds[model_name] = round_number
+        logging.info(f"[PUBLISH] Model '{model_name}' round {round_number} inserted successfully.")
+        return round_number
+
+    def latest_model_round(self, model_name):
+        """Returns the last round published for model_name (0 if none), looked up in the knowledge base once."""
+        if model_name not in self.model_rounds:
+            sparql_select_query = f'''
+            PREFIX ex: <http://example.org/>
+
+            SELECT (MAX(?round) AS ?latest) WHERE {{
+                ?state a ex:ModelState ;
+                       ex:ofModel ex:{model_name} ;
+                       ex:round ?round .
+            }}
+            '''
+            try:
+                bindings = self._select(self.query_url, sparql_select_query)["results"]["bindings"]
+                self.model_rounds[model_name] = int(bindings[0]["latest"]["value"]) if bindings and "latest" in bindings[0] else 0
+            except Exception as e:
+                logging.error(f"[PUBLISH] Error retrieving latest round of model '{model_name}': {e}")
+                return 0
+        return self.model_rounds[model_name]
 
     def insert_song_data(self, song_id, title, genre, artist, tempo, duration):
         """
         Inserts the individual song data into the Fuseki knowledge base.
         """
-        # Prepare the SPARQL query to insert the song data
-        sparql = SPARQLWrapper(self.update_url)
+        self.insert_songs([{"song_id": song_id, "title": title, "genre": genre, "artist": artist, "tempo": tempo, "duration": duration}])
+
+    def insert_songs(self, songs, chunk_size=SONG_INSERT_CHUNK_SIZE):
+        """
+        Inserts songs (an iterable of dicts with song_id, title, genre, artist, tempo and duration)
+        with one multi-song INSERT DATA request per chunk. The iterable is consumed lazily, so large
+        catalogs can be streamed. Returns the number of inserted songs.
+        """
+        start = time.perf_counter()
+        songs = iter(songs)
+        inserted = 0
+        requests = 0
+        while True:
+            chunk = list(islice(songs, chunk_size))
+            if not chunk:
+                break
+            requests += 1
+            if self.insert_song_chunk(chunk):
+                inserted += len(chunk)
+
+        duration = time.perf_counter() - start
+        if requests > 0:
+            logging.info(f"[INGEST] Inserted {inserted} songs with {requests} requests in {duration:.2f}s "
+                         f"({inserted / duration if duration > 0 else 0:.0f} songs/sec)")
+        return inserted
+
+    def insert_song_chunk(self, songs):
+        """
+        Inserts a list of songs with a single INSERT DATA request.
+        """
+        song_triples = "\n".join(
+            f'''
+            ex:song_{int(song["song_id"])} a ex:Song ;
+                               ex:songId {int(song["song_id"])} ;
+                               ex:title {sparql_literal(song["title"])} ;
+                               ex:genre {sparql_literal(song["genre"])} ;
+                               ex:artist {sparql_literal(song["artist"])} ;
+                               ex:tempo {int(song["tempo"])} ;
+                               ex:duration {int(song["duration"])} .'''
+            for song in songs
+        )
         sparql_insert_query = f'''
         PREFIX ex: <http://example.org/>
         PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
 
-        INSERT DATA {{
-            ex:song_{song_id} a ex:Song ;
-                               ex:songId {song_id} ;
-                               ex:title "{title}" ;
-                               ex:genre "{genre}" ;
-                               ex:artist "{artist}" ;
-                               ex:tempo {tempo} ;
-                               ex:duration {duration} .
+        INSERT DATA {{{song_triples}
         }}
         '''
 
-        sparql.setQuery(sparql_insert_query)
-        sparql.setMethod('POST')
-        sparql.setReturnFormat(JSON)
-        sparql.setHTTPAuth('BASIC')
-        sparql.setCredentials("admin", "pw123")
-
         try:
-            sparql.query()
-            print(f"Song '{title}' inserted successfully.")
+            self._update(sparql_insert_query)
+            logging.info(f"[INGEST] {len(songs)} songs inserted successfully.")
+            return True
         except Exception as e:
-            print(f"Error inserting song: {e}")
+            logging.error(f"[INGEST] Error inserting {len(songs)} songs: {e}")
+            return False
 
     def get_all_songs(self):
         """
-        Retrieves all songs and their data from the Fuseki knowledge base.
+        Retrieves all songs and their data from the Fuseki knowledge base, page by page (see iter_songs).
         """
-        # Prepare the SPARQL query to retrieve all song data
-        sparql = SPARQLWrapper(self.fuseki_url)
+        try:
+            pages = list(self.iter_songs())
+        except Exception as e:
+            print(f"Error retrieving song data: {e}")
+            return []
+
+        if not pages:
+            print("No songs found in the database.")
+            return pd.DataFrame()  # Return an empty DataFrame if no data is found
+        return pd.concat(pages, ignore_index=True)
+
+    def count_songs(self):
+        """Returns the number of songs in the knowledge base, or -1 if it cannot be queried."""
         sparql_select_query = '''
         PREFIX ex: <http://example.org/>
-        PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
 
-        SELECT ?song_id ?title ?genre ?artist ?tempo ?duration WHERE {
-            ?song a ex:Song ;
-                  ex:songId ?song_id ;
-                  ex:title ?title ;
-                  ex:genre ?genre ;
-                  ex:artist ?artist ;
-                  ex:tempo ?tempo ;
-                  ex:duration ?duration .
+        SELECT (COUNT(?song) AS ?count) WHERE {
+            ?song a ex:Song .
         }
         '''
+        try:
+            results = self._select(self.fuseki_url, sparql_select_query, cacheable=True)
+            return int(results["results"]["bindings"][0]["count"]["value"])
+        except Exception as e:
+            logging.error(f"[CATALOG] Error counting songs: {e}")
+            return -1
 
-        sparql.setQuery(sparql_select_query)
-        sparql.setReturnFormat(JSON)
-        sparql.setHTTPAuth('BASIC')
-        sparql.setCredentials("admin", "pw123")
+    def has_catalog_digest(self, source_digest):
+        """Returns whether the songs of the catalog source with this digest were ingested completely (see mark_catalog_digest)."""
+        sparql_select_query = f'''
+        PREFIX ex: <http://example.org/>
 
+        SELECT ?digest WHERE {{
+            ex:catalog ex:catalogDigest ?digest .
+            FILTER (?digest = {sparql_literal(source_digest)})
+        }}
+        '''
         try:
-            results = sparql.query().convert()
+            results = self._select(self.query_url, sparql_select_query)
+            return len(results["results"]["bindings"]) > 0
+        except Exception as e:
+            logging.error(f"[CATALOG] Error looking up the catalog digest: {e}")
+            return False
 
-            # Process the result
-            songs = []
-            for song_data in results["results"]["bindings"]:
-                song_info = {
-                    "song_id": song_data["song_id"]["value"],
-                    "title": song_data["title"]["value"],
-                    "genre": song_data["genre"]["value"],
-                    "artist": song_data["artist"]["value"],
-                    "tempo": int(song_data["tempo"]["value"]),
-                    "duration": int(song_data["duration"]["value"])
-                }
-                songs.append(song_info)
+    def mark_catalog_digest(self, source_digest):
+        """Records that the songs of the catalog source with this digest are in the knowledge base."""
+        sparql_update_query = f'''
+        PREFIX ex: <http://example.org/>
 
-            # Convert the list of dictionaries into a pandas DataFrame
-            if songs:
-                songs_df = pd.DataFrame(songs)
-                return songs_df
-            else:
-                print("No songs found in the database.")
-                return pd.DataFrame()  # Return an empty DataFrame if no data is found
+        DELETE WHERE {{
+            ex:catalog ex:catalogDigest ?digest .
+        }} ;
+        INSERT DATA {{
+            ex:catalog ex:catalogDigest {sparql_literal(source_digest)} .
+        }}
+        '''
+        try:
+            self._update(sparql_update_query, cacheable=False)
         except Exception as e:
-            print(f"Error retrieving song data: {e}")
-            return []
+            logging.error(f"[CATALOG] Error recording the catalog digest: {e}")
+
+    def iter_songs(self, page_size=SONG_PAGE_SIZE):
+        """
+        Yields the song catalog as DataFrames of at most page_size songs, ordered by song_id.
+        Pages are fetched with keyset pagination (song_id greater than the last one seen) and requested as CSV,
+        which is parsed straight into typed columns. Paging bounds the size of every response and the memory
+        held at once; it does not make the query cheaper: Fuseki still matches and sorts all remaining songs for
+        every page, so a full load costs about as much as OFFSET paging. Unlike OFFSET, keyset pages neither skip
+        nor repeat songs that are inserted while the catalog is being read.
+        """
+        last_song_id = None
+        while True:
+            after_last_page = f"FILTER (?song_id > {last_song_id})" if last_song_id is not None else ""
+            sparql_select_query = f'''
+            PREFIX ex: <http://example.org/>
+            PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+
+            SELECT ?song_id ?title ?genre ?artist ?tempo ?duration WHERE {{
+                ?song a ex:Song ;
+                      ex:songId ?song_id ;
+                      ex:title ?title ;
+                      ex:genre ?genre ;
+                      ex:artist ?artist ;
+                      ex:tempo ?tempo ;
+                      ex:duration ?duration .
+                {after_last_page}
+            }}
+            ORDER BY ?song_id
+            LIMIT {page_size}
+            '''
+            results = self._select(self.fuseki_url, sparql_select_query, cacheable=True, result_format="csv")
+            page = pd.read_csv(io.StringIO(results), dtype=SONG_COLUMN_TYPES, keep_default_na=False)
+            if page.empty:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            last_song_id = int(page["song_id"].iloc[-1])
 
     def insert_fungus_data(self, fungus_id, fungus_name, link_to_model):
         """
         Inserts the individual fungus data into the Fuseki knowledge base.
         """
         # Prepare the SPARQL query to insert the fungus data
-        sparql = SPARQLWrapper(self.update_url)
         sparql_insert_query = f'''
         PREFIX ex: <http://example.org/>
         PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
@@ -233,13 +423,8 @@ class RDFKnowledgeGraph:
         }}
         '''
 
-        sparql.setQuery(sparql_insert_query)
-        sparql.setMethod('POST')
-        sparql.setReturnFormat(JSON)
-        sparql.setCredentials("admin", "pw123")
-
         try:
-            sparql.query()
+            self._update(sparql_insert_query)
             print(f"Fungus with ID '{fungus_id}' inserted successfully.")
         except Exception as e:
             print(f"Error inserting fungus: {e}")
@@ -250,7 +435,6 @@ class RDFKnowledgeGraph:
         """
 
         # Prepare the SPARQL query to retrieve all fungus data
-        sparql = SPARQLWrapper(self.query_url)
         sparql_select_query = '''
                 PREFIX ex: <http://example.org/>
                 PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
@@ -263,13 +447,9 @@ class RDFKnowledgeGraph:
                 }
                 '''
 
-        sparql.setQuery(sparql_select_query)
-        sparql.setReturnFormat(JSON)
-        sparql.setCredentials("admin", "pw123")
-
         try:
 
-            results = sparql.query().convert()
+            results = self._select(self.query_url, sparql_select_query, cacheable=True)
 
             # Process the result
             fungi = []
@@ -290,87 +470,183 @@ class RDFKnowledgeGraph:
             print(f"Error retrieving fungus data: {e}")
             return []
 
-    def retrieve_all_model_states(self, link_to_model):
+    def retrieve_all_model_states(self, link_to_model, latest_only=True, since_round=None, timeout=PEER_FETCH_TIMEOUT):
         """
-        Retrieves all model parameters stored in the Fuseki server and decodes them.
+        Retrieves the model parameters stored in the Fuseki server(s) and decodes them.
+        link_to_model is one database link or a list of them, which are queried concurrently (see fetch_from_peers).
+        By default only the latest round of every model is returned; since_round restricts it to newer rounds.
         """
-        sparql = SPARQLWrapper(link_to_model)
-        sparql_select_query = '''
+        sparql_select_query = self._model_states_query(latest_only, since_round)
+        bindings = self.fetch_from_peers(link_to_model, sparql_select_query, timeout)
+        return self._decode_model_states(bindings, "model")
+
+    def fetch_from_peers(self, links, query, timeout=PEER_FETCH_TIMEOUT):
+        """
+        Runs a SELECT query against every database link in parallel and returns all result bindings that
+        arrived within timeout seconds. Slow or failing peers are logged and left out, so one of them
+        cannot stall the epoch.
+        """
+        links = [links] if isinstance(links, str) else list(dict.fromkeys(links))
+        futures = {self.peer_executor.submit(self._timed_select, link, query, timeout): link for link in links}
+        done, _ = wait(futures, timeout=timeout)
+
+        bindings = []
+        for future, link in futures.items():
+            if future not in done:
+                # Only drops a request that has not started yet; a running one ends at its own timeout
+                future.cancel()
+                logging.warning(f"[PEERS] {link}: no answer within {timeout:.1f}s, continuing without it")
+                continue
+            try:
+                results, duration = future.result()
+            except Exception as e:
+                logging.warning(f"[PEERS] {link}: request failed: {e}")
+                continue
+            peer_bindings = results["results"]["bindings"]
+            logging.info(f"[PEERS] {link}: {len(peer_bindings)} results in {duration * 1000:.0f}ms")
+            bindings.extend(peer_bindings)
+        return bindings
+
+    def probe_model_database(self, link, timeout=PEER_FETCH_TIMEOUT):
+        """
+        Measures how costly it is to work with the models in database link: the round-trip time of a trivial
+        query, and the number and encoded size of the latest model states (computed by Fuseki, not downloaded).
+        """
+        _, rtt = self._timed_select(link, "SELECT ?s WHERE { ?s ?p ?o } LIMIT 1", timeout)
+        query = f'''
         PREFIX ex: <http://example.org/>
-        PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
 
-        SELECT ?model ?modelState
-        WHERE {
-            ?model a ex:ContentBasedModel ;
+        SELECT (COUNT(?state) AS ?numModels) (SUM(STRLEN(STR(?modelState))) AS ?modelBytes)
+        WHERE {{
+            {{
+                SELECT ?model (MAX(?candidateRound) AS ?round) WHERE {{
+                    ?candidate a ex:ModelState ;
+                               ex:ofModel ?model ;
+                               ex:round ?candidateRound .
+                }}
+                GROUP BY ?model
+            }}
+            ?state a ex:ModelState ;
+                   ex:ofModel ?model ;
+                   ex:round ?round ;
                    ex:modelState ?modelState .
+        }}
+        '''
+        results = self._select(link, query, timeout=timeout)
+        binding = results["results"]["bindings"][0] if results["results"]["bindings"] else {}
+        return {
+            "rtt": rtt,
+            "num_models": int(binding["numModels"]["value"]) if "numModels" in binding else 0,
+            "model_bytes": int(binding["modelBytes"]["value"]) if "modelBytes" in binding else 0,
         }
+
+    def _timed_select(self, link, query, timeout):
+        start = time.perf_counter()
+        results = self._select(link, query, timeout=timeout)
+        return results, time.perf_counter() - start
+
+    def _model_states_query(self, latest_only=True, since_round=None, model_names=None):
+        """SELECT query for published model states, oldest round first (so delta-encoded states find their base)."""
+        round_filter = f"FILTER (?round > {int(since_round)})" if since_round is not None else ""
+        name_filter = ""
+        if model_names is not None:
+            name_filter = "FILTER (?modelName IN (%s))" % ', '.join(sparql_literal(name) for name in model_names)
+        latest_round = ""
+        if latest_only:
+            latest_round = f'''{{
+                SELECT ?model (MAX(?candidateRound) AS ?round) WHERE {{
+                    ?candidate a ex:ModelState ;
+                               ex:ofModel ?model ;
+                               ex:round ?candidateRound .
+                }}
+                GROUP BY ?model
+            }}'''
+        return f'''
+        PREFIX ex: <http://example.org/>
+
+        SELECT ?model ?modelName ?round ?sampleCount ?modelState
+        WHERE {{
+            {latest_round}
+            ?state a ex:ModelState ;
+                   ex:ofModel ?model ;
+                   ex:round ?round ;
+                   ex:modelState ?modelState .
+            ?model ex:modelName ?modelName .
+            OPTIONAL {{ ?state ex:sampleCount ?sampleCount . }}
+            {round_filter}
+            {name_filter}
+        }}
+        ORDER BY ?round
         '''
-        sparql.setQuery(sparql_select_query)
-        sparql.setReturnFormat(JSON)
-        sparql.setHTTPAuth('BASIC')
-        sparql.setCredentials("admin", "pw123")
-        try:
-            results = sparql.query().convert()
-            models = []
-            for result in results["results"]["bindings"]:
-                model = result["model"]["value"]
-                state_encoded = result["modelState"]["value"]
-                state_json = base64.b64decode(state_encoded).decode('utf-8')
-                state_dict = json.loads(state_json)
-                # Convert lists back to tensors
-                model_state = {k: torch.tensor(v) for k, v in state_dict.items()}
-                models.append({"model": model, "modelState": model_state})
-            return models
-        except Exception as e:
-            print(f"Error retrieving models: {e}")
-            return []
 
-    def aggregate_model_states(self, current_model_state, all_model_states, current_model_weight=0.5):
+    def _decode_model_states(self, bindings, model_key, undecodable=None):
+        """
+        Decodes model state bindings of one or more peers, oldest round first; duplicates are skipped.
+        Names of models whose state is a delta against a base this node never saw are added to undecodable.
+        """
+        models = []
+        seen = set()
+        for binding in sorted(bindings, key=lambda binding: int(binding['round']['value'])):
+            key = (binding[model_key]['value'], int(binding['round']['value']))
+            if key in seen:
+                continue
+            seen.add(key)
+            model_state = self.model_exchange.decode(binding['modelState']['value'])
+            if model_state is None:
+                logging.warning(f"[EXCHANGE] Cannot decode {key[0]} round {key[1]}: its delta base is unknown")
+                if undecodable is not None:
+                    undecodable.add(key[0])
+                continue
+            models.append({
+                'model': key[0],
+                'round': key[1],
+                'sampleCount': int(binding['sampleCount']['value']) if 'sampleCount' in binding else None,
+                'modelState': model_state
+            })
+        return models
+
+    def aggregate_model_states(self, current_model_state, all_model_states, current_model_weight=0.5,
+                               strategy=AGGREGATION_STRATEGY, current_sample_count=None):
         """
-        Aggregates model states from multiple nodes using a weighted averaging strategy.
-        The current model has a higher weight in the averaging process.
+        Aggregates model states from multiple nodes with the given strategy (see aggregation.py).
+        With the default 'weighted' strategy the current model has a higher weight in the averaging process.
         """
         if not all_model_states:
             print("No models available for aggregation.")
             return current_model_state
 
-        # Extract states and convert tensors to numpy arrays for averaging
-        state_keys = current_model_state.keys()
-        aggregated_state = {k: current_model_weight * current_model_state[k].numpy() for k in state_keys}
-        reference_shapes = {k: v.shape for k, v in current_model_state.items()}
-
-        # Add the other models with a lower weight
+        # Only models with exactly the same parameter shapes can be averaged (see FEATURE_ENCODING)
+        layout = ParameterLayout(current_model_state)
+        compatible_models = []
         for model in all_model_states:
-            for k in state_keys:
-                model_tensor = model["modelState"][k].numpy()
-                # Check if the shape matches the expected shape
-                if model_tensor.shape != reference_shapes[k]:
-                    print(f"Shape mismatch for key '{k}': expected {reference_shapes[k]}, got {model_tensor.shape}. Skipping this model.")
-                    continue  # Skip adding this model
-                aggregated_state[k] += (1 - current_model_weight) * model["modelState"][k].numpy() / len(all_model_states)
-
-        # Convert back to tensors
-        aggregated_state = {k: torch.tensor(v) for k, v in aggregated_state.items()}
-
-        print("Model states aggregated successfully with weighted averaging.")
+            if not layout.matches(model["modelState"]):
+                shapes = {k: tuple(v.shape) for k, v in model["modelState"].items()}
+                print(f"Shape mismatch: expected {layout.shapes}, got {shapes}. Skipping this model.")
+                continue
+            compatible_models.append(model)
+
+        if not compatible_models:
+            print("No compatible models available for aggregation.")
+            return current_model_state
+
+        start = time.perf_counter()
+        aggregated_state = aggregate_states(
+            current_model_state,
+            [model["modelState"] for model in compatible_models],
+            strategy=strategy,
+            current_model_weight=current_model_weight,
+            sample_counts=[current_sample_count] + [model.get("sampleCount") for model in compatible_models]
+        )
+        logging.info(f"[AGGREGATION] Aggregated {len(compatible_models) + 1} models with '{strategy}' "
+                     f"in {(time.perf_counter() - start) * 1000:.1f}ms")
         return aggregated_state
 
-    def insert_songs_from_csv(self, csv_file):
+    def insert_songs_from_csv(self, csv_file, chunk_size=SONG_INSERT_CHUNK_SIZE):
         """
-        Inserts song data from a CSV file into the knowledge base.
+        Streams song data from a CSV file into the knowledge base in chunks.
         """
         with open(csv_file, mode='r') as file:
-            csv_reader = csv.DictReader(file)
-            for row in csv_reader:
-                song_id = row['song_id']
-                title = row['title']
-                genre = row['genre']
-                artist = row['artist']
-                tempo = int(row['tempo'])
-                duration = int(row['duration'])
-
-                # Insert each song into the knowledge base
-                self.insert_song_data(song_id, title, genre, artist, tempo, duration)
+            return self.insert_songs(csv.DictReader(file), chunk_size)
 
     def extract_after_model_link(self, text):
         # Find the index of "model-link:"
@@ -422,7 +698,6 @@ class RDFKnowledgeGraph:
             model_name: first model name of this group
         """
         # Prepare the SPARQL query to insert the learning group data
-        sparql = SPARQLWrapper(self.update_url)
         sparql_insert_query = f'''
         PREFIX ex: <http://example.org/>
         PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
@@ -434,13 +709,8 @@ class RDFKnowledgeGraph:
         }}
         '''
 
-        sparql.setQuery(sparql_insert_query)
-        sparql.setMethod('POST')
-        sparql.setReturnFormat(JSON)
-        sparql.setCredentials("admin", "pw123")
-
         try:
-            sparql.query()
+            self._update(sparql_insert_query)
             print(f"Learning group with ID '{learning_group_id}' inserted successfully.")
         except Exception as e:
             print(f"Error inserting learning group: {e}")
@@ -456,28 +726,22 @@ class RDFKnowledgeGraph:
             new_learning_group_id: ID of the target learning group
         """
         # First, remove the model from the old group
-        sparql = SPARQLWrapper(self.update_url)
         remove_query = f'''
         PREFIX ex: <http://example.org/>
         
-        DELETE {{
+        DELETE DATA {{
             ex:learningGroup_{old_learning_group_id} ex:hasModel "{model_name}" .
         }}
         '''
-        sparql.setQuery(remove_query)
-        sparql.setMethod('POST')
-        sparql.setReturnFormat(JSON)
-        sparql.setCredentials("admin", "pw123")
 
         try:
-            sparql.query()
+            self._update(remove_query)
             print(f"Successfully removed {model_name} from group {old_learning_group_id}")
         except Exception as e:
             print(f"Error removing model from old group: {e}")
             return False
 
         # Then, add the model to the new group
-        sparql = SPARQLWrapper(self.update_url)
         add_query = f'''
         PREFIX ex: <http://example.org/>
         
@@ -485,13 +749,9 @@ class RDFKnowledgeGraph:
             ex:learningGroup_{new_learning_group_id} ex:hasModel "{model_name}" .
         }}
         '''
-        sparql.setQuery(add_query)
-        sparql.setMethod('POST')
-        sparql.setReturnFormat(JSON)
-        sparql.setCredentials("admin", "pw123")
 
         try:
-            sparql.query()
+            self._update(add_query)
             print(f"Successfully added {model_name} to group {new_learning_group_id}")
             return True
         except Exception as e:
@@ -508,7 +768,6 @@ class RDFKnowledgeGraph:
         Returns:
             List of model names in the learning group
         """
-        sparql = SPARQLWrapper(self.update_url)
         query = f'''
         PREFIX ex: <http://example.org/>
         
@@ -517,57 +776,55 @@ class RDFKnowledgeGraph:
             ex:learningGroup_{learning_group_id} ex:hasModel ?modelName .
         }}
         '''
-        sparql.setQuery(query)
-        sparql.setReturnFormat(JSON)
-        sparql.setCredentials("admin", "pw123")
 
         try:
-            results = sparql.query().convert()
-            model_names = [binding['modelName'].value for binding in results['results']['bindings']]
+            results = self._select(self.query_url, query, cacheable=True)
+            model_names = [binding['modelName']['value'] for binding in results['results']['bindings']]
             return model_names
         except Exception as e:
             print(f"Error fetching learning group: {e}")
             return []
 
-    def fetch_all_model_from_knowledge_base_with_name(self, link_to_database, learning_group_model_names):
+    def fetch_all_model_from_knowledge_base_with_name(self, link_to_database, learning_group_model_names, latest_only=True, since_round=None,
+                                                      timeout=PEER_FETCH_TIMEOUT):
         """
         Fetches models from the knowledge base based on their names.
 
         Args:
-            link_to_database: URL of the Fuseki database
+            link_to_database: URL of the Fuseki database, or a list of URLs that are queried concurrently
             learning_group_model_names: List of model names to fetch
+            latest_only: Only return the latest round of every model
+            since_round: Only return rounds newer than this one
+            timeout: Seconds to wait for the databases; models of slower ones are left out
 
         Returns:
             List of dictionaries containing model information
         """
-        sparql = SPARQLWrapper(link_to_database)
-        query = '''
-        PREFIX ex: <http://example.org/>
-        
-        SELECT ?modelName ?modelState
-        WHERE {
-            ?model a ex:ContentBasedModel ;
-                   ex:modelName ?modelName ;
-                   ex:modelState ?modelState .
-            FILTER (?modelName IN (%s))
-        }
-        ''' % ', '.join(f'"{name}"' for name in learning_group_model_names)
-
-        sparql.setQuery(query)
-        sparql.setReturnFormat(JSON)
-        sparql.setHTTPAuth('BASIC')
-        sparql.setCredentials("admin", "pw123")
-
-        try:
-            results = sparql.query().convert()
-            models = []
-            for binding in results['results']['bindings']:
-                model_info = {
-                    'name': binding['modelName'].value,
-                    'state': binding['modelState'].value
-                }
-                models.append(model_info)
-            return models
-        except Exception as e:
-            print(f"Error fetching models: {e}")
-            return []
+        query = self._model_states_query(latest_only, since_round, learning_group_model_names)
+        bindings = self.fetch_from_peers(link_to_database, query, timeout)
+        undecodable = set()
+        models = self._decode_model_states(bindings, "modelName", undecodable)
+        if undecodable and latest_only:
+            models.extend(self._fetch_missed_rounds(link_to_database, sorted(undecodable), timeout))
+        return models
+
+    def _fetch_missed_rounds(self, link_to_database, model_names, timeout=PEER_FETCH_TIMEOUT):
+        """
+        Resolves latest states that are deltas against rounds this node missed (peers publish at their own
+        cadence): all retained rounds of these models are decoded oldest first, so every round provides the base
+        of the next, and the latest one that decodes is returned per model. Models whose retained rounds do not
+        reach back to a known base or a keyframe stay out until their next keyframe.
+        """
+        query = self._model_states_query(latest_only=False, model_names=model_names)
+        bindings = self.fetch_from_peers(link_to_database, query, timeout)
+        latest = {}
+        for model in self._decode_model_states(bindings, "modelName"):
+            latest[model['model']] = model
+        for model_name in model_names:
+            if model_name in latest:
+                logging.info(f"[EXCHANGE] Resolved {model_name} round {latest[model_name]['round']} from its retained rounds")
+            else:
+                self.skipped_model_states += 1
+                logging.warning(f"[EXCHANGE] Leaving out {model_name} until its next keyframe "
+                                f"({self.skipped_model_states} models left out so far)")
+        return list(latest.values())
@@ -1,39 +1,93 @@
 import unittest
 from unittest.mock import MagicMock, patch
-from rdf_knowledge_graph import RDFKnowledgeGraph
+from rdf_knowledge_graph import RDFKnowledgeGraph, MODEL_STATE_RETENTION
+from model_exchange import ModelExchange
 import pandas as pd
+import time
+import torch
 
 class TestRDFKnowledgeGraph(unittest.TestCase):
     def setUp(self):
         self.mock_mastodon_client = MagicMock()
-        self.rdf_kg = RDFKnowledgeGraph(self.mock_mastodon_client)
-
-    @patch('rdf_knowledge_graph.SPARQLWrapper')
-    def test_get_all_songs(self, MockSPARQLWrapper):
-        mock_sparql = MockSPARQLWrapper.return_value
-        mock_sparql.query.return_value.convert.return_value = {
-            "results": {
-                "bindings": [
-                    {"song_id": {"value": "1"}, "title": {"value": "Test Song"}, "genre": {"value": "Rock"},
-                     "artist": {"value": "Test Artist"}, "tempo": {"value": "120"}, "duration": {"value": "300"}}
-                ]
-            }
-        }
+        self.mock_transport = MagicMock()
+        self.rdf_kg = RDFKnowledgeGraph(self.mock_mastodon_client, transport=self.mock_transport)
+
+    def test_get_all_songs(self):
+        self.mock_transport.sparql_query.return_value = (
+            "song_id,title,genre,artist,tempo,duration\r\n"
+            "1,Test Song,Rock,Test Artist,120,300\r\n"
+        )
 
         songs_df = self.rdf_kg.get_all_songs()
 
         self.assertIsInstance(songs_df, pd.DataFrame)
         self.assertEqual(len(songs_df), 1)
         self.assertEqual(songs_df.iloc[0]['title'], 'Test Song')
+        self.assertEqual(songs_df['tempo'].dtype, 'int64')
+
+    def test_iter_songs_pages_by_song_id(self):
+        header = "song_id,title,genre,artist,tempo,duration\r\n"
+        self.mock_transport.sparql_query.reset_mock()
+        self.mock_transport.sparql_query.side_effect = [
+            header + "1,A,Rock,X,120,300\r\n2,NA,Pop,Y,100,200\r\n",
+            header + "3,C,Jazz,Z,90,250\r\n",
+        ]
+
+        pages = list(self.rdf_kg.iter_songs(page_size=2))
 
-    @patch('rdf_knowledge_graph.SPARQLWrapper')
-    def test_insert_song_data(self, MockSPARQLWrapper):
-        mock_sparql = MockSPARQLWrapper.return_value
+        self.assertEqual([len(page) for page in pages], [2, 1])
+        self.assertEqual(pages[0].iloc[1]['title'], 'NA')
+        second_query = self.mock_transport.sparql_query.call_args_list[1][0][1]
+        self.assertIn("FILTER (?song_id > 2)", second_query)
+        self.assertIn("LIMIT 2", second_query)
+        self.assertEqual(self.mock_transport.sparql_query.call_args_list[1][0][2], "csv")
 
+    def test_insert_song_data(self):
         self.rdf_kg.insert_song_data(1, "Test Song", "Rock", "Test Artist", 120, 300)
 
-        mock_sparql.setQuery.assert_called_once()
-        mock_sparql.query.assert_called_once()
+        self.mock_transport.sparql_update.assert_called_once()
+        self.assertEqual(self.mock_transport.sparql_update.call_args[0][0], self.rdf_kg.update_url)
+
+    def test_insert_songs_in_chunks(self):
+        songs = [{"song_id": i, "title": f'Song "{i}"', "genre": "Rock", "artist": "A\\B", "tempo": "120", "duration": 300}
+                 for i in range(1, 6)]
+
+        inserted = self.rdf_kg.insert_songs(songs, chunk_size=2)
+
+        self.assertEqual(inserted, 5)
+        self.assertEqual(self.mock_transport.sparql_update.call_count, 3)
+        first_query = self.mock_transport.sparql_update.call_args_list[0][0][1]
+        self.assertIn('ex:song_1 a ex:Song', first_query)
+        self.assertIn('ex:song_2 a ex:Song', first_query)
+        self.assertIn('ex:title "Song \\"1\\""', first_query)
+        self.assertIn('ex:artist "A\\\\B"', first_query)
+
+    def test_fetch_from_peers_returns_partial_results_by_deadline(self):
+        encoded = self.rdf_kg.model_exchange.encode({"w": torch.ones(2)})
+        def sparql_query(url, query, result_format="json", timeout=None):
+            if "slow" in url:
+                time.sleep(1)
+            if "broken" in url:
+                raise ConnectionError("refused")
+            return {"results": {"bindings": [{"modelName": {"value": url}, "round": {"value": "1"}, "modelState": {"value": encoded}}]}}
+        self.mock_transport.sparql_query.side_effect = sparql_query
+
+        start = time.perf_counter()
+        models = self.rdf_kg.fetch_all_model_from_knowledge_base_with_name(
+            ["http://fast-a/query", "http://slow/query", "http://broken/query", "http://fast-b/query"], ["model-0"], timeout=0.3)
+
+        self.assertLess(time.perf_counter() - start, 0.9)
+        self.assertEqual(sorted(m["model"] for m in models), ["http://fast-a/query", "http://fast-b/query"])
+
+    def test_fetch_current_learning_group(self):
+        self.mock_transport.sparql_query.return_value = {
+            "results": {"bindings": [{"modelName": {"value": "model-0"}}, {"modelName": {"value": "model-1"}}]}
+        }
+
+        model_names = self.rdf_kg.fetch_current_learning_group("group")
+
+        self.assertEqual(model_names, ["model-0", "model-1"])
+        self.assertEqual(self.mock_transport.sparql_query.call_args[0][0], self.rdf_kg.query_url)
 
     def test_extra_song_data_from_status_content(self):
         message = "song-data: [\"Test Song\", \"Rock\", \"Test Artist\", 120, 300]"
@@ -48,5 +102,172 @@ class TestRDFKnowledgeGraph(unittest.TestCase):
         invalid_json = '{key: value}'
         self.assertFalse(self.rdf_kg.is_json(invalid_json))
 
+    def test_aggregate_model_states_skips_incompatible_models(self):
+        current = {"w": torch.zeros(2, 3), "b": torch.zeros(2)}
+        compatible = {"modelState": {"w": torch.ones(2, 3), "b": torch.ones(2)}}
+        incompatible = {"modelState": {"w": torch.ones(2, 4), "b": torch.ones(2)}}
+
+        aggregated = self.rdf_kg.aggregate_model_states(current, [compatible, incompatible])
+
+        self.assertTrue(torch.allclose(aggregated["w"], torch.full((2, 3), 0.5)))
+        self.assertTrue(torch.allclose(aggregated["b"], torch.full((2,), 0.5)))
+
+
+class TestRDFKnowledgeGraphLocal(unittest.TestCase):
+    """Runs against the in-process graph, no Fuseki needed."""
+
+    def setUp(self):
+        self.transport = MagicMock()
+        self.rdf_kg = RDFKnowledgeGraph(MagicMock(), transport=self.transport, mode="local")
+
+    def test_songs_round_trip(self):
+        self.rdf_kg.insert_songs([
+            {"song_id": 1, "title": 'Say "Hi"', "genre": "Rock", "artist": "A", "tempo": 120, "duration": 300},
+            {"song_id": 2, "title": "Blue", "genre": "Jazz", "artist": "B", "tempo": 90, "duration": 200},
+        ])
+
+        songs_df = self.rdf_kg.get_all_songs().sort_values("song_id")
+
+        self.assertEqual(songs_df["title"].tolist(), ['Say "Hi"', "Blue"])
+        self.assertEqual(songs_df["tempo"].tolist(), [120, 90])
+        self.assertEqual(self.rdf_kg.count_songs(), 2)
+        self.transport.sparql_update.assert_not_called()
+
+    def test_iter_songs_in_local_graph(self):
+        self.rdf_kg.insert_songs([{"song_id": i, "title": f"Song {i}", "genre": "Rock", "artist": "A", "tempo": 100, "duration": 200}
+                                  for i in range(1, 6)])
+
+        pages = list(self.rdf_kg.iter_songs(page_size=2))
+
+        self.assertEqual([page["song_id"].tolist() for page in pages], [[1, 2], [3, 4], [5]])
+
+    def test_learning_group_round_trip(self):
+        self.rdf_kg.insert_learning_group("g1", "model-0")
+        self.rdf_kg.remove_from_old_learning_group_and_add_to_new("model-0", "g1", "g2")
+
+        self.assertEqual(self.rdf_kg.fetch_current_learning_group("g1"), [])
+        self.assertEqual(self.rdf_kg.fetch_current_learning_group("g2"), ["model-0"])
+
+    def test_model_state_round_trip(self):
+        state = {"w": torch.arange(6, dtype=torch.float32).reshape(2, 3)}
+        self.rdf_kg.insert_model_state("model-0", state)
+
+        models = self.rdf_kg.fetch_all_model_from_knowledge_base_with_name(self.rdf_kg.query_url, ["model-0"])
+
+        self.assertEqual(len(models), 1)
+        self.assertTrue(torch.equal(models[0]["modelState"]["w"], state["w"]))
+
+    def test_model_rounds_are_versioned_and_pruned(self):
+        for i in range(5):
+            self.rdf_kg.insert_model_state("model-0", {"w": torch.full((2,), float(i))})
+        self.rdf_kg.insert_model_state("model-1", {"w": torch.zeros(2)})
+
+        latest = self.rdf_kg.fetch_all_model_from_knowledge_base_with_name(self.rdf_kg.query_url, ["model-0", "model-1"])
+        recent = self.rdf_kg.retrieve_all_model_states(self.rdf_kg.query_url, latest_only=False, since_round=3)
+        kept = self.rdf_kg.retrieve_all_model_states(self.rdf_kg.query_url, latest_only=False)
+
+        self.assertEqual(sorted((m["model"], m["round"]) for m in latest), [("model-0", 5), ("model-1", 1)])
+        self.assertTrue(torch.equal(next(m for m in latest if m["model"] == "model-0")["modelState"]["w"], torch.full((2,), 4.0)))
+        self.assertEqual([m["round"] for m in recent], [4, 5])
+        self.assertEqual(sorted(m["round"] for m in kept if m["model"].endswith("model-0")), [3, 4, 5])
+
+    def test_sample_count_is_published_with_the_state(self):
+        self.rdf_kg.insert_model_state("model-0", {"w": torch.zeros(2)}, sample_count=42)
+        self.rdf_kg.insert_model_state("model-1", {"w": torch.zeros(2)})
+
+        models = self.rdf_kg.retrieve_all_model_states(self.rdf_kg.query_url)
+
+        self.assertEqual(sorted((m["model"].rsplit("/", 1)[-1], m["sampleCount"]) for m in models), [("model-0", 42), ("model-1", None)])
+
+    def test_latest_round_is_continued_after_restart(self):
+        self.rdf_kg.insert_model_state("model-0", {"w": torch.zeros(2)})
+        self.rdf_kg.insert_model_state("model-0", {"w": torch.zeros(2)})
+        self.rdf_kg.model_rounds.clear()
+
+        self.assertEqual(self.rdf_kg.insert_model_state("model-0", {"w": torch.zeros(2)}), 3)
+
+    def publish_delta_rounds(self, sender, model_name, rounds):
+        receiver = self.rdf_kg.model_exchange
+        self.rdf_kg.model_exchange = sender
+        for i in range(rounds):
+            self.rdf_kg.insert_model_state(model_name, {"w": torch.full((4,), float(i))})
+        self.rdf_kg.model_exchange = receiver
+
+    def test_missed_delta_round_is_resolved_from_retained_rounds(self):
+        sender = ModelExchange(mode="delta-fp16", keyframe_interval=10)
+        self.publish_delta_rounds(sender, "model-1", 1)
+        self.rdf_kg.fetch_all_model_from_knowledge_base_with_name(self.rdf_kg.query_url, ["model-1"])
+        # The peer publishes twice before this node fetches again, so round 3 is a delta against unseen round 2
+        self.publish_delta_rounds(sender, "model-1", 2)
+
+        models = self.rdf_kg.fetch_all_model_from_knowledge_base_with_name(self.rdf_kg.query_url, ["model-1"])
+
+        self.assertEqual([(m["model"], m["round"]) for m in models], [("model-1", 3)])
+        self.assertTrue(torch.equal(models[0]["modelState"]["w"], torch.full((4,), 1.0)))
+        self.assertEqual(self.rdf_kg.skipped_model_states, 0)
+
+    def test_missed_delta_round_without_retained_base_is_counted(self):
+        sender = ModelExchange(mode="delta-fp16", keyframe_interval=10)
+        # Round 1, the keyframe, is pruned by the retention of 3 rounds
+        self.publish_delta_rounds(sender, "model-1", MODEL_STATE_RETENTION + 1)
+        self.rdf_kg.insert_model_state("model-2", {"w": torch.full((4,), -1.0)})
+
+        models = self.rdf_kg.fetch_all_model_from_knowledge_base_with_name(self.rdf_kg.query_url, ["model-1", "model-2"])
+
+        self.assertEqual([m["model"] for m in models], ["model-2"])
+        self.assertEqual(self.rdf_kg.skipped_model_states, 1)
+
+    def test_failed_publish_raises_and_keeps_the_round(self):
+        self.rdf_kg.insert_model_state("model-0", {"w": torch.zeros(2)})
+
+        with patch.object(self.rdf_kg, "_update", side_effect=RuntimeError("unreachable")):
+            with self.assertRaises(RuntimeError):
+                self.rdf_kg.insert_model_state("model-0", {"w": torch.ones(2)})
+
+        self.assertEqual(self.rdf_kg.latest_model_round("model-0"), 1)
+        self.assertEqual(self.rdf_kg.insert_model_state("model-0", {"w": torch.ones(2)}), 2)
+
+
+    def test_probe_model_database(self):
+        self.rdf_kg.insert_model_state("model-0", {"w": torch.zeros(4)})
+        self.rdf_kg.insert_model_state("model-0", {"w": torch.zeros(4)})
+        self.rdf_kg.insert_model_state("model-1", {"w": torch.zeros(4)})
+
+        probe = self.rdf_kg.probe_model_database(self.rdf_kg.query_url)
+
+        self.assertEqual(probe["num_models"], 2)
+        self.assertGreater(probe["model_bytes"], 0)
+        self.assertGreaterEqual(probe["rtt"], 0)
+
+class TestRDFKnowledgeGraphCache(unittest.TestCase):
+    def setUp(self):
+        self.transport = MagicMock()
+        self.transport.sparql_construct.return_value = (
+            '<http://example.org/fungus_1> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://example.org/Fungus> .\n'
+            '<http://example.org/fungus_1> <http://example.org/fungusId> "1"^^<http://www.w3.org/2001/XMLSchema#integer> .\n'
+            '<http://example.org/fungus_1> <http://example.org/fungusName> "Puff Sage" .\n'
+            '<http://example.org/fungus_1> <http://example.org/linkToModel> "http://fuseki:3030/db/query" .\n'
+        )
+        self.rdf_kg = RDFKnowledgeGraph(MagicMock(), transport=self.transport, mode="cache")
+
+    def test_reads_are_answered_locally_and_writes_go_through(self):
+        self.rdf_kg.insert_fungus_data(2, "Spore Seer", "http://fuseki:3031/db/query")
+
+        fungi = self.rdf_kg.get_all_fungi_data()
+
+        self.assertEqual(sorted(f["fungus_name"] for f in fungi), ["Puff Sage", "Spore Seer"])
+        self.transport.sparql_update.assert_called_once()
+        self.transport.sparql_query.assert_not_called()
+        self.transport.sparql_construct.assert_called_once()
+
+    def test_model_states_are_not_cached(self):
+        self.transport.sparql_query.return_value = {"results": {"bindings": []}}
+
+        self.rdf_kg.insert_model_state("model-0", {"w": torch.zeros(2)})
+        self.rdf_kg.retrieve_all_model_states("http://fuseki:3031/db/query")
+
+        self.assertEqual(self.transport.sparql_query.call_args[0][0], "http://fuseki:3031/db/query")
+        self.assertEqual(len(self.rdf_kg.local_graph.graph), 4)
+
 if __name__ == '__main__':
     unittest.main()
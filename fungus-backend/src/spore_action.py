@@ -3,8 +3,15 @@
 # - JOIN_GROUP
 # - ACCEPT_JOIN
 
+import json
+
 class SporeAction:
-  def __init__(self, spore_type, args, actor):
+  def __init__(self, spore_type, args, actor, id=None):
     self.spore_type = spore_type
     self.args = args
     self.actor = actor
+    # Id assigned by the receiving AP backend, None for own actions
+    self.id = id
+
+  def dedup_key(self):
+    return (self.id, self.actor, self.spore_type, json.dumps(self.args, sort_keys=True))
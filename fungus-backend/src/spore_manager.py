@@ -1,13 +1,55 @@
 # spore_manager.py
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
 from spore_action import SporeAction
 
+load_dotenv()
+
+# Seconds a processed spore action is remembered, and how many are remembered at most
+SPORE_SEEN_TTL = float(os.getenv("SPORE_SEEN_TTL", 3600))
+SPORE_SEEN_CACHE_SIZE = int(os.getenv("SPORE_SEEN_CACHE_SIZE", 10000))
+
+class SeenCache:
+    """Bounded set of keys that forgets keys after ttl seconds, and the oldest ones when full."""
+
+    def __init__(self, ttl=SPORE_SEEN_TTL, max_size=SPORE_SEEN_CACHE_SIZE, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.seen = OrderedDict()
+
+    def add(self, key):
+        """Remembers key; returns whether it was unseen."""
+        now = self.clock()
+        while self.seen and (next(iter(self.seen.values())) <= now - self.ttl or len(self.seen) >= self.max_size):
+            self.seen.popitem(last=False)
+        if key in self.seen:
+            return False
+        self.seen[key] = now
+        return True
+
+    def __len__(self):
+        return len(self.seen)
+
 class SporeManager:
-    def __init__(self, mastodon_client):
+    def __init__(self, mastodon_client, seen_cache=None):
         self.mastodon_client = mastodon_client
         self.spore_actions = []
+        # Id of the last spore action fetched from the AP backend, and the backend epoch it belongs to
+        self.cursor = None
+        self.cursor_epoch = None
+        self.seen_cache = seen_cache if seen_cache is not None else SeenCache()
 
     def fetch_spore_actions(self):
-        self.spore_actions = self.mastodon_client.fetch_latest_spore_actions()
+        """Fetches the spore actions received since the previous fetch; get_spore_actions returns the unseen ones."""
+        result = self.mastodon_client.fetch_latest_spore_actions(since_id=self.cursor, epoch=self.cursor_epoch)
+        if result is None:
+            self.spore_actions = []
+            return
+        spore_actions, self.cursor, self.cursor_epoch = result
+        self.spore_actions = [spore_action for spore_action in spore_actions if self.seen_cache.add(spore_action.dedup_key())]
 
     def get_spore_actions(self):
         return self.spore_actions
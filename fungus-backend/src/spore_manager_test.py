@@ -0,0 +1,93 @@
+import unittest
+from unittest.mock import MagicMock
+from spore_action import SporeAction
+from spore_manager import SeenCache, SporeManager
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestSeenCache(unittest.TestCase):
+    def test_forgets_keys_after_ttl(self):
+        clock = FakeClock()
+        cache = SeenCache(ttl=10, max_size=100, clock=clock)
+
+        self.assertTrue(cache.add("a"))
+        self.assertFalse(cache.add("a"))
+        clock.now = 11
+        self.assertTrue(cache.add("a"))
+
+    def test_is_bounded(self):
+        cache = SeenCache(ttl=10, max_size=2, clock=FakeClock())
+        for key in ["a", "b", "c"]:
+            cache.add(key)
+
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.add("a"))
+
+class TestSporeManager(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.manager = SporeManager(self.client)
+
+    def join(self, id, group="group-1"):
+        return SporeAction("JOIN_GROUP", ["http://peer:3030/db/query", group], "fungus-node-1", id)
+
+    def cursors(self):
+        return [(call.kwargs["since_id"], call.kwargs["epoch"]) for call in self.client.fetch_latest_spore_actions.call_args_list]
+
+    def test_polls_from_the_last_id(self):
+        self.client.fetch_latest_spore_actions.return_value = ([self.join(1), self.join(2, "group-2")], 2, "e1")
+        self.manager.fetch_spore_actions()
+        self.client.fetch_latest_spore_actions.return_value = ([], 2, "e1")
+        self.manager.fetch_spore_actions()
+
+        self.assertEqual(self.cursors(), [(None, None), (2, "e1")])
+        self.assertEqual(self.manager.get_spore_actions(), [])
+        self.assertEqual(self.manager.cursor, 2)
+
+    def test_cursor_moves_past_malformed_actions(self):
+        # Actions 2 and 3 could not be parsed, the backend's last_id still covers them
+        self.client.fetch_latest_spore_actions.return_value = ([self.join(1)], 3, "e1")
+        self.manager.fetch_spore_actions()
+        self.manager.fetch_spore_actions()
+
+        self.assertEqual(self.cursors()[1], (3, "e1"))
+
+    def test_cursor_follows_a_restarted_backend(self):
+        self.client.fetch_latest_spore_actions.return_value = ([self.join(40)], 40, "e1")
+        self.manager.fetch_spore_actions()
+        # The restarted backend read its log from the start, since the epoch differed
+        restarted = self.join(1, "group-2")
+        self.client.fetch_latest_spore_actions.return_value = ([restarted], 1, "e2")
+        self.manager.fetch_spore_actions()
+        self.manager.fetch_spore_actions()
+
+        self.assertEqual(self.cursors(), [(None, None), (40, "e1"), (1, "e2")])
+        self.assertEqual(self.manager.get_spore_actions(), [])
+        self.assertEqual(self.manager.seen_cache.add(restarted.dedup_key()), False)
+
+    def test_returns_only_unseen_actions(self):
+        first, second = self.join(1), self.join(2, "group-2")
+        self.client.fetch_latest_spore_actions.return_value = ([first], 1, "e1")
+        self.manager.fetch_spore_actions()
+        # e.g. the AP backend was polled with an older cursor again
+        self.client.fetch_latest_spore_actions.return_value = ([self.join(1), second], 2, "e1")
+        self.manager.fetch_spore_actions()
+
+        self.assertEqual(self.manager.get_spore_actions(), [second])
+
+    def test_failed_fetch_keeps_the_cursor(self):
+        self.client.fetch_latest_spore_actions.return_value = ([self.join(5)], 5, "e1")
+        self.manager.fetch_spore_actions()
+        self.client.fetch_latest_spore_actions.return_value = None
+        self.manager.fetch_spore_actions()
+
+        self.assertEqual(self.manager.get_spore_actions(), [])
+        self.assertEqual((self.manager.cursor, self.manager.cursor_epoch), (5, "e1"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+# status_outbox.py
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# File the unsent items are kept in, so they survive a restart
+STATUS_OUTBOX_FILE = os.getenv("STATUS_OUTBOX_FILE", "status_outbox.json")
+# Queued items at most; when full, the oldest item is dropped
+STATUS_OUTBOX_SIZE = int(os.getenv("STATUS_OUTBOX_SIZE", 200))
+# Status texts joined into one post at most
+STATUS_OUTBOX_BATCH_SIZE = int(os.getenv("STATUS_OUTBOX_BATCH_SIZE", 10))
+# Seconds the sender waits for more statuses before posting a batch
+STATUS_OUTBOX_LINGER = float(os.getenv("STATUS_OUTBOX_LINGER", 0.5))
+# Retry delay doubles after every failed attempt, up to the maximum
+STATUS_OUTBOX_BACKOFF = float(os.getenv("STATUS_OUTBOX_BACKOFF", 1))
+STATUS_OUTBOX_MAX_BACKOFF = float(os.getenv("STATUS_OUTBOX_MAX_BACKOFF", 300))
+
+STATUS = "status"
+SPORE = "spore"
+
+
+class StatusOutbox:
+    """
+    Posts statuses and spore actions from a background thread, so callers never wait for the ActivityPub backend.
+
+    sender(kind, text) sends one item and returns whether it succeeded. Consecutive status texts are joined
+    into one post (at most batch_size), a text equal to one still queued is coalesced into it, and spore
+    actions are always sent one by one. Failed sends are retried with exponential backoff. The queue holds
+    at most max_size items and drops the oldest one when full; unsent statuses are written to path and
+    queued again on the next start. Spore actions are not kept across restarts, since they refer to the
+    learning group of the previous process.
+    """
+
+    def __init__(self, sender, path=STATUS_OUTBOX_FILE, max_size=STATUS_OUTBOX_SIZE, batch_size=STATUS_OUTBOX_BATCH_SIZE,
+                 linger=STATUS_OUTBOX_LINGER, backoff=STATUS_OUTBOX_BACKOFF, max_backoff=STATUS_OUTBOX_MAX_BACKOFF):
+        self.sender = sender
+        self.path = path
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.linger = linger
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.queue = deque()
+        self.in_flight = []
+        self.stats = {"queued": 0, "sent": 0, "coalesced": 0, "dropped": 0, "failures": 0}
+        self._condition = threading.Condition()
+        self._save_lock = threading.Lock()
+        self._stopping = False
+        self._dirty = False
+        self._thread = None
+        self._load()
+
+    def put(self, kind, text):
+        """Queues an item and returns immediately."""
+        with self._condition:
+            if any(item == [kind, text] for item in self.queue):
+                self.stats["coalesced"] += 1
+                return
+            if len(self.queue) >= self.max_size:
+                dropped_kind, dropped_text = self.queue.popleft()
+                self.stats["dropped"] += 1
+                logging.warning(f"[OUTBOX] Queue full, dropped {dropped_kind}: {dropped_text}")
+            self.queue.append([kind, text])
+            self.stats["queued"] += 1
+            self._dirty = True
+            self._condition.notify_all()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="status-outbox", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        """Stops the sender after its current attempt and writes the unsent items to disk."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._save()
+
+    def flush(self, timeout=None):
+        """Waits until every queued item was sent; returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self.queue or self.in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def pending(self):
+        with self._condition:
+            return len(self.queue) + len(self.in_flight)
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self._condition:
+                while not self.queue and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                # Give the caller a moment to queue more statuses of the same stage
+                if self.linger > 0 and self.queue[0][0] == STATUS and len(self.queue) < self.batch_size:
+                    self._condition.wait(self.linger)
+                    if self._stopping:
+                        return
+                self.in_flight = self._take_batch()
+                kind, text = self.in_flight[0][0], "\n".join(item_text for _, item_text in self.in_flight)
+            self._save_if_dirty()
+
+            try:
+                sent = self.sender(kind, text)
+            except Exception as e:
+                logging.error(f"[OUTBOX] Sending {kind} failed: {e}")
+                sent = False
+
+            with self._condition:
+                if sent:
+                    self.stats["sent"] += len(self.in_flight)
+                    failures = 0
+                else:
+                    self.stats["failures"] += 1
+                    failures += 1
+                    self._requeue(self.in_flight)
+                self.in_flight = []
+                self._dirty = True
+                self._condition.notify_all()
+                if not sent:
+                    delay = min(self.backoff * 2 ** (failures - 1), self.max_backoff)
+                    logging.warning(f"[OUTBOX] Retrying in {delay:.1f}s ({len(self.queue)} items pending)")
+                    self._condition.wait_for(lambda: self._stopping, delay)
+            self._save_if_dirty()
+
+    def _take_batch(self):
+        batch = [self.queue.popleft()]
+        if batch[0][0] == STATUS:
+            while self.queue and self.queue[0][0] == STATUS and len(batch) < self.batch_size:
+                batch.append(self.queue.popleft())
+        return batch
+
+    def _requeue(self, batch):
+        """Puts a failed batch back in front; items that no longer fit are dropped, being the oldest."""
+        space = self.max_size - len(self.queue)
+        keep = batch[-space:] if space > 0 else []
+        self.stats["dropped"] += len(batch) - len(keep)
+        self.queue.extendleft(reversed(keep))
+
+    def _save_if_dirty(self):
+        with self._condition:
+            if not self._dirty:
+                return
+            self._dirty = False
+        self._save()
+
+    def _save(self):
+        if self.path is None:
+            return
+        # stop() may save while a sender thread that did not stop in time is still saving
+        with self._save_lock:
+            with self._condition:
+                items = [item for item in list(self.in_flight) + list(self.queue) if item[0] == STATUS]
+            try:
+                staging = self.path + ".tmp"
+                with open(staging, 'w') as file:
+                    json.dump(items, file)
+                os.replace(staging, self.path)
+            except OSError as e:
+                logging.warning(f"[OUTBOX] Could not save unsent items to {self.path}: {e}")
+
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as file:
+                items = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"[OUTBOX] Could not load unsent items from {self.path}: {e}")
+            return
+        # Files of older versions may still hold spore actions
+        statuses = [[kind, text] for kind, text in items if kind == STATUS]
+        self.queue.extend(statuses[-self.max_size:])
+        if items:
+            logging.info(f"[OUTBOX] Loaded {len(self.queue)} unsent items")
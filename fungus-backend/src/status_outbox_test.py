@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from status_outbox import StatusOutbox, STATUS, SPORE
+
+class RecordingSender:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def __call__(self, kind, text):
+        with self.lock:
+            if self.failures > 0:
+                self.failures -= 1
+                return False
+            self.sent.append((kind, text))
+            return True
+
+class TestStatusOutbox(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "outbox.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_batches_statuses_and_sends_spores_alone(self):
+        sender = RecordingSender()
+        outbox = StatusOutbox(sender, path=self.path, batch_size=2, linger=0)
+        outbox.put(STATUS, "a")
+        outbox.put(STATUS, "b")
+        outbox.put(STATUS, "c")
+        outbox.put(SPORE, '{"spore_type": "JOIN_GROUP"}')
+        outbox.put(STATUS, "d")
+
+        outbox.start()
+        self.assertTrue(outbox.flush(timeout=5))
+        outbox.stop()
+
+        self.assertEqual(sender.sent, [(STATUS, "a\nb"), (STATUS, "c"), (SPORE, '{"spore_type": "JOIN_GROUP"}'), (STATUS, "d")])
+
+    def test_coalesces_queued_duplicates(self):
+        outbox = StatusOutbox(RecordingSender(), path=None)
+        outbox.put(STATUS, "[SPORE] Model updated.")
+        outbox.put(STATUS, "[SPORE] Model updated.")
+
+        self.assertEqual(outbox.pending(), 1)
+        self.assertEqual(outbox.stats["coalesced"], 1)
+
+    def test_drops_oldest_when_full(self):
+        outbox = StatusOutbox(RecordingSender(), path=None, max_size=2)
+        for text in ["a", "b", "c"]:
+            outbox.put(STATUS, text)
+
+        self.assertEqual(list(outbox.queue), [[STATUS, "b"], [STATUS, "c"]])
+        self.assertEqual(outbox.stats["dropped"], 1)
+
+    def test_retries_with_backoff(self):
+        sender = RecordingSender(failures=2)
+        outbox = StatusOutbox(sender, path=None, linger=0, backoff=0.01)
+        outbox.put(STATUS, "a")
+
+        outbox.start()
+        self.assertTrue(outbox.flush(timeout=5))
+        outbox.stop()
+
+        self.assertEqual(sender.sent, [(STATUS, "a")])
+        self.assertEqual(outbox.stats["failures"], 2)
+
+    def test_spore_actions_of_older_files_are_dropped_on_load(self):
+        with open(self.path, 'w') as file:
+            json.dump([[SPORE, '{"spore_type": "JOIN_GROUP"}'], [STATUS, "a"]], file)
+
+        outbox = StatusOutbox(RecordingSender(), path=self.path)
+
+        self.assertEqual(list(outbox.queue), [[STATUS, "a"]])
+
+    def test_concurrent_saves_do_not_collide(self):
+        outbox = StatusOutbox(RecordingSender(), path=self.path)
+        for i in range(50):
+            outbox.put(STATUS, str(i))
+        errors = []
+
+        def save():
+            try:
+                for _ in range(20):
+                    outbox._save()
+            except Exception as e:
+                errors.append(e)
+
+        with patch("status_outbox.logging.warning") as warning:
+            threads = [threading.Thread(target=save) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        warning.assert_not_called()
+        with open(self.path) as file:
+            self.assertEqual(len(json.load(file)), 50)
+
+    def test_unsent_items_survive_a_restart(self):
+        outbox = StatusOutbox(RecordingSender(failures=100), path=self.path, linger=0, backoff=10)
+        outbox.put(STATUS, "a")
+        outbox.put(SPORE, "b")
+        outbox.start()
+        outbox.stop()
+        with open(self.path) as file:
+            self.assertEqual(json.load(file), [[STATUS, "a"]])
+
+        sender = RecordingSender()
+        restarted = StatusOutbox(sender, path=self.path, linger=0).start()
+        self.assertTrue(restarted.flush(timeout=5))
+        restarted.stop()
+
+        self.assertEqual(sender.sent, [(STATUS, "a")])
+        with open(self.path) as file:
+            self.assertEqual(json.load(file), [])
+
+if __name__ == '__main__':
+    unittest.main()
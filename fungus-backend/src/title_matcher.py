@@ -0,0 +1,97 @@
+# title_matcher.py
+import threading
+from collections import deque
+
+
+class TitleMatcher:
+    """
+    Case-insensitive multi-pattern matcher (Aho-Corasick) over song titles.
+    Finds every catalog title contained in a text with one pass over the text.
+    Added titles are inserted into the trie right away, but the failure links are not updated incrementally:
+    a new title can change the failure links of existing nodes (adding "ab" changes the one of "xab"), so
+    the first search after one or more additions rebuilds all of them in one pass over the trie. Titles
+    added between two searches, e.g. a batch of new songs, share a single rebuild.
+    Adding, rebuilding and searching are serialized, since titles are added while requests are served.
+    """
+
+    def __init__(self, titles=()):
+        self.titles = []
+        # Trie: transitions, failure link and the smallest title id ending at each node
+        self.goto = [{}]
+        self.fail = [0]
+        self.own_match = [None]
+        self.best_match = [None]
+        self.dirty = False
+        self._lock = threading.RLock()
+        for title in titles:
+            self.add_title(title)
+
+    def add_title(self, title):
+        """Adds a title; titles added earlier win when several titles match the same text."""
+        with self._lock:
+            return self._add_title(title)
+
+    def _add_title(self, title):
+        title_id = len(self.titles)
+        self.titles.append(title)
+        if not title:
+            return title_id
+
+        node = 0
+        for char in title.lower():
+            next_node = self.goto[node].get(char)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][char] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.own_match.append(None)
+                self.best_match.append(None)
+            node = next_node
+        if self.own_match[node] is None:
+            self.own_match[node] = title_id
+        self.dirty = True
+        return title_id
+
+    def _build(self):
+        """Recomputes the failure links and the best match of every node with a breadth-first pass over the trie."""
+        self.best_match[0] = self.own_match[0]
+        queue = deque()
+        for child in self.goto[0].values():
+            self.fail[child] = 0
+            self.best_match[child] = self.own_match[child]
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.best_match[child] = self._min_id(self.own_match[child], self.best_match[self.fail[child]])
+                queue.append(child)
+        self.dirty = False
+
+    @staticmethod
+    def _min_id(a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return min(a, b)
+
+    def find_first(self, text):
+        """Returns the earliest added title contained in the text, or None."""
+        with self._lock:
+            if self.dirty:
+                self._build()
+
+            best = None
+            node = 0
+            for char in text.lower():
+                while node and char not in self.goto[node]:
+                    node = self.fail[node]
+                node = self.goto[node].get(char, 0)
+                best = self._min_id(best, self.best_match[node])
+            return self.titles[best] if best is not None else None
@@ -0,0 +1,61 @@
+import threading
+import unittest
+from title_matcher import TitleMatcher
+
+class TestTitleMatcher(unittest.TestCase):
+    def setUp(self):
+        self.matcher = TitleMatcher(["Hello", "Blinding Lights", "Lights", "Shape of You"])
+
+    def test_find_first_is_case_insensitive(self):
+        self.assertEqual(self.matcher.find_first("play SHAPE OF YOU please"), "Shape of You")
+
+    def test_find_first_prefers_earlier_title(self):
+        self.assertEqual(self.matcher.find_first("I love blinding lights"), "Blinding Lights")
+        self.assertEqual(self.matcher.find_first("city lights"), "Lights")
+
+    def test_find_first_follows_failure_links(self):
+        self.assertEqual(self.matcher.find_first("shshape of you"), "Shape of You")
+        self.assertEqual(self.matcher.find_first("blinding light and hello"), "Hello")
+
+    def test_find_first_without_match(self):
+        self.assertIsNone(self.matcher.find_first("nothing to see here"))
+
+    def test_add_title_incrementally(self):
+        self.assertIsNone(self.matcher.find_first("bad guy"))
+        self.matcher.add_title("Bad Guy")
+        self.assertEqual(self.matcher.find_first("bad guy"), "Bad Guy")
+
+    def test_added_title_updates_failure_links_of_existing_nodes(self):
+        matcher = TitleMatcher(["Xaby"])
+        self.assertIsNone(matcher.find_first("xab"))
+
+        matcher.add_title("Ab")
+
+        self.assertEqual(matcher.find_first("xab"), "Ab")
+
+    def test_concurrent_adds_and_searches(self):
+        titles = [f"Song {i:04d}" for i in range(500)]
+        errors = []
+
+        def add():
+            for title in titles:
+                self.matcher.add_title(title)
+
+        def search():
+            try:
+                for _ in range(200):
+                    self.matcher.find_first("play blinding lights")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=add)] + [threading.Thread(target=search) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.matcher.find_first("now song 0499 plays"), "Song 0499")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# trainer.py
+import logging
+import os
+import time
+import torch
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRAINING_BATCH_SIZE = int(os.getenv("TRAINING_BATCH_SIZE", 256))
+TRAINING_PATIENCE = int(os.getenv("TRAINING_PATIENCE", 5))
+TRAINING_MIN_DELTA = float(os.getenv("TRAINING_MIN_DELTA", 1e-4))
+# Wall-clock budget per epoch in seconds, 0 disables it
+TRAINING_EPOCH_TIME_BUDGET = float(os.getenv("TRAINING_EPOCH_TIME_BUDGET", 0))
+
+
+class EpochStats:
+    def __init__(self, epoch, loss, duration, samples):
+        self.epoch = epoch
+        self.loss = loss
+        self.duration = duration
+        self.samples = samples
+        self.samples_per_second = samples / duration if duration > 0 else float("inf")
+
+
+class MiniBatchTrainer:
+    """
+    Trains a model with shuffled mini-batches.
+    Stops early once the epoch loss has not improved by min_delta for patience epochs, and cuts an
+    epoch short when it exceeds the wall-clock budget.
+    """
+
+    def __init__(self, model, criterion, optimizer, max_epochs=100, batch_size=TRAINING_BATCH_SIZE,
+                 patience=TRAINING_PATIENCE, min_delta=TRAINING_MIN_DELTA, epoch_time_budget=TRAINING_EPOCH_TIME_BUDGET,
+                 shuffle=True):
+        self.model = model
+        self.criterion = criterion
+        self.optimizer = optimizer
+        self.max_epochs = max_epochs
+        self.batch_size = batch_size
+        self.patience = patience
+        self.min_delta = min_delta
+        self.epoch_time_budget = epoch_time_budget
+        self.shuffle = shuffle
+
+    def fit(self, features, targets, to_tensor=None):
+        """
+        Trains on features/targets and returns the EpochStats of every epoch that ran.
+        If to_tensor is given, features are indexed per batch and converted to model input with it
+        (e.g. to densify sparse rows), so only one batch is materialized at a time.
+        """
+        num_samples = targets.shape[0]
+        history = []
+        best_loss = float("inf")
+        epochs_without_improvement = 0
+
+        for epoch in range(self.max_epochs):
+            self.model.train()
+            start = time.perf_counter()
+            order = torch.randperm(num_samples) if self.shuffle else torch.arange(num_samples)
+            total_loss = 0.0
+            seen = 0
+
+            for batch_start in range(0, num_samples, self.batch_size):
+                batch = order[batch_start:batch_start + self.batch_size]
+                inputs = features[batch] if to_tensor is None else to_tensor(features[batch.numpy()])
+                outputs = self.model(inputs).squeeze(-1)
+                loss = self.criterion(outputs, targets[batch])
+
+                self.optimizer.zero_grad()
+                loss.backward()
+                self.optimizer.step()
+
+                total_loss += loss.item() * len(batch)
+                seen += len(batch)
+                if self.epoch_time_budget and time.perf_counter() - start > self.epoch_time_budget:
+                    logging.warning(f"[TRAINING] Epoch {epoch + 1} exceeded its time budget after {seen}/{num_samples} samples")
+                    break
+
+            stats = EpochStats(epoch + 1, total_loss / max(seen, 1), time.perf_counter() - start, seen)
+            history.append(stats)
+            logging.info(f"[TRAINING] Epoch [{stats.epoch}/{self.max_epochs}], Loss: {stats.loss:.4f}, "
+                         f"Time: {stats.duration * 1000:.1f}ms, Samples/sec: {stats.samples_per_second:.0f}")
+
+            if stats.loss < best_loss - self.min_delta:
+                best_loss = stats.loss
+                epochs_without_improvement = 0
+            else:
+                epochs_without_improvement += 1
+                if epochs_without_improvement >= self.patience:
+                    logging.info(f"[TRAINING] Loss plateaued, stopping early after {stats.epoch} epochs")
+                    break
+
+        return history
@@ -0,0 +1,32 @@
+import unittest
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from trainer import MiniBatchTrainer
+
+class TestMiniBatchTrainer(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.features = torch.randn(100, 4)
+        self.targets = self.features @ torch.tensor([1.0, -2.0, 0.5, 3.0])
+        self.model = nn.Linear(4, 1)
+
+    def create_trainer(self, **kwargs):
+        return MiniBatchTrainer(self.model, nn.MSELoss(), optim.Adam(self.model.parameters(), lr=0.05), **kwargs)
+
+    def test_fit_reduces_loss_and_reports_throughput(self):
+        history = self.create_trainer(max_epochs=30, batch_size=16, patience=30).fit(self.features, self.targets)
+        self.assertEqual(len(history), 30)
+        self.assertLess(history[-1].loss, history[0].loss)
+        self.assertTrue(all(stats.samples == 100 and stats.samples_per_second > 0 for stats in history))
+
+    def test_fit_stops_early_on_plateau(self):
+        history = self.create_trainer(max_epochs=100, batch_size=16, patience=2, min_delta=1e9).fit(self.features, self.targets)
+        self.assertEqual(len(history), 3)
+
+    def test_fit_respects_epoch_time_budget(self):
+        history = self.create_trainer(max_epochs=1, batch_size=1, epoch_time_budget=1e-9).fit(self.features, self.targets)
+        self.assertEqual(history[0].samples, 1)
+
+if __name__ == '__main__':
+    unittest.main()